@@ -0,0 +1,44 @@
+"""add_livedata_id_sequence
+
+Revision ID: g7h8i9j0k1l2
+Revises: f6g7h8i9j0k1
+Create Date: 2026-10-16 09:00:00.000000
+
+Changes:
+1. Create (or adopt) livedata_id_seq as a hi/lo block sequence
+   (INCREMENT BY 100). The API reserves a whole block per nextval() and
+   hands out IDs locally, replacing the old microsecond-timestamp IDs that
+   collided in batch loops and across uvicorn workers.
+2. Restart the sequence above the current MAX(id). Existing rows keep their
+   timestamp-derived IDs; they are already unique, and all new IDs are larger.
+3. Use the sequence as the column default so scripts inserting LiveData
+   without an explicit id keep working.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'g7h8i9j0k1l2'
+down_revision: Union[str, Sequence[str], None] = 'f6g7h8i9j0k1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BLOCK_SIZE = 100
+
+
+def upgrade() -> None:
+    # The table may already have a serial sequence if it was created with create_all()
+    op.execute("CREATE SEQUENCE IF NOT EXISTS livedata_id_seq")
+    op.execute(f"ALTER SEQUENCE livedata_id_seq INCREMENT BY {BLOCK_SIZE} NO CYCLE OWNED BY livedata.id")
+    op.execute("""
+        SELECT setval('livedata_id_seq', COALESCE((SELECT MAX(id) FROM livedata), 0) + 1, false)
+    """)
+    op.execute("ALTER TABLE livedata ALTER COLUMN id SET DEFAULT nextval('livedata_id_seq')")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE livedata ALTER COLUMN id DROP DEFAULT")
+    op.execute("ALTER SEQUENCE livedata_id_seq INCREMENT BY 1")
@@ -0,0 +1,107 @@
+"""partition_livedata_by_month
+
+Revision ID: h8i9j0k1l2m3
+Revises: g7h8i9j0k1l2
+Create Date: 2026-10-16 10:00:00.000000
+
+Changes:
+1. Rebuild livedata as a table range-partitioned by month on "timestamp"
+   - One partition per month (livedata_yYYYYmMM) from the first month with
+     data (capped at 36 months back) through 3 months ahead
+   - livedata_default catches NULL timestamps (corrupt RTC) and outliers
+2. Copy all existing rows across, then drop the old table
+3. Indexes on the partitioned parent (cascade to every partition):
+   - ix_livedata_battery_id_timestamp: (battery_id, "timestamp" DESC)
+   - ix_livedata_created_at_brin: BRIN on created_at
+   - ix_livedata_id_timestamp: UNIQUE (id, "timestamp")
+     A partitioned table's unique constraints must include the partition key,
+     and "timestamp" is nullable, so the old PRIMARY KEY (id) is replaced by
+     this unique index. IDs come from livedata_id_seq and stay unique.
+
+Future partitions and retention are handled by
+scripts/manage_livedata_partitions.py (daily cron).
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'h8i9j0k1l2m3'
+down_revision: Union[str, Sequence[str], None] = 'g7h8i9j0k1l2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+MONTHS_AHEAD = 3
+MAX_MONTHS_BACK = 36
+
+
+def _add_months(day: date, months: int) -> date:
+    month_index = day.year * 12 + (day.month - 1) + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+
+    # Step 1: Move the existing table out of the way
+    op.execute("ALTER TABLE livedata RENAME TO livedata_unpartitioned")
+    op.execute("ALTER TABLE livedata_unpartitioned RENAME CONSTRAINT livedata_pkey TO livedata_unpartitioned_pkey")
+    op.execute("ALTER SEQUENCE livedata_id_seq OWNED BY NONE")
+
+    # Step 2: Partitioned parent with the same columns and defaults
+    op.execute("""
+        CREATE TABLE livedata (LIKE livedata_unpartitioned INCLUDING DEFAULTS)
+        PARTITION BY RANGE ("timestamp")
+    """)
+    op.execute("ALTER SEQUENCE livedata_id_seq OWNED BY livedata.id")
+
+    # Step 3: Monthly partitions covering existing data plus a few months ahead
+    this_month = date.today().replace(day=1)
+    first_month = conn.execute(sa.text(
+        'SELECT date_trunc(\'month\', MIN("timestamp"))::date FROM livedata_unpartitioned'
+    )).scalar() or this_month
+    first_month = max(first_month, _add_months(this_month, -MAX_MONTHS_BACK))
+    last_month = _add_months(this_month, MONTHS_AHEAD)
+
+    month = first_month
+    while month <= last_month:
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE livedata_y{month.year:04d}m{month.month:02d} PARTITION OF livedata "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+    op.execute("CREATE TABLE livedata_default PARTITION OF livedata DEFAULT")
+
+    # Step 4: Copy data, then drop the old table
+    op.execute("INSERT INTO livedata SELECT * FROM livedata_unpartitioned")
+    op.execute("DROP TABLE livedata_unpartitioned")
+
+    # Step 5: Constraints and indexes (built after the copy for speed)
+    op.execute("""
+        ALTER TABLE livedata ADD CONSTRAINT livedata_battery_id_fkey
+        FOREIGN KEY (battery_id) REFERENCES bepppbattery (battery_id)
+    """)
+    op.execute('CREATE UNIQUE INDEX ix_livedata_id_timestamp ON livedata (id, "timestamp")')
+    op.execute('CREATE INDEX ix_livedata_battery_id_timestamp ON livedata (battery_id, "timestamp" DESC)')
+    op.execute("CREATE INDEX ix_livedata_created_at_brin ON livedata USING brin (created_at)")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE livedata RENAME TO livedata_partitioned")
+    op.execute("ALTER SEQUENCE livedata_id_seq OWNED BY NONE")
+
+    op.execute("CREATE TABLE livedata (LIKE livedata_partitioned INCLUDING DEFAULTS)")
+    op.execute("INSERT INTO livedata SELECT * FROM livedata_partitioned")
+    op.execute("DROP TABLE livedata_partitioned CASCADE")
+
+    op.execute("ALTER TABLE livedata ADD CONSTRAINT livedata_pkey PRIMARY KEY (id)")
+    op.execute("""
+        ALTER TABLE livedata ADD CONSTRAINT livedata_battery_id_fkey
+        FOREIGN KEY (battery_id) REFERENCES bepppbattery (battery_id)
+    """)
+    op.execute("ALTER SEQUENCE livedata_id_seq OWNED BY livedata.id")
@@ -0,0 +1,108 @@
+"""add_livedata_rollups
+
+Revision ID: i9j0k1l2m3n4
+Revises: h8i9j0k1l2m3
+Create Date: 2026-10-16 11:00:00.000000
+
+Changes:
+1. livedata_hourly / livedata_daily: per-battery rollups keyed on
+   (battery_id, bucket) with count/sum/min/max/mean for power_watts,
+   state_of_charge, voltage and current_amps. The mean is a generated column
+   (sum / count) so partial buckets can be merged exactly.
+2. rollup_watermarks: how far (by livedata.created_at) each rollup has been
+   refreshed.
+
+The tables start empty; scripts/refresh_livedata_rollups.py (cron, every
+5 minutes) backfills them from the watermark on its first run. They are
+not foreign-keyed to bepppbattery so that rollups outlive livedata
+partitions dropped for retention.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'i9j0k1l2m3n4'
+down_revision: Union[str, Sequence[str], None] = 'h8i9j0k1l2m3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'livedata_hourly',
+        sa.Column('battery_id', sa.String(50), nullable=False),
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('sample_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('power_watts_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('power_watts_sum', sa.Float(), nullable=True),
+        sa.Column('power_watts_min', sa.Float(), nullable=True),
+        sa.Column('power_watts_max', sa.Float(), nullable=True),
+        sa.Column('power_watts_mean', sa.Float(), sa.Computed('power_watts_sum / NULLIF(power_watts_count, 0)'), nullable=True),
+        sa.Column('state_of_charge_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('state_of_charge_sum', sa.Float(), nullable=True),
+        sa.Column('state_of_charge_min', sa.Float(), nullable=True),
+        sa.Column('state_of_charge_max', sa.Float(), nullable=True),
+        sa.Column('state_of_charge_mean', sa.Float(), sa.Computed('state_of_charge_sum / NULLIF(state_of_charge_count, 0)'), nullable=True),
+        sa.Column('voltage_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('voltage_sum', sa.Float(), nullable=True),
+        sa.Column('voltage_min', sa.Float(), nullable=True),
+        sa.Column('voltage_max', sa.Float(), nullable=True),
+        sa.Column('voltage_mean', sa.Float(), sa.Computed('voltage_sum / NULLIF(voltage_count, 0)'), nullable=True),
+        sa.Column('current_amps_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('current_amps_sum', sa.Float(), nullable=True),
+        sa.Column('current_amps_min', sa.Float(), nullable=True),
+        sa.Column('current_amps_max', sa.Float(), nullable=True),
+        sa.Column('current_amps_mean', sa.Float(), sa.Computed('current_amps_sum / NULLIF(current_amps_count, 0)'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('battery_id', 'bucket')
+    )
+    op.create_index('ix_livedata_hourly_bucket', 'livedata_hourly', ['bucket'])
+
+    op.create_table(
+        'livedata_daily',
+        sa.Column('battery_id', sa.String(50), nullable=False),
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('sample_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('power_watts_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('power_watts_sum', sa.Float(), nullable=True),
+        sa.Column('power_watts_min', sa.Float(), nullable=True),
+        sa.Column('power_watts_max', sa.Float(), nullable=True),
+        sa.Column('power_watts_mean', sa.Float(), sa.Computed('power_watts_sum / NULLIF(power_watts_count, 0)'), nullable=True),
+        sa.Column('state_of_charge_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('state_of_charge_sum', sa.Float(), nullable=True),
+        sa.Column('state_of_charge_min', sa.Float(), nullable=True),
+        sa.Column('state_of_charge_max', sa.Float(), nullable=True),
+        sa.Column('state_of_charge_mean', sa.Float(), sa.Computed('state_of_charge_sum / NULLIF(state_of_charge_count, 0)'), nullable=True),
+        sa.Column('voltage_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('voltage_sum', sa.Float(), nullable=True),
+        sa.Column('voltage_min', sa.Float(), nullable=True),
+        sa.Column('voltage_max', sa.Float(), nullable=True),
+        sa.Column('voltage_mean', sa.Float(), sa.Computed('voltage_sum / NULLIF(voltage_count, 0)'), nullable=True),
+        sa.Column('current_amps_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('current_amps_sum', sa.Float(), nullable=True),
+        sa.Column('current_amps_min', sa.Float(), nullable=True),
+        sa.Column('current_amps_max', sa.Float(), nullable=True),
+        sa.Column('current_amps_mean', sa.Float(), sa.Computed('current_amps_sum / NULLIF(current_amps_count, 0)'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('battery_id', 'bucket')
+    )
+    op.create_index('ix_livedata_daily_bucket', 'livedata_daily', ['bucket'])
+
+    op.create_table(
+        'rollup_watermarks',
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('watermark', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('rollup_watermarks')
+    op.drop_index('ix_livedata_daily_bucket', table_name='livedata_daily')
+    op.drop_table('livedata_daily')
+    op.drop_index('ix_livedata_hourly_bucket', table_name='livedata_hourly')
+    op.drop_table('livedata_hourly')
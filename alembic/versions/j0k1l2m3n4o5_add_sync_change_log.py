@@ -0,0 +1,127 @@
+"""add_sync_change_log
+
+Revision ID: j0k1l2m3n4o5
+Revises: i9j0k1l2m3n4
+Create Date: 2026-10-16 12:00:00.000000
+
+Changes:
+1. change_log: one row per insert/update/delete on the delta-sync tables
+   (user, bepppbattery, productiveuseequipment, battery_rentals, puerental,
+   notifications), read by GET /sync/changes.
+2. record_sync_change() trigger function and an AFTER row trigger on each
+   of those tables. Deletes are recorded as tombstones; an update that moves
+   a row to another hub also records a tombstone for the old hub. Updates
+   that only touch updated_at (or bepppbattery.last_data_received, which is
+   bumped on every telemetry batch) are not recorded.
+
+Each change stores the writing transaction's txid so /sync/changes can
+serve only changes from transactions older than every transaction still in
+progress: a change committed late with a lower change_id can't be skipped.
+Rows are pruned after SYNC_CHANGE_LOG_RETENTION_DAYS by
+scripts/prune_change_log.py.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'j0k1l2m3n4o5'
+down_revision: Union[str, Sequence[str], None] = 'i9j0k1l2m3n4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# table -> (entity name in the feed, primary key column, extra columns whose changes aren't synced)
+SYNC_TABLES = {
+    'user': ('user', 'user_id', []),
+    'bepppbattery': ('battery', 'battery_id', ['last_data_received']),
+    'productiveuseequipment': ('pue', 'pue_id', []),
+    'battery_rentals': ('battery_rental', 'rental_id', []),
+    'puerental': ('pue_rental', 'pue_rental_id', []),
+    'notifications': ('notification', 'notification_id', []),
+}
+
+
+def upgrade() -> None:
+    op.create_table(
+        'change_log',
+        sa.Column('change_id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('txid', sa.BigInteger(), server_default=sa.text('txid_current()'), nullable=False),
+        sa.Column('entity', sa.String(50), nullable=False),
+        sa.Column('entity_id', sa.String(100), nullable=False),
+        sa.Column('hub_id', sa.BigInteger(), nullable=True),
+        sa.Column('op', sa.String(10), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('change_id')
+    )
+    op.create_index('ix_change_log_txid_change_id', 'change_log', ['txid', 'change_id'])
+    op.create_index('ix_change_log_hub_txid_change_id', 'change_log', ['hub_id', 'txid', 'change_id'])
+    op.create_index('ix_change_log_created_at', 'change_log', ['created_at'])
+
+    # TG_ARGV: entity name, primary key column, then columns to ignore on update
+    op.execute("""
+        CREATE OR REPLACE FUNCTION record_sync_change() RETURNS trigger AS $$
+        DECLARE
+            new_row jsonb;
+            old_row jsonb;
+            ignored text[] := ARRAY['updated_at'] || TG_ARGV[2:];
+            row_hub bigint;
+            old_hub bigint;
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                old_row := to_jsonb(OLD);
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                new_row := to_jsonb(NEW);
+            END IF;
+
+            IF TG_OP = 'UPDATE' AND (new_row - ignored) = (old_row - ignored) THEN
+                RETURN NULL;
+            END IF;
+
+            row_hub := (COALESCE(new_row, old_row) ->> 'hub_id')::bigint;
+            IF row_hub IS NULL AND COALESCE(new_row, old_row) ? 'pue_id' THEN
+                -- puerental has no hub_id of its own
+                SELECT hub_id INTO row_hub FROM productiveuseequipment
+                WHERE pue_id = COALESCE(new_row, old_row) ->> 'pue_id';
+            END IF;
+
+            IF TG_OP = 'UPDATE' THEN
+                old_hub := (old_row ->> 'hub_id')::bigint;
+                IF old_hub IS DISTINCT FROM (new_row ->> 'hub_id')::bigint AND old_row ? 'hub_id' THEN
+                    INSERT INTO change_log (entity, entity_id, hub_id, op)
+                    VALUES (TG_ARGV[0], old_row ->> TG_ARGV[1], old_hub, 'delete');
+                END IF;
+            END IF;
+
+            INSERT INTO change_log (entity, entity_id, hub_id, op)
+            VALUES (
+                TG_ARGV[0],
+                COALESCE(new_row, old_row) ->> TG_ARGV[1],
+                row_hub,
+                CASE WHEN TG_OP = 'DELETE' THEN 'delete' ELSE 'upsert' END
+            );
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    for table, (entity, pk, ignored) in SYNC_TABLES.items():
+        args = ", ".join(f"'{arg}'" for arg in [entity, pk] + ignored)
+        op.execute(f"""
+            CREATE TRIGGER {table}_sync_change
+            AFTER INSERT OR UPDATE OR DELETE ON "{table}"
+            FOR EACH ROW EXECUTE FUNCTION record_sync_change({args})
+        """)
+
+
+def downgrade() -> None:
+    for table in SYNC_TABLES:
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_sync_change ON "{table}"')
+    op.execute('DROP FUNCTION IF EXISTS record_sync_change()')
+    op.drop_index('ix_change_log_created_at', table_name='change_log')
+    op.drop_index('ix_change_log_hub_txid_change_id', table_name='change_log')
+    op.drop_index('ix_change_log_txid_change_id', table_name='change_log')
+    op.drop_table('change_log')
@@ -0,0 +1,34 @@
+"""add_notification_dedupe_index
+
+Revision ID: k1l2m3n4o5p6
+Revises: j0k1l2m3n4o5
+Create Date: 2026-10-16 13:00:00.000000
+
+Changes:
+1. ix_notifications_hub_type_link on notifications (hub_id,
+   notification_type, link_id): the NOT EXISTS lookup the notification
+   sweep (api/app/services/notification_engine.py) runs for every candidate
+   rental and account.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'k1l2m3n4o5p6'
+down_revision: Union[str, Sequence[str], None] = 'j0k1l2m3n4o5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_notifications_hub_type_link', 'notifications',
+        ['hub_id', 'notification_type', 'link_id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notifications_hub_type_link', table_name='notifications')
@@ -0,0 +1,67 @@
+"""add_search_trigram_indexes
+
+Revision ID: l2m3n4o5p6q7
+Revises: k1l2m3n4o5p6
+Create Date: 2026-10-16 14:00:00.000000
+
+Changes:
+1. Enable pg_trgm.
+2. GIN trigram indexes on the expressions GET /search filters with
+   (lower(col) LIKE '%q%', id::text LIKE '%q%'), so substring matches are
+   index scans instead of sequential scans. The expressions must stay in
+   step with api/app/services/search.py.
+3. B-tree indexes on battery_rentals.user_id, puerental.user_id and
+   puerental.pue_id, used to find rentals of matching customers / items.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'l2m3n4o5p6q7'
+down_revision: Union[str, Sequence[str], None] = 'k1l2m3n4o5p6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# index name -> (table, indexed expression)
+TRIGRAM_INDEXES = {
+    'ix_user_name_trgm': ('user', 'lower("Name")'),
+    'ix_user_username_trgm': ('user', 'lower(username)'),
+    'ix_user_mobile_number_trgm': ('user', 'lower(mobile_number)'),
+    'ix_user_short_id_trgm': ('user', 'lower(short_id)'),
+    'ix_user_id_document_trgm': ('user', 'lower(users_identification_document_number)'),
+    'ix_bepppbattery_battery_id_trgm': ('bepppbattery', 'lower(battery_id)'),
+    'ix_bepppbattery_short_id_trgm': ('bepppbattery', 'lower(short_id)'),
+    'ix_productiveuseequipment_name_trgm': ('productiveuseequipment', 'lower(name)'),
+    'ix_battery_rentals_rental_id_trgm': ('battery_rentals', 'CAST(rental_id AS TEXT)'),
+    'ix_puerental_pue_rental_id_trgm': ('puerental', 'CAST(pue_rental_id AS TEXT)'),
+    'ix_solarhub_location_trgm': ('solarhub', 'lower(what_three_word_location)'),
+    'ix_solarhub_country_trgm': ('solarhub', 'lower(country)'),
+    'ix_solarhub_hub_id_trgm': ('solarhub', 'CAST(hub_id AS TEXT)'),
+}
+
+# index name -> (table, column)
+FOREIGN_KEY_INDEXES = {
+    'ix_battery_rentals_user_id': ('battery_rentals', 'user_id'),
+    'ix_puerental_user_id': ('puerental', 'user_id'),
+    'ix_puerental_pue_id': ('puerental', 'pue_id'),
+}
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    for name, (table, expression) in TRIGRAM_INDEXES.items():
+        op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" USING gin (({expression}) gin_trgm_ops)')
+
+    for name, (table, column) in FOREIGN_KEY_INDEXES.items():
+        op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({column})')
+
+
+def downgrade() -> None:
+    for name in list(FOREIGN_KEY_INDEXES) + list(TRIGRAM_INDEXES):
+        op.execute(f'DROP INDEX IF EXISTS {name}')
+    # pg_trgm is left installed; other objects may depend on it
@@ -0,0 +1,81 @@
+"""add_battery_latest_state
+
+Revision ID: m3n4o5p6q7r8
+Revises: l2m3n4o5p6q7
+Create Date: 2026-10-16 15:00:00.000000
+
+Changes:
+1. battery_latest_state: one row per battery with its newest reading, last
+   known SoC and last GPS fix, upserted on ingestion by
+   api/app/services/battery_state.py so current-state reads are a primary
+   key lookup instead of a scan of livedata.
+2. Backfill it from livedata, one index-backed lookup per battery
+   (ix_livedata_battery_id_timestamp).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'm3n4o5p6q7r8'
+down_revision: Union[str, Sequence[str], None] = 'l2m3n4o5p6q7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'battery_latest_state',
+        sa.Column('battery_id', sa.String(50),
+                  sa.ForeignKey('bepppbattery.battery_id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('livedata_id', sa.BigInteger(), nullable=True),
+        sa.Column('reading_at', sa.DateTime(), nullable=True),
+        sa.Column('voltage', sa.Float(), nullable=True),
+        sa.Column('current_amps', sa.Float(), nullable=True),
+        sa.Column('power_watts', sa.Float(), nullable=True),
+        sa.Column('amp_hours_consumed', sa.Float(), nullable=True),
+        sa.Column('err', sa.String(255), nullable=True),
+        sa.Column('reading', sa.Text(), nullable=True),
+        sa.Column('last_soc', sa.BigInteger(), nullable=True),
+        sa.Column('last_soc_at', sa.DateTime(), nullable=True),
+        sa.Column('latitude', sa.Float(), nullable=True),
+        sa.Column('longitude', sa.Float(), nullable=True),
+        sa.Column('gps_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+
+    op.execute("""
+        INSERT INTO battery_latest_state (
+            battery_id, livedata_id, reading_at, voltage, current_amps, power_watts,
+            amp_hours_consumed, err, reading,
+            last_soc, last_soc_at, latitude, longitude, gps_at
+        )
+        SELECT b.battery_id, l.id, l."timestamp", l.voltage, l.current_amps, l.power_watts,
+               l.amp_hours_consumed, l.err, to_jsonb(l)::text,
+               soc.state_of_charge, soc."timestamp", gps.latitude, gps.longitude, gps."timestamp"
+        FROM bepppbattery b
+        JOIN LATERAL (
+            SELECT * FROM livedata
+            WHERE battery_id = b.battery_id AND "timestamp" IS NOT NULL
+            ORDER BY "timestamp" DESC LIMIT 1
+        ) l ON true
+        LEFT JOIN LATERAL (
+            SELECT state_of_charge, "timestamp" FROM livedata
+            WHERE battery_id = b.battery_id AND "timestamp" IS NOT NULL AND state_of_charge IS NOT NULL
+            ORDER BY "timestamp" DESC LIMIT 1
+        ) soc ON true
+        LEFT JOIN LATERAL (
+            SELECT latitude, longitude, "timestamp" FROM livedata
+            WHERE battery_id = b.battery_id AND "timestamp" IS NOT NULL
+              AND latitude IS NOT NULL AND longitude IS NOT NULL
+            ORDER BY "timestamp" DESC LIMIT 1
+        ) gps ON true
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('battery_latest_state')
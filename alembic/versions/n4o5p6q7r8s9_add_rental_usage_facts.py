@@ -0,0 +1,59 @@
+"""add_rental_usage_facts
+
+Revision ID: n4o5p6q7r8s9
+Revises: m3n4o5p6q7r8
+Create Date: 2026-10-16 16:00:00.000000
+
+Changes:
+1. rental_usage_facts: one row of battery usage stats per battery rental
+   (api/app/services/rental_usage.py), read by /analytics/user-report.
+   Filled by scripts/refresh_rental_usage_facts.py (the first run backfills
+   all rentals) and when rentals are returned.
+2. Index battery_rental_items.rental_id, used to find a rental's batteries,
+   and battery_rental_items.battery_id, used to find overlapping rentals of
+   the same battery (each LiveData point counts for one rental only).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'n4o5p6q7r8s9'
+down_revision: Union[str, Sequence[str], None] = 'm3n4o5p6q7r8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'rental_usage_facts',
+        sa.Column('rental_id', sa.BigInteger(),
+                  sa.ForeignKey('battery_rentals.rental_id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('point_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('discharge_point_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('discharge_sum_w', sa.Float(), nullable=True),
+        sa.Column('discharge_sumsq_w', sa.Float(), nullable=True),
+        sa.Column('power_mean_w', sa.Float(), nullable=True),
+        sa.Column('power_median_w', sa.Float(), nullable=True),
+        sa.Column('power_max_w', sa.Float(), nullable=True),
+        sa.Column('power_min_w', sa.Float(), nullable=True),
+        sa.Column('power_sd_w', sa.Float(), nullable=True),
+        sa.Column('wh_discharged', sa.Float(), nullable=True),
+        sa.Column('active_hours', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('first_point_at', sa.DateTime(), nullable=True),
+        sa.Column('last_point_at', sa.DateTime(), nullable=True),
+        sa.Column('is_final', sa.Boolean(), nullable=False, server_default='false'),
+        sa.Column('computed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    op.create_index('ix_battery_rental_items_rental_id', 'battery_rental_items', ['rental_id'])
+    op.create_index('ix_battery_rental_items_battery_id', 'battery_rental_items', ['battery_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_battery_rental_items_battery_id', table_name='battery_rental_items')
+    op.drop_index('ix_battery_rental_items_rental_id', table_name='battery_rental_items')
+    op.drop_table('rental_usage_facts')
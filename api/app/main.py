@@ -2,13 +2,15 @@ from fastapi import FastAPI, HTTPException, Depends, status, Query, Request, Fil
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.gzip import GZipMiddleware
-from fastapi.responses import Response, JSONResponse, FileResponse
+from fastapi.responses import Response, JSONResponse, FileResponse, StreamingResponse
 from pydantic import BaseModel, Field, ConfigDict, field_validator
-from sqlalchemy.orm import Session
-from sqlalchemy import text, func, and_, or_, desc
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import text, func, and_, or_, desc, literal
 from typing import Optional, List, Dict, Any, Union
 from datetime import datetime, timezone, timedelta, date
 import json
+import csv
+import gzip
 import statistics
 import pandas as pd
 import numpy as np
@@ -25,14 +27,43 @@ import os
 import shutil
 from pathlib import Path
 import uuid
+import anyio.to_thread
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from database import get_db, init_db
+from database import get_db, init_db, pool_capacity, pool_stats
 from models import *
 from sqlalchemy import Table
 from api.app.utils.rental_id_generator import generate_rental_id
+from api.app.utils.live_data_ids import live_data_ids
+from api.app.utils.pagination import page_size_for, keyset_query, split_page, parse_fields, project
 from api.app.services.pay_to_own_service import PayToOwnService
+from api.app.services.live_data_ingest import (
+    LiveDataIngestQueue, live_data_row, copy_live_data, bulk_insert_live_data
+)
+from api.app.services.livedata_rollups import ROLLUP_FUNCTIONS, query_rollups, delete_battery_rollups
+from api.app.services.livedata_aggregation import aggregate_live_data, format_time_group
+from api.app.services.pue_power_attribution import build_pue_segments, attribute_pue_types
+from api.app.services.live_data_export import EXPORT_FORMATS, EXPORT_STREAMS, parquet_available
+from api.app.services.audit_log import AuditLogWriter
+from api.app.services.battery_credentials import BatteryCredentialCache
+from api.app.services.principal_cache import PrincipalCache
+from api.app.services.hub_summary import HubSummaryCache
+from api.app.services.rental_queries import (
+    battery_rentals_query, pue_rentals_query, rental_items, active_rental_item, user_account_balance
+)
+from api.app.services.notification_engine import run_notification_sweep
+from api.app.services.battery_errors import BatteryErrorTracker, decode_error_string
+from api.app.services.battery_state import latest_reading, latest_state, serialize_state, upsert_latest_state
+from api.app.services.rental_usage import (
+    pooled_discharge_stats, refresh_rental_usage_facts, rental_power_timeline, usage_facts,
+)
+from api.app.services.search import (
+    search_hubs, search_users, search_batteries, search_battery_rentals, search_pue_rentals
+)
+from api.app.services.sync_changes import (
+    SYNC_ENTITIES, changes_since, cursor_expired, head_cursor, parse_sync_cursor
+)
 
 # Import configuration with safe defaults
 try:
@@ -53,11 +84,66 @@ try:
     except ImportError:
         BATTERY_TOKEN_EXPIRE_HOURS = 24
 
+    try:
+        from config import BATTERY_CREDENTIAL_CACHE_TTL_SECONDS
+    except ImportError:
+        BATTERY_CREDENTIAL_CACHE_TTL_SECONDS = 300
+
+    try:
+        from config import PRINCIPAL_CACHE_TTL_SECONDS
+    except ImportError:
+        PRINCIPAL_CACHE_TTL_SECONDS = 60
+
+    try:
+        from config import HUB_SUMMARY_CACHE_TTL_SECONDS
+    except ImportError:
+        HUB_SUMMARY_CACHE_TTL_SECONDS = 30
+
     try:
         from config import WEBHOOK_LOG_LIMIT
     except ImportError:
         WEBHOOK_LOG_LIMIT = 1000
 
+    try:
+        from config import WEBHOOK_LOG_FLUSH_INTERVAL_MS, WEBHOOK_LOG_PRUNE_INTERVAL_SECONDS
+    except ImportError:
+        WEBHOOK_LOG_FLUSH_INTERVAL_MS = 1000
+        WEBHOOK_LOG_PRUNE_INTERVAL_SECONDS = 60
+
+    try:
+        from config import (
+            LIVE_DATA_INGEST_MODE, LIVE_DATA_FLUSH_ROWS,
+            LIVE_DATA_FLUSH_INTERVAL_MS, LIVE_DATA_QUEUE_MAX
+        )
+    except ImportError:
+        LIVE_DATA_INGEST_MODE = "sync"
+        LIVE_DATA_FLUSH_ROWS = 200
+        LIVE_DATA_FLUSH_INTERVAL_MS = 500
+        LIVE_DATA_QUEUE_MAX = 10000
+
+    try:
+        from config import BATCH_LIVE_DATA_MAX_ENTRIES
+    except ImportError:
+        BATCH_LIVE_DATA_MAX_ENTRIES = 5000
+
+    try:
+        from config import API_THREADPOOL_SIZE, ANALYTICS_MAX_CONCURRENCY
+    except ImportError:
+        API_THREADPOOL_SIZE = None
+        ANALYTICS_MAX_CONCURRENCY = 4
+
+    try:
+        from config import BATTERY_ERROR_STATE_TTL_SECONDS, BATTERY_ERROR_FLUSH_INTERVAL_MS
+    except ImportError:
+        BATTERY_ERROR_STATE_TTL_SECONDS = 300
+        BATTERY_ERROR_FLUSH_INTERVAL_MS = 1000
+
+    try:
+        from config import SYNC_CHANGES_PAGE_SIZE, SYNC_CHANGE_LOG_RETENTION_DAYS
+    except ImportError:
+        SYNC_CHANGES_PAGE_SIZE = 1000
+        SYNC_CHANGE_LOG_RETENTION_DAYS = 30
+
 except ImportError as e:
     raise ImportError(
         "Missing required configuration. Please ensure config.py exists with SECRET_KEY, ALGORITHM, and DEBUG defined."
@@ -292,9 +378,9 @@ def log_webhook_event(
             else:
                 response_status = 200
 
-            # Create webhook log entry for database
+            # Buffered webhook log entry (written in batches by audit_log_writer)
             # IMPORTANT: Convert dicts to JSON strings for PostgreSQL
-            webhook_log = WebhookLog(
+            audit_log_writer.write(
                 battery_id=str(battery_id) if battery_id else None,
                 endpoint=event_type,  # Use event_type as endpoint
                 method="EVENT",  # Special method to distinguish from HTTP methods
@@ -305,27 +391,9 @@ def log_webhook_event(
                 error_message=error_message,
                 processing_time_ms=0  # Events don't have processing time
             )
-
-            db.add(webhook_log)
-            db.commit()
-
-            # Prune to keep only the most recent WEBHOOK_LOG_LIMIT entries
-            try:
-                count = db.query(WebhookLog).count()
-                if count > WEBHOOK_LOG_LIMIT:
-                    cutoff_id = db.query(WebhookLog.log_id).order_by(WebhookLog.log_id.desc()).offset(WEBHOOK_LOG_LIMIT).limit(1).scalar()
-                    if cutoff_id:
-                        db.query(WebhookLog).filter(WebhookLog.log_id <= cutoff_id).delete()
-                        db.commit()
-            except Exception:
-                pass
         except Exception as e:
             # Don't fail the main operation if logging fails
             webhook_logger.error(f"Failed to save webhook event to database: {str(e)}")
-            try:
-                db.rollback()
-            except:
-                pass
 
 def log_webhook_to_db(
     db: Session,
@@ -341,11 +409,12 @@ def log_webhook_to_db(
 ):
     """
     Log webhook request/response to database for production debugging.
-    All logs are preserved for historical analysis and troubleshooting.
+    Entries are buffered and written in batches by audit_log_writer on its own
+    connection, so this never touches the caller's session; the newest
+    WEBHOOK_LOG_LIMIT entries are kept.
     """
     try:
-        # Create webhook log entry
-        webhook_log = WebhookLog(
+        audit_log_writer.write(
             battery_id=str(battery_id) if battery_id is not None else None,
             endpoint=endpoint,
             method=method,
@@ -356,27 +425,34 @@ def log_webhook_to_db(
             error_message=error_message,
             processing_time_ms=processing_time_ms
         )
-        db.add(webhook_log)
-        db.commit()
-
-        # Prune to keep only the most recent WEBHOOK_LOG_LIMIT entries
-        try:
-            count = db.query(WebhookLog).count()
-            if count > WEBHOOK_LOG_LIMIT:
-                cutoff_id = db.query(WebhookLog.log_id).order_by(WebhookLog.log_id.desc()).offset(WEBHOOK_LOG_LIMIT).limit(1).scalar()
-                if cutoff_id:
-                    db.query(WebhookLog).filter(WebhookLog.log_id <= cutoff_id).delete()
-                    db.commit()
-        except Exception:
-            pass
-
     except Exception as e:
         # Don't let logging failures break the webhook
         print(f"Failed to log webhook to database: {e}")
-        db.rollback()
 
 webhook_logger = setup_webhook_logging()
 
+# Batched writer for webhook_logs (started on startup, drained on shutdown)
+audit_log_writer = AuditLogWriter(
+    retention=WEBHOOK_LOG_LIMIT,
+    flush_interval_ms=WEBHOOK_LOG_FLUSH_INTERVAL_MS,
+    prune_interval_seconds=WEBHOOK_LOG_PRUNE_INTERVAL_SECONDS
+)
+
+# Battery secrets for /auth/battery-login and /auth/battery-refresh
+battery_credentials = BatteryCredentialCache(ttl_seconds=BATTERY_CREDENTIAL_CACHE_TTL_SECONDS)
+
+# Hub access of authenticated users, see get_current_user()
+principal_cache = PrincipalCache(ttl_seconds=PRINCIPAL_CACHE_TTL_SECONDS)
+
+# Per-hub counts for /analytics/hub-summary
+hub_summary_cache = HubSummaryCache(ttl_seconds=HUB_SUMMARY_CACHE_TTL_SECONDS)
+
+# Battery error codes with an unread notification, and the batched writer for new ones
+battery_error_tracker = BatteryErrorTracker(
+    ttl_seconds=BATTERY_ERROR_STATE_TTL_SECONDS,
+    flush_interval_ms=BATTERY_ERROR_FLUSH_INTERVAL_MS
+)
+
 # ============================================================================
 # PYDANTIC MODELS
 # ============================================================================
@@ -1038,6 +1114,51 @@ app.add_middleware(GZipMiddleware, minimum_size=500)
 security = HTTPBearer()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Background writer for queued live-data ingestion (started on startup when enabled)
+live_data_ingest_queue = LiveDataIngestQueue(
+    flush_rows=LIVE_DATA_FLUSH_ROWS,
+    flush_interval_ms=LIVE_DATA_FLUSH_INTERVAL_MS,
+    max_size=LIVE_DATA_QUEUE_MAX
+)
+
+# ============================================================================
+# REQUEST CONCURRENCY
+# ============================================================================
+# Route handlers are plain `def` functions: FastAPI runs them in the anyio
+# threadpool (API_THREADPOOL_SIZE threads, set on startup), so blocking
+# SQLAlchemy calls never stall the event loop. Handlers that need the raw
+# request body get it from an async dependency, which runs on the loop first.
+
+_analytics_semaphore = None
+
+async def read_request_body(request: Request) -> bytes:
+    """Dependency: read the request body on the event loop for a sync handler"""
+    return await request.body()
+
+async def read_login_credentials(request: Request) -> dict:
+    """Dependency: username/password from a JSON body or a form post"""
+    try:
+        body = await request.json()
+        if not isinstance(body, dict):
+            # A JSON list, string or number carries no credentials; the handler answers 400
+            body = {}
+    except Exception:
+        body = await request.form()
+    credentials = {key: body.get(key) for key in ("username", "password")}
+    return {key: value if isinstance(value, str) else None for key, value in credentials.items()}
+
+async def limit_analytics_concurrency():
+    """
+    Dependency: hold one of ANALYTICS_MAX_CONCURRENCY slots while an analytics
+    request runs, so long reports can never occupy the whole threadpool and
+    delay battery webhooks.
+    """
+    global _analytics_semaphore
+    if _analytics_semaphore is None:
+        _analytics_semaphore = anyio.Semaphore(ANALYTICS_MAX_CONCURRENCY)
+    async with _analytics_semaphore:
+        yield
+
 # ============================================================================
 # FIELD MAPPING AND HELPER FUNCTIONS
 # ============================================================================
@@ -1146,6 +1267,117 @@ def create_timestamp_from_fields(battery_data):
         print(f"Warning: Could not create timestamp from date/time fields: {e}. Raw: {raw_str}")
         return (None, raw_str)
 
+def batch_entries_to_columns(entries: list) -> tuple[dict, dict]:
+    """Transpose a list of JSON entries into {field: [values]} columns.
+
+    Returns (columns, rejected) where rejected maps row index -> reason for
+    entries that are not JSON objects.
+    """
+    rejected = {}
+    keys = []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            rejected[index] = "entry is not a JSON object"
+            continue
+        for key in entry:
+            if key not in keys:
+                keys.append(key)
+
+    columns = {
+        key: [entry.get(key) if isinstance(entry, dict) else None for entry in entries]
+        for key in keys
+    }
+    return columns, rejected
+
+def batch_csv_to_columns(csv_text: str) -> tuple[dict, dict, int]:
+    """Parse an SD-card CSV export (the firmware's /sd/data.csv) into columns.
+
+    The first line is the header. The firmware writes a trailing comma on every
+    line and the literal string "None" for missing readings; both are handled.
+
+    Returns (columns, rejected, row_count).
+    """
+    reader = csv.reader(io.StringIO(csv_text))
+    header = next(reader, None)
+    if not header:
+        return {}, {}, 0
+    while header and header[-1].strip() == "":
+        header.pop()
+    header = [name.strip() for name in header]
+
+    columns = {name: [] for name in header}
+    rejected = {}
+    row_count = 0
+    for values in reader:
+        if not values or all(value.strip() == "" for value in values):
+            continue
+        while len(values) > len(header) and values[-1].strip() == "":
+            values.pop()
+        if len(values) != len(header):
+            rejected[row_count] = f"expected {len(header)} columns, got {len(values)}"
+            values = [None] * len(header)
+        for name, value in zip(header, values):
+            if value is not None:
+                value = value.strip()
+                if value == "None":
+                    value = None
+            columns[name].append(value)
+        row_count += 1
+
+    return columns, rejected, row_count
+
+def parse_live_data_columns(columns: dict, row_count: int, battery_id: str, is_final_batch: bool) -> tuple[list, dict]:
+    """Convert column-wise batch data into LiveData row dicts.
+
+    Each mapped field is converted a whole column at a time using
+    LIVE_DATA_FIELD_MAPPING. Rows whose `id` names a different battery are
+    rejected.
+
+    Returns (rows, rejected) where rows[i] is the parsed dict for row i and
+    rejected maps row index -> reason.
+    """
+    created_at = datetime.now(timezone.utc)
+    rows = [
+        {
+            'battery_id': battery_id,
+            'is_final_batch': is_final_batch,
+            'created_at': created_at,
+        }
+        for _ in range(row_count)
+    ]
+    rejected = {}
+
+    for index, value in enumerate(columns.get('id') or []):
+        if value not in (None, "") and str(value) != battery_id:
+            rejected[index] = f"entry id {value} does not match battery {battery_id}"
+
+    timestamp_keys = [key for key in ('d', 'gd', 'tm', 'gt') if key in columns]
+    for index, row in enumerate(rows):
+        fields = {key: columns[key][index] for key in timestamp_keys}
+        row['timestamp'], row['raw_timestamp'] = create_timestamp_from_fields(fields)
+
+    for json_key, values in columns.items():
+        if json_key not in LIVE_DATA_FIELD_MAPPING:
+            continue
+        db_field, target_type = LIVE_DATA_FIELD_MAPPING[json_key]
+        if not hasattr(LiveData, db_field):
+            continue
+        for index, json_value in enumerate(values):
+            converted_value = safe_convert_value(json_value, target_type, json_key)
+            if converted_value is not None:
+                rows[index][db_field] = converted_value
+
+    # Compute awake_state from existing fields if not explicitly sent
+    for row in rows:
+        if 'awake_state' not in row:
+            eu = row.get('usb_enabled', 0) or 0
+            ei = row.get('inverter_enabled', 0) or 0
+            ec = row.get('charging_enabled', 0) or 0
+            ci = row.get('charger_current', 0) or 0
+            row['awake_state'] = 1 if (eu == 1 or ei == 1 or (ec == 1 and ci > 0)) else 0
+
+    return rows, rejected
+
 def calculate_time_period(time_period: str) -> tuple[datetime, datetime]:
     now = datetime.now(timezone.utc)
     
@@ -1188,6 +1420,13 @@ def calculate_time_period(time_period: str) -> tuple[datetime, datetime]:
     
     return start_time, end_time
 
+def list_paging(page_size: Optional[int], cursor: Optional[str], key_count: int = 2) -> Optional[int]:
+    """Page size for a keyset-paged list endpoint (None = unpaged); 400 on a bad cursor"""
+    try:
+        return page_size_for(page_size, cursor, key_count)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # ============================================================================
 # AUTHENTICATION AND AUTHORIZATION
 # ============================================================================
@@ -1196,7 +1435,7 @@ def create_access_token(data: dict, expires_hours: Optional[int] = None):
     to_encode = data.copy()
     expire_hours = expires_hours or USER_TOKEN_EXPIRE_HOURS
     expire = datetime.now(timezone.utc) + timedelta(hours=expire_hours)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "typ": "user"})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def create_battery_token(battery_id: str, expires_hours: Optional[int] = None):
@@ -1208,25 +1447,28 @@ def create_battery_token(battery_id: str, expires_hours: Optional[int] = None):
         "battery_id": battery_id,
         "role": UserRole.BATTERY,
         "type": "battery",
+        "typ": "battery",
         "exp": expiry
     }
     return jwt.encode(token_data, BATTERY_SECRET_KEY, algorithm=ALGORITHM)
 
+def decode_token(token: str) -> dict:
+    """
+    Verify a user or battery token with the key for its `typ` claim.
+    The claim is read (unverified) first so each token is decoded once with
+    the right key; tokens issued before `typ` existed fall back to the
+    battery `type` claim. Raises InvalidTokenError.
+    """
+    unverified = jwt.decode(token, options={"verify_signature": False})
+    token_type = unverified.get("typ") or ("battery" if unverified.get("type") == "battery" else "user")
+    key = BATTERY_SECRET_KEY if token_type == "battery" else SECRET_KEY
+    payload = jwt.decode(token, key, algorithms=[ALGORITHM])
+    payload["typ"] = token_type
+    return payload
+
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
-        log_webhook_event(
-            event_type="token_verification_attempt",
-            status="info",
-            additional_info={"token_prefix": credentials.credentials[:20] + "..."}
-        )
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        log_webhook_event(
-            event_type="token_verification_success",
-            user_info=payload,
-            status="success",
-            additional_info={"user_id": payload.get("user_id"), "role": payload.get("role")}
-        )
-        return payload
+        payload = decode_token(credentials.credentials)
     except InvalidTokenError as e:
         log_webhook_event(
             event_type="token_verification_failed",
@@ -1237,74 +1479,41 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
-
-def verify_battery_or_superadmin_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        log_webhook_event(
-            event_type="battery_token_verification_attempt",
-            status="info",
-            additional_info={"token_prefix": credentials.credentials[:20] + "..."}
-        )
-
-        # Try battery token first
-        try:
-            payload = jwt.decode(credentials.credentials, BATTERY_SECRET_KEY, algorithms=[ALGORITHM])
-            if payload.get("type") == "battery":
-                log_webhook_event(
-                    event_type="battery_token_verified",
-                    user_info=payload,
-                    battery_id=payload.get("battery_id"),
-                    status="success",
-                    additional_info={"token_type": "battery", "battery_id": payload.get("battery_id")}
-                )
-                return payload
-        except Exception as e:
-            log_webhook_event(
-                event_type="battery_token_decode_failed",
-                status="warning",
-                error_message=f"Not a battery token: {str(e)}"
-            )
-
-        # Try superadmin token
-        try:
-            payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-            if payload.get("role") == UserRole.SUPERADMIN:
-                log_webhook_event(
-                    event_type="superadmin_token_verified",
-                    user_info=payload,
-                    status="success",
-                    additional_info={"token_type": "superadmin", "user_id": payload.get("user_id")}
-                )
-                return payload
-        except Exception as e:
-            log_webhook_event(
-                event_type="superadmin_token_decode_failed",
-                status="warning",
-                error_message=f"Not a superadmin token: {str(e)}"
-            )
-
-        log_webhook_event(
-            event_type="token_verification_rejected",
-            status="error",
-            error_message="Token is neither battery nor superadmin"
-        )
+    if payload["typ"] != "user":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Only batteries or superadmins can access this endpoint"
+            detail="Invalid token"
         )
-    except HTTPException:
-        raise
-    except Exception as e:
+    return payload
+
+def verify_battery_or_superadmin_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    try:
+        payload = decode_token(credentials.credentials)
+    except InvalidTokenError as e:
         log_webhook_event(
-            event_type="token_verification_exception",
+            event_type="token_verification_failed",
             status="error",
-            error_message=f"Unexpected error: {str(e)}"
+            error_message=f"Invalid token: {str(e)}"
         )
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
 
+    if payload["typ"] == "battery" or payload.get("role") == UserRole.SUPERADMIN:
+        return payload
+
+    log_webhook_event(
+        event_type="token_verification_rejected",
+        user_info=payload,
+        status="error",
+        error_message="Token is neither battery nor superadmin"
+    )
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Only batteries or superadmins can access this endpoint"
+    )
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -1357,13 +1566,11 @@ def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
 def get_current_user(token_data: dict = Depends(verify_token), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == token_data.get('sub')).first()
-    if user:
-        token_data['hub_id'] = user.hub_id
-        # For DATA_ADMIN users, also get their accessible hubs
-        if user.user_access_level == UserRole.DATA_ADMIN:
-            accessible_hub_ids = [hub.hub_id for hub in user.accessible_hubs]
-            token_data['accessible_hub_ids'] = accessible_hub_ids
+    # hub_id (and accessible_hub_ids for DATA_ADMIN) come from principal_cache,
+    # so most requests resolve the user without touching the database
+    principal = principal_cache.get(db, token_data.get('sub'))
+    if principal:
+        token_data.update(principal)
     return token_data
 
 def user_has_hub_access(current_user: dict, hub_id: int) -> bool:
@@ -1379,132 +1586,11 @@ def user_has_hub_access(current_user: dict, hub_id: int) -> bool:
         # ADMIN, USER roles are restricted to their own hub
         return current_user.get('hub_id') == hub_id
 
-# ============================================================================
-# BATTERY ERROR PROCESSING AND SMART NOTIFICATIONS
-# ============================================================================
-
-# Error code mapping for battery diagnostics
-BATTERY_ERROR_CODES = {
-    'R': {'name': 'rtcError', 'description': 'Real-time clock error', 'severity': 'warning'},
-    'C': {'name': 'powerSensorChargeError', 'description': 'Power sensor charge error', 'severity': 'error'},
-    'U': {'name': 'powerSensorUsbError', 'description': 'Power sensor USB error', 'severity': 'warning'},
-    'T': {'name': 'tempSensorError', 'description': 'Temperature sensor error', 'severity': 'warning'},
-    'B': {'name': 'batteryMonitorError', 'description': 'Battery monitor error', 'severity': 'error'},
-    'G': {'name': 'gpsError', 'description': 'GPS error', 'severity': 'warning'},
-    'S': {'name': 'sdError', 'description': 'SD card error', 'severity': 'warning'},
-    'L': {'name': 'lteError', 'description': 'LTE connection error', 'severity': 'error'},
-    'D': {'name': 'displayError', 'description': 'Display error', 'severity': 'info'},
-}
-
-def decode_error_string(error_string: str) -> list[dict]:
-    """
-    Decode battery error string into list of errors
-
-    Args:
-        error_string: String containing error codes (e.g., "TG", "RCB")
-
-    Returns:
-        List of error dictionaries with code, name, description, and severity
-        Unknown codes are still included with a generic description
-    """
-    errors = []
-    for char in error_string.strip().upper():
-        if char in BATTERY_ERROR_CODES:
-            error_info = BATTERY_ERROR_CODES[char].copy()
-            error_info['code'] = char
-            errors.append(error_info)
-        else:
-            # Handle unknown error codes - still record them
-            errors.append({
-                'code': char,
-                'name': f'unknownError_{char}',
-                'description': f'Unknown error code: {char}',
-                'severity': 'warning'
-            })
-    return errors
-
-def process_battery_errors(db: Session, battery_id: str, error_string: str, hub_id: int):
-    """
-    Process battery error codes and create smart notifications
-
-    Features:
-    - Decodes error string into human-readable errors
-    - Creates notifications for NEW errors only (no flooding)
-    - Tracks which errors have active notifications
-    - Only creates new notification if old one was dismissed and error persists
-
-    Args:
-        db: Database session
-        battery_id: Battery ID
-        error_string: Error codes string (e.g., "TG", "RCB")
-        hub_id: Hub ID for the notification
-    """
-    from models import Notification, BEPPPBattery
-
-    # Decode error string
-    errors = decode_error_string(error_string)
-
-    if not errors:
-        return  # No errors, nothing to do
-
-    # Get battery name for notification message
-    battery = db.query(BEPPPBattery).filter(BEPPPBattery.battery_id == battery_id).first()
-    battery_name = (battery.short_id if battery and battery.short_id else f"Battery #{battery_id}")
-
-    # For each error, check if we already have an active notification
-    for error in errors:
-        error_code = error['code']
-        error_name = error['name']
-        error_desc = error['description']
-        severity = error['severity']
-
-        # Check for existing UNREAD notification with this exact error for this battery
-        # This prevents flooding - we only have one notification per error type per battery
-        notification_type = f"battery_error_{error_code}"
-
-        existing_notification = db.query(Notification).filter(
-            Notification.hub_id == hub_id,
-            Notification.link_type == 'battery',
-            Notification.link_id == str(battery_id),
-            Notification.notification_type == notification_type,
-            Notification.is_read == False  # Only unread notifications matter
-        ).first()
-
-        if existing_notification:
-            # We already have an active notification for this error
-            # Don't create a new one (prevents flooding)
-            continue
-
-        # No active notification exists - create a new one
-        # This will show even if a previous notification was dismissed
-        # (allowing users to be re-notified if they dismissed it but problem persists)
-
-        notification = Notification(
-            hub_id=hub_id,
-            user_id=None,  # Hub-wide notification
-            notification_type=notification_type,
-            title=f"{battery_name}: {error_desc}",
-            message=f"Error code '{error_code}' detected on {battery_name}. {error_desc}. Please check the battery error log for more details.",
-            severity=severity,
-            is_read=False,
-            link_type='battery',
-            link_id=str(battery_id)
-        )
-
-        db.add(notification)
-
-    # Commit all new notifications
-    try:
-        db.commit()
-    except Exception as e:
-        print(f"Failed to create error notifications: {e}")
-        db.rollback()
-
 # ============================================================================
 # WEBHOOK HANDLERS
 # ============================================================================
 
-async def handle_direct_format(battery_data: dict, db: Session, current_user: dict):
+def handle_direct_format(battery_data: dict, db: Session, current_user: dict):
     battery_data.pop('access_token', None)
     
     battery_id = None
@@ -1563,7 +1649,7 @@ async def handle_direct_format(battery_data: dict, db: Session, current_user: di
             status="success"
         )
     
-    unique_id = int(datetime.now().timestamp() * 1000000)
+    unique_id = live_data_ids.allocate(db)[0]
     timestamp, raw_timestamp = create_timestamp_from_fields(battery_data)
 
     parsed_data = {
@@ -1638,13 +1724,22 @@ async def handle_direct_format(battery_data: dict, db: Session, current_user: di
         )
     
     try:
-        db.add(live_data)
-        db.commit()
-        db.refresh(live_data)
+        # Queued mode: the background writer inserts the row and updates
+        # last_data_received as part of its next batch
+        queued = (
+            LIVE_DATA_INGEST_MODE == "queued"
+            and live_data_ingest_queue.enqueue(live_data_row(parsed_data))
+        )
 
-        # Update battery's last_data_received timestamp
-        battery.last_data_received = datetime.now(timezone.utc)
-        db.commit()
+        if not queued:
+            db.add(live_data)
+            upsert_latest_state(db, [live_data_row(parsed_data)])
+            db.commit()
+            db.refresh(live_data)
+
+            # Update battery's last_data_received timestamp
+            battery.last_data_received = datetime.now(timezone.utc)
+            db.commit()
 
         # Auto-return: if telemetry shows charging (positive current), mark any active rental as returned
         is_charging = (
@@ -1692,14 +1787,9 @@ async def handle_direct_format(battery_data: dict, db: Session, current_user: di
                 status="success"
             )
 
-        # Process error codes and create smart notifications if needed
+        # Raise notifications for error codes that don't have an unread one yet
         if live_data.err and live_data.err.strip():
-            process_battery_errors(
-                db=db,
-                battery_id=battery_id,
-                error_string=live_data.err,
-                hub_id=battery.hub_id
-            )
+            battery_error_tracker.report(battery_id, battery.hub_id, live_data.err, battery_name=battery.short_id)
 
     except Exception as e:
         log_webhook_event(
@@ -1713,7 +1803,7 @@ async def handle_direct_format(battery_data: dict, db: Session, current_user: di
     
     response = {
         "status": "success",
-        "data_id": live_data.id,
+        "queued": queued,
         "battery_id": battery_id,
         "timestamp": live_data.timestamp.isoformat(),
         "submitted_by": current_user.get('sub'),
@@ -1733,6 +1823,10 @@ async def handle_direct_format(battery_data: dict, db: Session, current_user: di
             }
         }
     }
+    # A queued row is written by the next batch flush (and could still fail
+    # there), so it has no data_id to report yet
+    if not queued:
+        response["data_id"] = live_data.id
     
     if DEBUG:
         response["debug"] = {
@@ -1744,7 +1838,7 @@ async def handle_direct_format(battery_data: dict, db: Session, current_user: di
     
     return response
 
-async def handle_webhook_format(webhook_data: dict, db: Session, current_user: dict):
+def handle_webhook_format(webhook_data: dict, db: Session, current_user: dict):
     data_property = None
     for value in webhook_data.get('values', []):
         if value.get("name") == "data":
@@ -1814,7 +1908,7 @@ async def handle_webhook_format(webhook_data: dict, db: Session, current_user: d
             status="info"
         )
     
-    return await handle_direct_format(battery_data, db, current_user)
+    return handle_direct_format(battery_data, db, current_user)
 
 # ============================================================================
 # WEBHOOK ENDPOINT FOR LIVE DATA
@@ -1943,11 +2037,14 @@ async def handle_webhook_format(webhook_data: dict, db: Session, current_user: d
     {
         "status": "success",
         "data_id": 12345,
+        "queued": false,
         "battery_id": 123,
         "timestamp": "2025-07-11T14:30:20Z",
         "fields_processed": 25
     }
     ```
+    With LIVE_DATA_INGEST_MODE=queued the reading is written by a background
+    batch: the response has `"queued": true` and no `data_id`.
     
     ### Error Handling:
     - **401**: Invalid or expired token
@@ -1963,8 +2060,9 @@ async def handle_webhook_format(webhook_data: dict, db: Session, current_user: d
     - Validate data locally before submission
     """,
     response_description="Data submission confirmation and metadata")
-async def receive_live_data(
+def receive_live_data(
     request: Request,
+    raw_body: bytes = Depends(read_request_body),
     db: Session = Depends(get_db),
     current_user: dict = Depends(verify_battery_or_superadmin_token)
 ):
@@ -1992,7 +2090,7 @@ async def receive_live_data(
             }
         )
 
-        battery_data = await request.json()
+        battery_data = json.loads(raw_body)
 
         log_webhook_event(
             event_type="webhook_data_received",
@@ -2032,7 +2130,7 @@ async def receive_live_data(
                     battery_id=battery_id,
                     status="info"
                 )
-            result = await handle_webhook_format(battery_data, db, current_user)
+            result = handle_webhook_format(battery_data, db, current_user)
         else:
             if DEBUG:
                 log_webhook_event(
@@ -2041,7 +2139,7 @@ async def receive_live_data(
                     battery_id=battery_id,
                     status="info"
                 )
-            result = await handle_direct_format(battery_data, db, current_user)
+            result = handle_direct_format(battery_data, db, current_user)
         
         data_id = result.get('data_id')
         battery_id = result.get('battery_id')
@@ -2146,10 +2244,15 @@ async def receive_live_data(
     tags=["Batteries"],
     summary="Batch Battery Data Submission",
     description="Accepts a batch of historical live data entries from a battery's SD card. "
-                "Max 100 entries per request. Uses same field mapping as single live-data endpoint.",
-    response_description="Batch submission result with stored/skipped counts")
-async def receive_batch_live_data(
+                "The body is either JSON (`{\"battery_id\", \"entries\": [...], \"fb\"}`) or the raw "
+                "`/sd/data.csv` contents with `Content-Type: text/csv` (pass `battery_id` and `fb` as query "
+                "parameters), optionally gzip-compressed with `Content-Encoding: gzip`. "
+                "Up to BATCH_LIVE_DATA_MAX_ENTRIES entries per request (default 5000). Rows are loaded with "
+                "PostgreSQL COPY; rejected rows are reported by index. Uses same field mapping as single live-data endpoint.",
+    response_description="Batch submission result with stored/skipped counts and per-row rejections")
+def receive_batch_live_data(
     request: Request,
+    raw_body: bytes = Depends(read_request_body),
     db: Session = Depends(get_db),
     current_user: dict = Depends(verify_battery_or_superadmin_token)
 ):
@@ -2161,18 +2264,49 @@ async def receive_batch_live_data(
     error_msg = None
 
     try:
-        request_body = await request.json()
-        battery_id = str(request_body.get('battery_id', '')) or None
-        entries = request_body.get('entries', [])
+        if request.headers.get('content-encoding', '').lower() == 'gzip' or raw_body[:2] == b'\x1f\x8b':
+            try:
+                raw_body = gzip.decompress(raw_body)
+            except OSError:
+                raise HTTPException(status_code=400, detail="Invalid gzip body")
+
+        content_type = request.headers.get('content-type', '').lower()
+        if 'csv' in content_type:
+            body_format = 'csv'
+            columns, rejected, row_count = batch_csv_to_columns(raw_body.decode('utf-8', errors='replace'))
+            battery_id = request.query_params.get('battery_id') or None
+            if not battery_id and columns.get('id'):
+                battery_id = next((str(value) for value in columns['id'] if value), None)
+            is_final_batch = request.query_params.get('fb', '0') in ('1', 'true', 'True')
+            request_body = {"battery_id": battery_id, "format": "csv", "entries": row_count, "fb": int(is_final_batch)}
+        else:
+            body_format = 'json'
+            try:
+                request_body = json.loads(raw_body)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid JSON body")
+            if not isinstance(request_body, dict):
+                raise HTTPException(status_code=400, detail="Invalid JSON body")
+            battery_id = str(request_body.get('battery_id', '')) or None
+            entries = request_body.get('entries', [])
+            if not entries or not isinstance(entries, list):
+                raise HTTPException(status_code=400, detail="Missing or invalid entries array")
+            columns, rejected = batch_entries_to_columns(entries)
+            row_count = len(entries)
+            # Read final-batch flag from request body (firmware sends fb: 0 or 1)
+            is_final_batch = bool(request_body.get('fb', 0))
 
         if not battery_id:
             raise HTTPException(status_code=400, detail="Missing battery_id")
 
-        if not entries or not isinstance(entries, list):
+        if row_count == 0:
             raise HTTPException(status_code=400, detail="Missing or invalid entries array")
 
-        if len(entries) > 100:
-            raise HTTPException(status_code=400, detail="Max 100 entries per batch request")
+        if row_count > BATCH_LIVE_DATA_MAX_ENTRIES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Max {BATCH_LIVE_DATA_MAX_ENTRIES} entries per batch request"
+            )
 
         # Verify battery can only submit for itself
         if current_user.get('role') == UserRole.BATTERY:
@@ -2184,86 +2318,56 @@ async def receive_batch_live_data(
         if not battery:
             raise HTTPException(status_code=404, detail=f"Battery {battery_id} not found")
 
-        # Read final-batch flag from request body (firmware sends fb: 0 or 1)
-        is_final_batch = bool(request_body.get('fb', 0))
+        parsed_rows, parse_rejected = parse_live_data_columns(columns, row_count, battery_id, is_final_batch)
+        rejected.update(parse_rejected)
 
-        stored_count = 0
-        skipped_count = 0
-        last_live_data = None
-
-        for entry in entries:
-            try:
-                # Inject battery_id into entry if not present
-                if 'id' not in entry:
-                    entry['id'] = battery_id
-
-                unique_id = int(datetime.now().timestamp() * 1000000)
-                timestamp, raw_timestamp = create_timestamp_from_fields(entry)
-
-                parsed_data = {
-                    'id': unique_id,
-                    'battery_id': battery_id,
-                    'timestamp': timestamp,
-                    'raw_timestamp': raw_timestamp,
-                    'is_final_batch': is_final_batch,
-                    'created_at': datetime.now(timezone.utc)
-                }
-
-                for json_key, json_value in entry.items():
-                    if json_key in ['id', 'd', 'gd', 'tm', 'gt']:
-                        continue
-                    if json_key in LIVE_DATA_FIELD_MAPPING:
-                        db_field, target_type = LIVE_DATA_FIELD_MAPPING[json_key]
-                        if hasattr(LiveData, db_field):
-                            converted_value = safe_convert_value(json_value, target_type, json_key)
-                            if converted_value is not None:
-                                parsed_data[db_field] = converted_value
-
-                # Compute awake_state from existing fields if not explicitly sent
-                if 'awake_state' not in parsed_data:
-                    eu = parsed_data.get('usb_enabled', 0) or 0
-                    ei = parsed_data.get('inverter_enabled', 0) or 0
-                    ec = parsed_data.get('charging_enabled', 0) or 0
-                    ci = parsed_data.get('charger_current', 0) or 0
-                    parsed_data['awake_state'] = 1 if (eu == 1 or ei == 1 or (ec == 1 and ci > 0)) else 0
+        accepted_indexes = [index for index in range(row_count) if index not in rejected]
+        accepted = []
+        for index, row_id in zip(accepted_indexes, live_data_ids.allocate(db, len(accepted_indexes))):
+            parsed_rows[index]['id'] = row_id
+            accepted.append((index, live_data_row(parsed_rows[index])))
 
+        # Load everything in one COPY; if any row breaks it, fall back to
+        # row-by-row inserts so the good rows still land and the bad ones
+        # are reported individually
+        try:
+            copy_live_data(db, [row for _, row in accepted])
+            db.commit()
+        except Exception as copy_err:
+            db.rollback()
+            webhook_logger.warning(f"Batch COPY for battery {battery_id} failed, retrying row by row: {copy_err}")
+            stored_rows = []
+            for index, row in accepted:
                 try:
-                    live_data = LiveData(**parsed_data)
-                except TypeError:
-                    valid_fields = {k: v for k, v in parsed_data.items() if hasattr(LiveData, k)}
-                    live_data = LiveData(**valid_fields)
-
-                db.add(live_data)
-                stored_count += 1
-                last_live_data = live_data
-
-            except Exception as entry_err:
-                print(f"Warning: skipped batch entry: {entry_err}")
-                skipped_count += 1
-
-        # Single commit for entire batch
-        db.commit()
-
-        # Update battery's last_data_received
-        battery.last_data_received = datetime.now(timezone.utc)
-        db.commit()
+                    bulk_insert_live_data(db, [row])
+                    db.commit()
+                    stored_rows.append((index, row))
+                except Exception as row_err:
+                    db.rollback()
+                    rejected[index] = f"insert failed: {str(row_err).splitlines()[0]}"
+            accepted = stored_rows
 
         # Process error notifications for the last entry only (most recent state)
-        if last_live_data and last_live_data.err and last_live_data.err.strip():
-            process_battery_errors(
-                db=db,
-                battery_id=battery_id,
-                error_string=last_live_data.err,
-                hub_id=battery.hub_id
-            )
+        last_row = accepted[-1][1] if accepted else None
+        if last_row and last_row.get('err') and last_row['err'].strip():
+            battery_error_tracker.report(battery_id, battery.hub_id, last_row['err'], battery_name=battery.short_id)
 
         result = {
             "status": "success",
-            "stored": stored_count,
-            "skipped": skipped_count,
-            "total_submitted": len(entries)
+            "stored": len(accepted),
+            "skipped": len(rejected),
+            "total_submitted": row_count,
+            "format": body_format,
+            "rejected": [
+                {"index": index, "reason": reason}
+                for index, reason in sorted(rejected.items())
+            ]
         }
 
+        # Keep audit log rows small: only small JSON batches are logged verbatim
+        if body_format == 'json' and row_count > 100:
+            request_body = {"battery_id": battery_id, "format": "json", "entries": row_count, "fb": int(is_final_batch)}
+
         processing_time_ms = int((datetime.now() - request_start_time).total_seconds() * 1000)
         log_webhook_to_db(
             db=db,
@@ -2345,10 +2449,11 @@ async def receive_batch_live_data(
     ```
     """,
     response_description="JWT token and user information")
-async def create_token(
+def create_token(
     request: Request,
     db: Session = Depends(get_db),
-    user_login: UserLogin = None
+    user_login: UserLogin = None,
+    credentials: dict = Depends(read_login_credentials)
 ):
     try:
         # Extract headers for logging
@@ -2363,14 +2468,8 @@ async def create_token(
         )
 
         if user_login is None:
-            try:
-                body = await request.json()
-                username = body.get("username")
-                password = body.get("password")
-            except:
-                form_data = await request.form()
-                username = form_data.get("username")
-                password = form_data.get("password")
+            username = credentials["username"]
+            password = credentials["password"]
         else:
             username = user_login.username
             password = user_login.password
@@ -2471,7 +2570,7 @@ async def create_token(
     tags=["Authentication"],
     summary="Refresh User Token",
     response_description="New JWT token and user information")
-async def refresh_user_token(
+def refresh_user_token(
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -2561,85 +2660,42 @@ async def refresh_user_token(
     - Handle authentication failures gracefully
     """,
     response_description="JWT token for battery device with expiration and scope information")
-async def battery_login(
+def battery_login(
     request: Request,
     battery_login: BatteryLogin,
     db: Session = Depends(get_db)
 ):
     """Battery self-authentication"""
     try:
-        # Extract headers for logging
-        headers = extract_request_headers(request)
-
-        # Log battery login attempt (to file AND database)
-        log_webhook_event(
-            event_type="battery_login_attempt",
-            battery_id=battery_login.battery_id,
-            status="info",
-            additional_info={"battery_id": str(battery_login.battery_id)},
-            request_headers=headers,
-            db=db  # NEW: Pass db to save to database
-        )
-
-        battery = db.query(BEPPPBattery).filter(BEPPPBattery.battery_id == battery_login.battery_id).first()
-        if not battery:
+        # Successful logins are only written to the log file; failures are also
+        # persisted so they show up on the Webhook Logs page
+        ok, error = battery_credentials.verify(db, battery_login.battery_id, battery_login.battery_secret)
+        if not ok:
             log_webhook_event(
                 event_type="battery_login_failed",
                 battery_id=battery_login.battery_id,
                 status="error",
-                error_message="Battery not found",
-                request_headers=headers,
-                db=db  # NEW: Pass db to save to database
-            )
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid battery credentials"
-            )
-
-        if not battery.battery_secret:
-            log_webhook_event(
-                event_type="battery_login_failed",
-                battery_id=battery_login.battery_id,
-                status="error",
-                error_message="Battery not configured for authentication",
-                request_headers=headers,
-                db=db  # NEW: Pass db to save to database
+                error_message=error,
+                request_headers=extract_request_headers(request),
+                db=db
             )
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Battery not configured for authentication"
-            )
-
-        if battery.battery_secret != battery_login.battery_secret:
-            log_webhook_event(
-                event_type="battery_login_failed",
-                battery_id=battery_login.battery_id,
-                status="error",
-                error_message="Invalid battery secret",
-                request_headers=headers,
-                db=db  # NEW: Pass db to save to database
-            )
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid battery credentials"
+                if error == "Battery not configured for authentication"
+                else "Invalid battery credentials"
             )
 
         token = create_battery_token(battery_login.battery_id)
 
-        # Log successful battery login (to file AND database)
-        # NOTE: Logging full token temporarily for debugging - REMOVE in production
         log_webhook_event(
             event_type="battery_login_success",
             battery_id=battery_login.battery_id,
             status="success",
             additional_info={
-                "battery_id": str(battery_login.battery_id),
                 "token_expires_in_hours": BATTERY_TOKEN_EXPIRE_HOURS,
-                "scope": "webhook_write",
-                "token": token  # TEMPORARY: Full token for debugging hardware issues
-            },
-            request_headers=headers,
-            db=db  # NEW: Pass db to save to database
+                "scope": "webhook_write"
+            }
         )
 
         return {
@@ -2659,8 +2715,8 @@ async def battery_login(
             battery_id=battery_login.battery_id,
             status="error",
             error_message=str(e),
-            request_headers=headers,
-            db=db  # NEW: Pass db to save to database
+            request_headers=extract_request_headers(request),
+            db=db
         )
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -2758,7 +2814,7 @@ async def battery_login(
     - **500**: Server error - retry with exponential backoff
     """,
     response_description="New JWT token for battery device")
-async def battery_refresh_token(
+def battery_refresh_token(
     db: Session = Depends(get_db),
     current_battery: dict = Depends(verify_battery_or_superadmin_token)
 ):
@@ -2777,8 +2833,8 @@ async def battery_refresh_token(
                 detail="Invalid battery token"
             )
         
-        battery = db.query(BEPPPBattery).filter(BEPPPBattery.battery_id == battery_id).first()
-        if not battery:
+        exists, _ = battery_credentials.lookup(db, battery_id)
+        if not exists:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Battery not found"
@@ -2804,7 +2860,7 @@ async def battery_refresh_token(
         )
 
 @app.post("/auth/battery-token")
-async def create_battery_token_endpoint(
+def create_battery_token_endpoint(
     battery_auth: BatteryAuth,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -2893,7 +2949,7 @@ async def create_battery_token_endpoint(
         )
 
 @app.post("/admin/battery-secret/{battery_id}")
-async def set_battery_secret(
+def set_battery_secret(
     battery_id: str,
     secret_update: BatterySecretUpdate,
     db: Session = Depends(get_db),
@@ -2910,6 +2966,7 @@ async def set_battery_secret(
         
         battery.battery_secret = secret_update.new_secret
         db.commit()
+        battery_credentials.invalidate(battery_id)
         
         return {
             "message": f"Battery secret updated for battery {battery_id}",
@@ -2928,7 +2985,7 @@ async def set_battery_secret(
         )
 
 @app.get("/admin/token-config")
-async def get_token_config(
+def get_token_config(
     current_user: dict = Depends(get_current_user)
 ):
     """Get current token configuration (admin/superadmin only)"""
@@ -2968,7 +3025,7 @@ async def get_token_config(
     - Created hub information
     """,
     response_description="Created solar hub details")
-async def create_hub(
+def create_hub(
     hub: SolarHubCreate,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -3005,7 +3062,7 @@ async def create_hub(
     - Solar hub details
     """,
     response_description="Solar hub details")
-async def get_hub(
+def get_hub(
     hub_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -3020,7 +3077,7 @@ async def get_hub(
     return hub
 
 @app.put("/hubs/{hub_id}")
-async def update_hub(
+def update_hub(
     hub_id: int,
     hub_update: SolarHubUpdate,
     db: Session = Depends(get_db),
@@ -3046,7 +3103,7 @@ async def update_hub(
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/hubs/{hub_id}")
-async def delete_hub(
+def delete_hub(
     hub_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -3062,6 +3119,8 @@ async def delete_hub(
         
         db.delete(hub)
         db.commit()
+        # Users lose access to the deleted hub
+        principal_cache.invalidate()
         return {"message": "Hub deleted successfully"}
     except Exception as e:
         db.rollback()
@@ -3085,7 +3144,7 @@ async def delete_hub(
     - List of accessible hubs
     """,
     response_description="List of accessible solar hubs")
-async def list_hubs(
+def list_hubs(
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
@@ -3127,7 +3186,7 @@ async def list_hubs(
     For other users, this changes their primary hub assignment.
     """,
     response_description="Access grant confirmation")
-async def grant_hub_access(
+def grant_hub_access(
     user_id: int,
     hub_id: int,
     db: Session = Depends(get_db),
@@ -3156,11 +3215,13 @@ async def grant_hub_access(
         # Grant additional hub access
         user.accessible_hubs.append(hub)
         db.commit()
+        principal_cache.invalidate(user.username)
         return {"message": f"Additional hub access granted to DATA_ADMIN user {user_id} for hub {hub_id}"}
     else:
         # For other users, change their primary hub assignment
         user.hub_id = hub_id
         db.commit()
+        principal_cache.invalidate(user.username)
         return {"message": f"User {user_id} hub changed to {hub_id}"}
 
 @app.delete("/admin/user-hub-access/{user_id}/{hub_id}",
@@ -3187,7 +3248,7 @@ async def grant_hub_access(
     For other users, use the grant endpoint to change their primary hub.
     """,
     response_description="Access revoke confirmation")
-async def revoke_hub_access(
+def revoke_hub_access(
     user_id: int,
     hub_id: int,
     db: Session = Depends(get_db),
@@ -3218,6 +3279,7 @@ async def revoke_hub_access(
     # Revoke access
     user.accessible_hubs.remove(hub)
     db.commit()
+    principal_cache.invalidate(user.username)
 
     return {"message": f"Hub access revoked from user {user_id} for hub {hub_id}"}
 
@@ -3237,12 +3299,19 @@ def serialize_user(user):
     return data
 
 @app.get("/users/")
-async def list_users(
+def list_users(
     hub_id: Optional[int] = Query(None, description="Filter by hub. Superadmins see all hubs if omitted."),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    page_size: Optional[int] = Query(None, ge=1, le=1000, description="Page size. Paged responses are ordered by most recently updated and include next_cursor"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return for each item"),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """List users. Superadmins can see all hubs or filter by hub_id. Others see their hub only."""
+    """
+    List users. Superadmins can see all hubs or filter by hub_id. Others see their hub only.
+    With page_size or cursor, returns {"items", "next_cursor"} ordered by most recently updated.
+    """
+    page = list_paging(page_size, cursor)
     if current_user.get('role') == UserRole.DATA_ADMIN:
         raise HTTPException(status_code=403, detail="Data admins cannot access user information")
 
@@ -3258,11 +3327,18 @@ async def list_users(
         # Non-superadmins always scoped to their hub
         query = query.filter(User.hub_id == user_hub_id)
 
+    if page:
+        users, next_cursor = split_page(
+            keyset_query(query, (User.updated_at, User.user_id), cursor, page).all(),
+            page, key=lambda user: (user.updated_at, user.user_id)
+        )
+        return {"items": project([serialize_user(u) for u in users], parse_fields(fields)), "next_cursor": next_cursor}
+
     users = query.all()
-    return [serialize_user(u) for u in users]
+    return project([serialize_user(u) for u in users], parse_fields(fields))
 
 @app.post("/users/")
-async def create_user(
+def create_user(
     user: UserCreate,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -3379,6 +3455,7 @@ async def create_user(
 
         db.commit()
         db.refresh(db_user)
+        principal_cache.invalidate(db_user.username)
 
         # Return user with generated credentials if they were auto-generated
         response_data = {
@@ -3400,7 +3477,7 @@ async def create_user(
         raise HTTPException(status_code=400, detail=error_msg or "Failed to create user")
 
 @app.get("/users/{user_id}")
-async def get_user(
+def get_user(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -3420,7 +3497,7 @@ async def get_user(
     return serialize_user(user)
 
 @app.put("/users/{user_id}")
-async def update_user(
+def update_user(
     user_id: int,
     user_update: UserUpdate,
     db: Session = Depends(get_db),
@@ -3497,11 +3574,14 @@ async def update_user(
                 heat = user.monthly_energy_heat or 0
             update_data["monthly_energy_expenditure"] = electricity + heat
 
+        previous_username = user.username
         for key, value in update_data.items():
             setattr(user, key, value)
 
         db.commit()
         db.refresh(user)
+        principal_cache.invalidate(previous_username)
+        principal_cache.invalidate(user.username)
         return serialize_user(user)
     except Exception as e:
         db.rollback()
@@ -3511,7 +3591,7 @@ class PasswordReset(BaseModel):
     password: Optional[str] = None  # If not provided, auto-generate
 
 @app.post("/users/{user_id}/reset-password")
-async def reset_user_password(
+def reset_user_password(
     user_id: int,
     password_data: Optional[PasswordReset] = Body(None),
     db: Session = Depends(get_db),
@@ -3574,7 +3654,7 @@ class PasswordChange(BaseModel):
     new_password: str
 
 @app.post("/users/me/change-password")
-async def change_own_password(
+def change_own_password(
     password_data: PasswordChange,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -3607,7 +3687,7 @@ async def change_own_password(
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/users/{user_id}")
-async def delete_user(
+def delete_user(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -3629,13 +3709,14 @@ async def delete_user(
 
         db.delete(user)
         db.commit()
+        principal_cache.invalidate(user.username)
         return {"message": "User deleted successfully"}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/hubs/{hub_id}/users")
-async def list_hub_users(
+def list_hub_users(
     hub_id: int,
     modified_after: Optional[str] = Query(None, description="ISO datetime - only return records updated after this time"),
     db: Session = Depends(get_db),
@@ -3660,7 +3741,7 @@ async def list_hub_users(
     return [serialize_user(u) for u in users]
 
 @app.get("/users/by-short-id/{short_id}")
-async def get_user_by_short_id(
+def get_user_by_short_id(
     short_id: str,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -3688,7 +3769,7 @@ UPLOAD_DIR = Path("/app/uploads/id_documents")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 @app.post("/users/{user_id}/upload-id-photo")
-async def upload_id_document_photo(
+def upload_id_document_photo(
     user_id: int,
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
@@ -3717,7 +3798,7 @@ async def upload_id_document_photo(
         )
 
     # Validate file size (max 5MB)
-    file_content = await file.read()
+    file_content = file.file.read()
     if len(file_content) > 5 * 1024 * 1024:
         raise HTTPException(status_code=400, detail="File size must be less than 5MB")
 
@@ -3741,7 +3822,7 @@ async def upload_id_document_photo(
     return {"message": "Photo uploaded successfully", "photo_url": photo_url}
 
 @app.get("/uploads/id_documents/{filename}")
-async def get_id_document_photo(
+def get_id_document_photo(
     filename: str,
     current_user: dict = Depends(get_current_user)
 ):
@@ -3758,7 +3839,7 @@ async def get_id_document_photo(
 # ============================================================================
 
 @app.post("/batteries/")
-async def create_battery(
+def create_battery(
     battery: BatteryCreate,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -3796,16 +3877,24 @@ async def create_battery(
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/batteries/")
-async def list_batteries(
+def list_batteries(
     hub_id: Optional[int] = Query(None, description="Filter by hub ID"),
     status: Optional[str] = Query(None, description="Filter by battery status (available, rented, maintenance, retired)"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     modified_after: Optional[str] = Query(None, description="ISO datetime - only return records updated after this time"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    page_size: Optional[int] = Query(None, ge=1, le=1000, description="Page size. Paged responses are ordered by most recently updated and include next_cursor"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return for each item"),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """List all batteries (with optional hub and status filters)"""
+    """
+    List all batteries (with optional hub and status filters).
+    With page_size or cursor, skip/limit are ignored and the response is
+    {"items", "next_cursor"} ordered by most recently updated.
+    """
+    page = list_paging(page_size, cursor)
     query = db.query(BEPPPBattery)
 
     # Apply hub filter based on user role and parameters
@@ -3828,11 +3917,28 @@ async def list_batteries(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid modified_after format")
 
-    batteries = query.offset(skip).limit(limit).all()
+    next_cursor = None
+    if page:
+        batteries, next_cursor = split_page(
+            keyset_query(query, (BEPPPBattery.updated_at, BEPPPBattery.battery_id), cursor, page).all(),
+            page, key=lambda battery: (battery.updated_at, battery.battery_id)
+        )
+    else:
+        batteries = query.offset(skip).limit(limit).all()
+
+    selected_fields = parse_fields(fields)
+    if selected_fields:
+        batteries = project([
+            {c.name: getattr(b, c.name) for c in b.__table__.columns if c.name != 'battery_secret'}
+            for b in batteries
+        ], selected_fields)
+
+    if page:
+        return {"items": batteries, "next_cursor": next_cursor}
     return batteries
 
 @app.get("/batteries/{battery_id}")
-async def get_battery(
+def get_battery(
     battery_id: str,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -3849,7 +3955,7 @@ async def get_battery(
     return battery
 
 @app.put("/batteries/{battery_id}")
-async def update_battery(
+def update_battery(
     battery_id: str,
     battery_update: BatteryUpdate,
     db: Session = Depends(get_db),
@@ -3879,6 +3985,8 @@ async def update_battery(
         
         db.commit()
         db.refresh(battery)
+        if 'battery_secret' in update_data:
+            battery_credentials.invalidate(battery_id)
         
         result = {c.name: getattr(battery, c.name) for c in battery.__table__.columns}
         result.pop('battery_secret', None)
@@ -3889,7 +3997,7 @@ async def update_battery(
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/batteries/{battery_id}")
-async def delete_battery(
+def delete_battery(
     battery_id: str,
     force: bool = Query(False, description="Force delete with all related data (superadmin only)"),
     db: Session = Depends(get_db),
@@ -3939,10 +4047,12 @@ async def delete_battery(
             
             # 3. Delete live data
             deleted_live_data = db.query(LiveData).filter(LiveData.battery_id == battery_id).delete(synchronize_session=False)
+            delete_battery_rollups(db, battery_id)
             
             # 4. Finally delete the battery
             db.delete(battery)
             db.commit()
+            battery_credentials.invalidate(battery_id)
             
             return {
                 "message": "Battery and all related data force deleted",
@@ -3957,6 +4067,7 @@ async def delete_battery(
             # Safe deletion - no associated data
             db.delete(battery)
             db.commit()
+            battery_credentials.invalidate(battery_id)
             return {"message": f"Battery {battery_id} deleted successfully"}
             
     except Exception as e:
@@ -3964,7 +4075,7 @@ async def delete_battery(
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.get("/hubs/{hub_id}/batteries")
-async def list_hub_batteries(
+def list_hub_batteries(
     hub_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -3977,7 +4088,7 @@ async def list_hub_batteries(
     return db.query(BEPPPBattery).filter(BEPPPBattery.hub_id == hub_id).all()
 
 @app.get("/batteries/by-short-id/{short_id}")
-async def get_battery_by_short_id(
+def get_battery_by_short_id(
     short_id: str,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -3999,7 +4110,7 @@ async def get_battery_by_short_id(
 # ============================================================================
 
 @app.get("/batteries/{battery_id}/notes", tags=["Batteries"])
-async def get_battery_notes(
+def get_battery_notes(
     battery_id: str,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -4038,7 +4149,7 @@ async def get_battery_notes(
 
 
 @app.get("/batteries/{battery_id}/errors", tags=["Batteries"])
-async def get_battery_errors(
+def get_battery_errors(
     battery_id: str,
     limit: int = 50,
     time_period: str = "last_week",
@@ -4115,7 +4226,7 @@ async def get_battery_errors(
 
 
 @app.post("/batteries/{battery_id}/notes", tags=["Batteries"])
-async def create_battery_note(
+def create_battery_note(
     battery_id: str,
     note_data: dict,
     db: Session = Depends(get_db),
@@ -4214,7 +4325,7 @@ async def create_battery_note(
     - Created PUE equipment details
     """,
     response_description="Created PUE equipment information")
-async def create_pue_item(
+def create_pue_item(
     pue: PUECreate,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -4258,7 +4369,7 @@ async def create_pue_item(
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/pue/{pue_id}")
-async def get_pue_item(
+def get_pue_item(
     pue_id: str,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -4278,7 +4389,7 @@ async def get_pue_item(
     return pue
 
 @app.put("/pue/{pue_id}")
-async def update_pue_item(
+def update_pue_item(
     pue_id: str,
     pue_update: PUEUpdate,
     db: Session = Depends(get_db),
@@ -4321,7 +4432,7 @@ async def update_pue_item(
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/pue/{pue_id}")
-async def delete_pue_item(
+def delete_pue_item(
     pue_id: str,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -4347,7 +4458,7 @@ async def delete_pue_item(
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/hubs/{hub_id}/pue")
-async def list_hub_pue_items(
+def list_hub_pue_items(
     hub_id: int,
     include_inactive: bool = Query(False, description="Include inactive PUE items"),
     db: Session = Depends(get_db),
@@ -4386,7 +4497,7 @@ async def list_hub_pue_items(
     } for pue in pue_items]
 
 @app.get("/hubs/{hub_id}/pue/available")
-async def list_hub_available_pue_items(
+def list_hub_available_pue_items(
     hub_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -4450,24 +4561,34 @@ async def list_hub_available_pue_items(
     ### Query Parameters:
     - **status**: Filter by rental status (active, returned, all)
     - **user_id**: Filter by specific user ID (optional)
+    - **page_size** / **cursor**: Keyset pagination (optional)
+    - **fields**: Comma-separated fields to return (optional)
 
     ### Returns:
     - List of rentals with user, battery, and hub information
+    - With page_size or cursor: `{"items": [...], "next_cursor": ...}`, most recently updated first
     """,
     response_description="List of rentals")
-async def list_rentals(
+def list_rentals(
     status: str = "all",
     user_id: Optional[int] = None,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    page_size: Optional[int] = Query(None, ge=1, le=1000, description="Page size. Paged responses are ordered by most recently updated and include next_cursor"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return for each item"),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """Get all battery and PUE rentals with optional status filtering"""
+    # Battery and PUE rentals share one cursor: (updated_at, table rank, id)
+    page = list_paging(page_size, cursor, key_count=3)
+    selected_fields = parse_fields(fields)
     try:
         now = datetime.now(timezone.utc)
         result = []
+        keys = []
 
-        # Query Battery Rentals
-        battery_query = db.query(BatteryRental)
+        # Query Battery Rentals (user, hub and items are preloaded)
+        battery_query = battery_rentals_query(db)
 
         # Filter by user_id if provided
         if user_id is not None:
@@ -4495,17 +4616,19 @@ async def list_rentals(
             if user_hub_id:
                 battery_query = battery_query.filter(BatteryRental.hub_id == user_hub_id)
 
-        battery_rentals = battery_query.order_by(BatteryRental.start_date.desc()).all()
+        if page:
+            battery_query = keyset_query(
+                battery_query, (BatteryRental.updated_at, literal(0), BatteryRental.rental_id), cursor, page
+            )
+        else:
+            battery_query = battery_query.order_by(BatteryRental.start_date.desc())
+        battery_rentals = battery_query.all()
 
         # Process battery rentals
         for rental in battery_rentals:
-            user = db.query(User).filter(User.user_id == rental.user_id).first()
-            hub = db.query(SolarHub).filter(SolarHub.hub_id == rental.hub_id).first()
-
-            # Get battery items for this rental
-            battery_items = db.query(BatteryRentalItem).filter(
-                BatteryRentalItem.rental_id == rental.rental_id
-            ).all()
+            user = rental.user
+            hub = rental.hub
+            battery_items = rental_items(rental)
 
             # Determine status
             rental_status = "returned" if rental.actual_return_date else rental.status
@@ -4517,12 +4640,10 @@ async def list_rentals(
                     rental_status = "overdue"
 
             # Get battery info for display — prefer the current (unreturned) item after any swaps
-            active_item = next((i for i in battery_items if i.returned_at is None), None) or (battery_items[0] if battery_items else None)
+            active_item = active_rental_item(battery_items)
             battery_info = None
             if active_item:
-                first_battery = db.query(BEPPPBattery).filter(
-                    BEPPPBattery.battery_id == active_item.battery_id
-                ).first()
+                first_battery = active_item.battery
                 if first_battery:
                     battery_info = {
                         "battery_id": first_battery.battery_id,
@@ -4560,9 +4681,10 @@ async def list_rentals(
                     "what_three_word_location": hub.what_three_word_location
                 } if hub else None
             })
+            keys.append((rental.updated_at, 0, rental.rental_id))
 
-        # Query PUE Rentals
-        pue_query = db.query(PUERental)
+        # Query PUE Rentals (user and PUE item with its hub are preloaded)
+        pue_query = pue_rentals_query(db)
 
         # Filter by user_id if provided
         if user_id is not None:
@@ -4594,15 +4716,19 @@ async def list_rentals(
                     PUERental.pue_id == ProductiveUseEquipment.pue_id
                 ).filter(ProductiveUseEquipment.hub_id == user_hub_id)
 
-        pue_rentals = pue_query.order_by(PUERental.timestamp_taken.desc()).all()
+        if page:
+            pue_query = keyset_query(
+                pue_query, (PUERental.updated_at, literal(1), PUERental.pue_rental_id), cursor, page
+            )
+        else:
+            pue_query = pue_query.order_by(PUERental.timestamp_taken.desc())
+        pue_rentals = pue_query.all()
 
         # Process PUE rentals
         for rental in pue_rentals:
-            user = db.query(User).filter(User.user_id == rental.user_id).first()
-            pue = db.query(ProductiveUseEquipment).filter(
-                ProductiveUseEquipment.pue_id == rental.pue_id
-            ).first()
-            hub = db.query(SolarHub).filter(SolarHub.hub_id == pue.hub_id).first() if pue else None
+            user = rental.user
+            pue = rental.pue
+            hub = pue.hub if pue else None
 
             # Determine status
             rental_status = "returned" if rental.date_returned else "active"
@@ -4642,11 +4768,18 @@ async def list_rentals(
                     "what_three_word_location": hub.what_three_word_location
                 } if hub else None
             })
+            keys.append((rental.updated_at, 1, rental.pue_rental_id))
+
+        if page:
+            # Merge the two keyset pages and keep the newest page_size rows
+            rows = sorted(zip(keys, result), key=lambda row: row[0], reverse=True)
+            rows, next_cursor = split_page(rows, page, key=lambda row: row[0])
+            return {"items": project([item for _, item in rows], selected_fields), "next_cursor": next_cursor}
 
         # Sort combined results by timestamp_taken (most recent first)
         result.sort(key=lambda x: x['timestamp_taken'] if x['timestamp_taken'] else '', reverse=True)
 
-        return result
+        return project(result, selected_fields)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list rentals: {str(e)}")
@@ -4677,8 +4810,9 @@ async def list_rentals(
     - Cost breakdown and due dates
     """,
     response_description="Created rental with battery and PUE details")
-async def create_rental(
+def create_rental(
     request: Request,
+    raw_body: bytes = Depends(read_request_body),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
@@ -4720,7 +4854,7 @@ async def create_rental(
     
     try:
         # Parse request body
-        rental_data_raw = await request.json()
+        rental_data_raw = json.loads(raw_body)
         
         # Determine which format to use based on the fields present
         if 'user_name' in rental_data_raw or 'user_mobile' in rental_data_raw:
@@ -4945,7 +5079,7 @@ async def create_rental(
     tags=["Rentals"],
     summary="Get Overdue and Upcoming Rentals",
     description="Get rentals that are overdue or due soon (within 3 days)")
-async def get_overdue_upcoming_rentals(
+def get_overdue_upcoming_rentals(
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
@@ -4957,8 +5091,8 @@ async def get_overdue_upcoming_rentals(
         overdue = []
         upcoming = []
 
-        # Get active battery rentals
-        battery_rentals_query = db.query(BatteryRental).filter(
+        # Get active battery rentals (user, hub and items are preloaded)
+        battery_query = battery_rentals_query(db).filter(
             BatteryRental.status.in_(['active', 'overdue']),
             BatteryRental.actual_return_date.is_(None)
         )
@@ -4967,9 +5101,9 @@ async def get_overdue_upcoming_rentals(
         if current_user.get('role') not in [UserRole.SUPERADMIN, UserRole.DATA_ADMIN]:
             user_hub_id = current_user.get('hub_id')
             if user_hub_id:
-                battery_rentals_query = battery_rentals_query.filter(BatteryRental.hub_id == user_hub_id)
+                battery_query = battery_query.filter(BatteryRental.hub_id == user_hub_id)
 
-        battery_rentals = battery_rentals_query.all()
+        battery_rentals = battery_query.all()
 
         for rental in battery_rentals:
             # Use end_date as the due date
@@ -4977,15 +5111,9 @@ async def get_overdue_upcoming_rentals(
             if due_date.tzinfo is None:
                 due_date = due_date.replace(tzinfo=timezone.utc)
 
-            # Get user and hub info
-            user = db.query(User).filter(User.user_id == rental.user_id).first()
-            hub = db.query(SolarHub).filter(SolarHub.hub_id == rental.hub_id).first()
-
-            # Get battery items for this rental
-            battery_items = db.query(BatteryRentalItem).filter(
-                BatteryRentalItem.rental_id == rental.rental_id
-            ).all()
-            battery_ids = [item.battery_id for item in battery_items]
+            user = rental.user
+            hub = rental.hub
+            battery_ids = [item.battery_id for item in rental_items(rental)]
 
             days_diff = (due_date - now).days
             hours_diff = (due_date - now).total_seconds() / 3600
@@ -5017,8 +5145,8 @@ async def get_overdue_upcoming_rentals(
             elif due_date <= upcoming_threshold:
                 upcoming.append(rental_info)
 
-        # Get active PUE rentals
-        pue_rentals_query = db.query(PUERental).filter(
+        # Get active PUE rentals (user and PUE item with its hub are preloaded)
+        pue_query = pue_rentals_query(db).filter(
             PUERental.is_active == True,
             PUERental.date_returned.is_(None)
         )
@@ -5028,12 +5156,12 @@ async def get_overdue_upcoming_rentals(
             user_hub_id = current_user.get('hub_id')
             if user_hub_id:
                 # PUE rentals link through ProductiveUseEquipment to get hub_id
-                pue_rentals_query = pue_rentals_query.join(
+                pue_query = pue_query.join(
                     ProductiveUseEquipment,
                     PUERental.pue_id == ProductiveUseEquipment.pue_id
                 ).filter(ProductiveUseEquipment.hub_id == user_hub_id)
 
-        pue_rentals = pue_rentals_query.all()
+        pue_rentals = pue_query.all()
 
         for rental in pue_rentals:
             # Use due_back as the due date
@@ -5043,10 +5171,9 @@ async def get_overdue_upcoming_rentals(
             if due_date.tzinfo is None:
                 due_date = due_date.replace(tzinfo=timezone.utc)
 
-            # Get user, PUE item, and hub info
-            user = db.query(User).filter(User.user_id == rental.user_id).first()
-            pue = db.query(ProductiveUseEquipment).filter(ProductiveUseEquipment.pue_id == rental.pue_id).first()
-            hub = db.query(SolarHub).filter(SolarHub.hub_id == pue.hub_id).first() if pue else None
+            user = rental.user
+            pue = rental.pue
+            hub = pue.hub if pue else None
 
             days_diff = (due_date - now).days
             hours_diff = (due_date - now).total_seconds() / 3600
@@ -5093,7 +5220,7 @@ async def get_overdue_upcoming_rentals(
         raise HTTPException(status_code=500, detail=f"Error getting overdue/upcoming rentals: {str(e)}")
 
 @app.get("/rentals/{rental_id}")
-async def get_rental_with_pue(
+def get_rental_with_pue(
     rental_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -5163,7 +5290,7 @@ async def get_rental_with_pue(
     return rental_dict
 
 @app.put("/rentals/{rental_id}")
-async def update_rental(
+def update_rental(
     rental_id: int,
     rental_update: RentalUpdate,
     db: Session = Depends(get_db),
@@ -5253,7 +5380,7 @@ async def update_rental(
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/rentals/{rental_id}")
-async def delete_rental(
+def delete_rental(
     rental_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -5305,7 +5432,7 @@ async def delete_rental(
     - Return confirmation details
     """,
     response_description="Return confirmation and updated rental details")
-async def return_rental(
+def return_rental(
     rental_id: int,
     return_request: RentalReturnRequest,
     db: Session = Depends(get_db),
@@ -5563,7 +5690,7 @@ async def return_rental(
     tags=["Rentals"],
     summary="Calculate Final Cost at Return",
     description="Calculate the final cost for a rental based on actual usage (days, kWh, etc.)")
-async def calculate_return_cost(
+def calculate_return_cost(
     rental_id: int,
     actual_return_date: Optional[str] = Query(None, description="Actual return date (ISO format)"),
     kwh_usage: Optional[float] = Query(None, description="Actual kWh used"),
@@ -5658,9 +5785,7 @@ async def calculate_return_cost(
                         kwh_used = rental.kwh_usage_end - rental.kwh_usage_start
                     else:
                         # Automatically fetch latest kWh from battery's live data
-                        latest_data = db.query(LiveData).filter(
-                            LiveData.battery_id == rental.battery_id
-                        ).order_by(LiveData.timestamp.desc()).first()
+                        latest_data = latest_state(db, rental.battery_id)
 
                         if latest_data and latest_data.amp_hours_consumed:
                             # Use amp_hours_consumed as kWh estimate
@@ -5838,7 +5963,7 @@ async def calculate_return_cost(
     }
 
 @app.post("/rentals/{rental_id}/add-pue")
-async def add_pue_to_rental(
+def add_pue_to_rental(
     rental_id: int,
     add_request: AddPUEToRentalRequest,
     db: Session = Depends(get_db),
@@ -5936,7 +6061,7 @@ async def add_pue_to_rental(
     tags=["Rentals"],
     summary="Return Individual PUE Item",
     description="Return a specific PUE item from a rental")
-async def return_individual_pue_item(
+def return_individual_pue_item(
     rental_id: int,
     pue_id: str,
     db: Session = Depends(get_db),
@@ -6024,7 +6149,7 @@ async def return_individual_pue_item(
     - Created rental information with all batteries
     """,
     response_description="Created battery rental details")
-async def create_battery_rental(
+def create_battery_rental(
     rental: BatteryRentalCreate,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -6387,17 +6512,25 @@ async def create_battery_rental(
 @app.get("/battery-rentals",
     tags=["Battery Rentals"],
     summary="List Battery Rentals")
-async def list_battery_rentals(
+def list_battery_rentals(
     user_id: Optional[int] = Query(None),
     status: Optional[str] = Query(None),
     hub_id: Optional[int] = Query(None),
     battery_id: Optional[str] = Query(None, description="Filter by battery ID"),
     modified_after: Optional[str] = Query(None, description="ISO datetime - only return records updated after this time"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    page_size: Optional[int] = Query(None, ge=1, le=1000, description="Page size. Paged responses are ordered by most recently updated and include next_cursor"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return for each item"),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """List battery rentals with optional filters"""
-    query = db.query(BatteryRental)
+    """
+    List battery rentals with optional filters.
+    With page_size or cursor, returns {"items", "next_cursor"} ordered by most recently updated.
+    """
+    page = list_paging(page_size, cursor)
+    # User (with account), hub and battery items are preloaded
+    query = battery_rentals_query(db, with_account=True)
 
     # Hub-based filtering (BatteryRental has hub_id directly)
     if current_user.get('role') == UserRole.USER:
@@ -6428,27 +6561,28 @@ async def list_battery_rentals(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid modified_after format")
 
-    rentals = query.order_by(BatteryRental.start_date.desc()).all()
+    if page:
+        rentals, next_cursor = split_page(
+            keyset_query(query, (BatteryRental.updated_at, BatteryRental.rental_id), cursor, page).all(),
+            page, key=lambda rental: (rental.updated_at, rental.rental_id)
+        )
+    else:
+        rentals = query.order_by(BatteryRental.start_date.desc()).all()
 
     result = []
     for rental in rentals:
-        user = db.query(User).filter(User.user_id == rental.user_id).first()
-        items = db.query(BatteryRentalItem).filter(BatteryRentalItem.rental_id == rental.rental_id).all()
+        user = rental.user
+        items = rental_items(rental)
 
         # Build user object for frontend
         user_data = None
         if user:
-            # Get account balance from UserAccount table
-            account_balance = 0.0
-            if hasattr(user, 'account') and user.account:
-                account_balance = float(user.account.balance) if user.account.balance is not None else 0.0
-
             user_data = {
                 "user_id": user.user_id,
                 "Name": user.Name,
                 "username": user.username,
                 "short_id": user.short_id,
-                "account_balance": account_balance
+                "account_balance": user_account_balance(user)
             }
 
         result.append({
@@ -6480,12 +6614,15 @@ async def list_battery_rentals(
             "updated_at": rental.updated_at.isoformat() if rental.updated_at else None
         })
 
+    result = project(result, parse_fields(fields))
+    if page:
+        return {"items": result, "next_cursor": next_cursor}
     return result
 
 @app.get("/battery-rentals/{rental_id}",
     tags=["Battery Rentals"],
     summary="Get Battery Rental Details")
-async def get_battery_rental(
+def get_battery_rental(
     rental_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -6579,7 +6716,7 @@ async def get_battery_rental(
 @app.post("/battery-rentals/{rental_id}/return",
     tags=["Battery Rentals"],
     summary="Return Batteries")
-async def return_batteries(
+def return_batteries(
     rental_id: int,
     return_data: BatteryRentalReturn,
     db: Session = Depends(get_db),
@@ -6770,6 +6907,11 @@ async def return_batteries(
         # Update payment status using helper function
         update_rental_payment_status(rental, total_payment_collected)
 
+        # Summarise the finished rental's battery usage for /analytics/user-report
+        if remaining == 0:
+            db.flush()
+            refresh_rental_usage_facts(db, [rental_id])
+
         db.commit()
 
         return {
@@ -6792,7 +6934,7 @@ async def return_batteries(
 @app.post("/battery-rentals/{rental_id}/payment",
     tags=["Battery Rentals"],
     summary="Record Payment for Battery Rental")
-async def record_battery_rental_payment(
+def record_battery_rental_payment(
     rental_id: int,
     payment_data: BatteryRentalPayment,
     db: Session = Depends(get_db),
@@ -6966,7 +7108,7 @@ async def record_battery_rental_payment(
 @app.post("/battery-rentals/{rental_id}/add-battery",
     tags=["Battery Rentals"],
     summary="Add Battery to Rental")
-async def add_battery_to_rental(
+def add_battery_to_rental(
     rental_id: int,
     add_data: BatteryRentalAddBattery,
     db: Session = Depends(get_db),
@@ -7024,7 +7166,7 @@ async def add_battery_to_rental(
 @app.post("/battery-rentals/{rental_id}/recharge",
     tags=["Battery Rentals"],
     summary="Record Battery Recharge")
-async def record_recharge(
+def record_recharge(
     rental_id: int,
     recharge_data: BatteryRentalRecharge,
     db: Session = Depends(get_db),
@@ -7087,7 +7229,7 @@ async def record_recharge(
 @app.post("/battery-rentals/{rental_id}/swap",
     tags=["Battery Rentals"],
     summary="Swap Battery During Rental")
-async def swap_battery(
+def swap_battery(
     rental_id: int,
     swap_data: BatteryRentalSwap,
     db: Session = Depends(get_db),
@@ -7239,7 +7381,7 @@ async def swap_battery(
     tags=["Battery Rentals"],
     summary="Calculate Final Cost at Return",
     description="Calculate the final cost for a battery rental based on actual usage (days, recharges, kWh, etc.)")
-async def calculate_battery_rental_return_cost(
+def calculate_battery_rental_return_cost(
     rental_id: int,
     actual_return_date: Optional[str] = Query(None, description="Actual return date (ISO format)"),
     kwh_usage: Optional[float] = Query(None, description="Actual kWh used"),
@@ -7364,9 +7506,7 @@ async def calculate_battery_rental_return_cost(
                 if kwh_used is None and len(items) > 0:
                     # Try to get from first battery's latest data
                     battery_id = items[0].battery_id
-                    latest_data = db.query(LiveData).filter(
-                        LiveData.battery_id == battery_id
-                    ).order_by(LiveData.timestamp.desc()).first()
+                    latest_data = latest_state(db, battery_id)
 
                     if latest_data and latest_data.amp_hours_consumed:
                         voltage = latest_data.voltage or 48
@@ -7461,7 +7601,7 @@ async def calculate_battery_rental_return_cost(
 @app.post("/admin/battery-rentals/{rental_id}/recalculate-cost",
     tags=["Battery Rentals", "Admin"],
     summary="Recalculate Cost for Returned Rental (Admin Only)")
-async def recalculate_rental_cost(
+def recalculate_rental_cost(
     rental_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -7595,7 +7735,7 @@ async def recalculate_rental_cost(
     - Created rental information
     """,
     response_description="Created PUE rental details")
-async def create_pue_rental(
+def create_pue_rental(
     rental: PUERentalCreateNew,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -7822,16 +7962,24 @@ async def create_pue_rental(
 @app.get("/pue-rentals",
     tags=["PUE Rentals"],
     summary="List PUE Rentals")
-async def list_pue_rentals(
+def list_pue_rentals(
     user_id: Optional[int] = Query(None),
     status: Optional[str] = Query(None),
     hub_id: Optional[int] = Query(None),
     modified_after: Optional[str] = Query(None, description="ISO datetime - only return records updated after this time"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    page_size: Optional[int] = Query(None, ge=1, le=1000, description="Page size. Paged responses are ordered by most recently updated and include next_cursor"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return for each item"),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """List PUE rentals with optional filters"""
-    query = db.query(PUERental)
+    """
+    List PUE rentals with optional filters.
+    With page_size or cursor, returns {"items", "next_cursor"} ordered by most recently updated.
+    """
+    page = list_paging(page_size, cursor)
+    # User (with account), PUE item and pay-to-own ledger are preloaded
+    query = pue_rentals_query(db, with_account=True, with_ledger=True)
 
     # Hub-based filtering
     if current_user.get('role') == UserRole.USER:
@@ -7866,19 +8014,23 @@ async def list_pue_rentals(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid modified_after format")
 
-    rentals = query.order_by(PUERental.timestamp_taken.desc()).all()
+    if page:
+        rentals, next_cursor = split_page(
+            keyset_query(query, (PUERental.updated_at, PUERental.pue_rental_id), cursor, page).all(),
+            page, key=lambda rental: (rental.updated_at, rental.pue_rental_id)
+        )
+    else:
+        rentals = query.order_by(PUERental.timestamp_taken.desc()).all()
 
     result = []
     for rental in rentals:
-        user = db.query(User).filter(User.user_id == rental.user_id).first()
-        pue = db.query(ProductiveUseEquipment).filter(ProductiveUseEquipment.pue_id == rental.pue_id).first()
+        user = rental.user
+        pue = rental.pue
 
         # Get pay-to-own progress if applicable
         pay_to_own_progress = None
         if rental.is_pay_to_own:
-            ledger = db.query(PUEPayToOwnLedger).filter(
-                PUEPayToOwnLedger.pue_rental_id == rental.pue_rental_id
-            ).first()
+            ledger = rental.pay_to_own_ledger
             if ledger:
                 pay_to_own_progress = {
                     "total_price": float(ledger.total_price),
@@ -7898,17 +8050,12 @@ async def list_pue_rentals(
         # Build user object for frontend
         user_data = None
         if user:
-            # Get account balance from UserAccount table
-            account_balance = 0.0
-            if hasattr(user, 'account') and user.account:
-                account_balance = float(user.account.balance) if user.account.balance is not None else 0.0
-
             user_data = {
                 "user_id": user.user_id,
                 "Name": user.Name,
                 "username": user.username,
                 "short_id": user.short_id,
-                "account_balance": account_balance
+                "account_balance": user_account_balance(user)
             }
 
         result.append({
@@ -7931,12 +8078,15 @@ async def list_pue_rentals(
             "updated_at": rental.updated_at.isoformat() if rental.updated_at else None
         })
 
+    result = project(result, parse_fields(fields))
+    if page:
+        return {"items": result, "next_cursor": next_cursor}
     return result
 
 @app.get("/pue-rentals/{rental_id}",
     tags=["PUE Rentals"],
     summary="Get PUE Rental Details")
-async def get_pue_rental(
+def get_pue_rental(
     rental_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -8009,7 +8159,7 @@ async def get_pue_rental(
 @app.post("/pue-rentals/{rental_id}/payment",
     tags=["PUE Rentals"],
     summary="Record PUE Payment")
-async def record_pue_payment(
+def record_pue_payment(
     rental_id: int,
     payment: PUERentalPayment,
     db: Session = Depends(get_db),
@@ -8115,7 +8265,7 @@ async def record_pue_payment(
 @app.get("/pue-rentals/{rental_id}/pay-to-own-ledger",
     tags=["PUE Rentals"],
     summary="Get Pay-to-Own Progress")
-async def get_pay_to_own_ledger(
+def get_pay_to_own_ledger(
     rental_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -8163,7 +8313,7 @@ async def get_pay_to_own_ledger(
 @app.get("/pue-rentals/{rental_id}/calculate-return-cost",
     tags=["PUE Rentals"],
     summary="Calculate Final Cost at PUE Return")
-async def calculate_pue_rental_return_cost(
+def calculate_pue_rental_return_cost(
     rental_id: int,
     actual_return_date: Optional[str] = Query(None, description="Actual return date (ISO format)"),
     db: Session = Depends(get_db),
@@ -8332,7 +8482,7 @@ async def calculate_pue_rental_return_cost(
 @app.post("/pue-rentals/{rental_id}/return",
     tags=["PUE Rentals"],
     summary="Return PUE Item")
-async def return_pue_rental(
+def return_pue_rental(
     rental_id: int,
     return_data: dict,
     db: Session = Depends(get_db),
@@ -8452,7 +8602,7 @@ async def return_pue_rental(
 @app.get("/pue-rentals/{rental_id}/ownership-status",
     tags=["PUE Rentals - Pay to Own"],
     summary="Get ownership status for pay-to-own rental")
-async def get_rental_ownership_status(
+def get_rental_ownership_status(
     rental_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -8480,7 +8630,7 @@ async def get_rental_ownership_status(
 @app.post("/pue-rentals/{rental_id}/pay-to-own-payment",
     tags=["PUE Rentals - Pay to Own"],
     summary="Process pay-to-own payment")
-async def process_rental_pay_to_own_payment(
+def process_rental_pay_to_own_payment(
     rental_id: int,
     payment_data: PayToOwnPaymentRequest,
     db: Session = Depends(get_db),
@@ -8521,7 +8671,7 @@ async def process_rental_pay_to_own_payment(
 @app.get("/users/{user_id}/pay-to-own-items",
     tags=["Users", "PUE Rentals - Pay to Own"],
     summary="Get user's active pay-to-own items")
-async def get_user_pay_to_own_items(
+def get_user_pay_to_own_items(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -8584,7 +8734,7 @@ async def get_user_pay_to_own_items(
 @app.post("/pue/{pue_id}/inspections",
     tags=["PUE Inspections"],
     summary="Record PUE Inspection")
-async def create_pue_inspection(
+def create_pue_inspection(
     pue_id: str,
     inspection: PUEInspectionCreate,
     db: Session = Depends(get_db),
@@ -8632,7 +8782,7 @@ async def create_pue_inspection(
 @app.get("/pue/{pue_id}/inspections",
     tags=["PUE Inspections"],
     summary="Get PUE Inspection History")
-async def get_pue_inspections(
+def get_pue_inspections(
     pue_id: str,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -8671,7 +8821,7 @@ async def get_pue_inspections(
 @app.get("/inspections/due",
     tags=["PUE Inspections"],
     summary="Get PUE Due for Inspection")
-async def get_due_inspections(
+def get_due_inspections(
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
@@ -8702,7 +8852,7 @@ async def get_due_inspections(
 @app.get("/inspections/overdue",
     tags=["PUE Inspections"],
     summary="Get Overdue Inspections")
-async def get_overdue_inspections(
+def get_overdue_inspections(
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
@@ -8749,37 +8899,40 @@ async def get_overdue_inspections(
     
     ### Features:
     - Date range filtering
-    - Export in JSON or CSV format
-    - Pagination with limit controls
+    - Export in JSON, CSV, NDJSON or Parquet format
+    - CSV/NDJSON/Parquet are streamed from a server-side cursor, so a
+      battery's entire history can be exported
     - Real-time and historical data access
     
     ### Parameters:
     - **battery_id**: ID of the battery to retrieve data for
     - **start_timestamp**: Start date for data range (optional)
     - **end_timestamp**: End date for data range (optional)
-    - **limit**: Maximum number of records (default: 1000)
-    - **format**: Export format (json/csv)
+    - **limit**: Maximum number of records (json default: 1000; exports: no limit)
+    - **format**: Export format (json/csv/ndjson/parquet)
     
     ### Returns:
     - Battery data records
     - Metadata about the query
     """,
     response_description="Battery data records and metadata")
-async def get_battery_data(
+def get_battery_data(
     battery_id: str,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
     start_timestamp: Optional[datetime] = None,
     end_timestamp: Optional[datetime] = None,
-    limit: int = 1000,
-    format: str = Query("json", description="Output format: json or csv")
+    limit: Optional[int] = Query(None, description="Maximum number of records (json default: 1000; exports: no limit)"),
+    format: str = Query("json", description="Output format: json, csv, ndjson or parquet")
 ):
     """
-    Get battery data in specified format (json or csv)
+    Get battery data in specified format (json, csv, ndjson or parquet)
     """
     # Input validation
-    if format not in ["json", "csv"]:
-        raise HTTPException(status_code=400, detail="Format must be either 'json' or 'csv'")
+    if format != "json" and format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Format must be one of 'json', 'csv', 'ndjson' or 'parquet'")
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow to be installed")
 
     # Your existing query logic
     battery = db.query(BEPPPBattery).filter(BEPPPBattery.battery_id == battery_id).first()
@@ -8798,8 +8951,22 @@ async def get_battery_data(
         query = query.filter(LiveData.timestamp >= start_timestamp)
     if end_timestamp:
         query = query.filter(LiveData.timestamp <= end_timestamp)
-    
-    data = query.order_by(LiveData.timestamp.desc()).limit(limit).all()
+
+    # Streamed exports: rows go out chunk by chunk as the cursor yields them
+    if format != "json":
+        if not query.with_entities(LiveData.id).limit(1).first():
+            raise HTTPException(status_code=404, detail=f"No data found for battery {battery_id}")
+        media_type, extension = EXPORT_FORMATS[format]
+        return StreamingResponse(
+            EXPORT_STREAMS[format](battery_id, start_timestamp, end_timestamp, limit),
+            media_type=media_type,
+            headers={
+                "Content-Disposition": f"attachment; filename=battery_{battery_id}_data.{extension}",
+                "Access-Control-Expose-Headers": "Content-Disposition"
+            }
+        )
+
+    data = query.order_by(LiveData.timestamp.desc()).limit(limit or 1000).all()
     
     if not data:
         raise HTTPException(status_code=404, detail=f"No data found for battery {battery_id}")
@@ -8817,25 +8984,49 @@ async def get_battery_data(
                 row_dict[c.name] = value
         data_dicts.append(row_dict)
 
-    # Format response
-    if format == "json":
-        return JSONResponse(content={
-            "battery_id": battery_id,
-            "data": data_dicts,
-            "count": len(data_dicts)
-        })
-    else:  # csv
-        df = pd.DataFrame(data_dicts)
-        csv_buffer = io.StringIO()
-        df.to_csv(csv_buffer, index=False)
-        return Response(
-            content=csv_buffer.getvalue(),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename=battery_{battery_id}_data.csv"}
-        )
+    return JSONResponse(content={
+        "battery_id": battery_id,
+        "data": data_dicts,
+        "count": len(data_dicts)
+    })
+
+@app.get("/data/latest")
+def get_latest_data_bulk(
+    battery_ids: Optional[str] = Query(None, description="Comma-separated battery IDs (default: every battery you can see)"),
+    hub_id: Optional[int] = Query(None, description="Only batteries in this hub"),
+    full: bool = Query(False, description="Include the full newest reading of each battery"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Current state of many batteries in one query: newest reading's key
+    metrics, last known SoC and last GPS fix, from battery_latest_state.
+    Batteries that have never reported are left out.
+    """
+    query = (
+        db.query(BatteryLatestState, BEPPPBattery.hub_id, BEPPPBattery.short_id)
+        .join(BEPPPBattery, BEPPPBattery.battery_id == BatteryLatestState.battery_id)
+    )
+    if battery_ids:
+        ids = [battery_id.strip() for battery_id in battery_ids.split(',') if battery_id.strip()]
+        query = query.filter(BatteryLatestState.battery_id.in_(ids))
+    if current_user.get('role') not in [UserRole.ADMIN, UserRole.SUPERADMIN, UserRole.DATA_ADMIN]:
+        if hub_id is not None and hub_id != current_user.get('hub_id'):
+            raise HTTPException(status_code=403, detail="Access denied")
+        hub_id = current_user.get('hub_id')
+    if hub_id is not None:
+        query = query.filter(BEPPPBattery.hub_id == hub_id)
+
+    batteries = []
+    for state, battery_hub_id, short_id in query.order_by(BatteryLatestState.battery_id).all():
+        data = serialize_state(state, include_reading=full)
+        data["hub_id"] = battery_hub_id
+        data["short_id"] = short_id
+        batteries.append(data)
+    return {"batteries": batteries, "count": len(batteries)}
 
 @app.get("/data/latest/{battery_id}")
-async def get_latest_data(
+def get_latest_data(
     battery_id: str,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -8849,7 +9040,10 @@ async def get_latest_data(
         if battery.hub_id != current_user.get('hub_id'):
             raise HTTPException(status_code=403, detail="Access denied")
     
-    data = db.query(LiveData).filter(LiveData.battery_id == battery_id).order_by(LiveData.timestamp.desc()).first()
+    data = latest_reading(latest_state(db, battery_id))
+    if data is None:
+        # Not in battery_latest_state yet (e.g. only readings without a timestamp)
+        data = db.query(LiveData).filter(LiveData.battery_id == battery_id).order_by(LiveData.timestamp.desc()).first()
     if not data:
         raise HTTPException(status_code=404, detail="No data found for this battery")
     return data
@@ -8859,6 +9053,7 @@ async def get_latest_data(
 # ============================================================================
 
 @app.get("/analytics/hub-summary",
+    dependencies=[Depends(limit_analytics_concurrency)],
     tags=["Data & Analytics"],
     summary="Hub Summary Analytics",
     description="""
@@ -8887,7 +9082,7 @@ async def get_latest_data(
     - Equipment status overview
     """,
     response_description="Hub summary statistics and analytics")
-async def get_hub_summary(
+def get_hub_summary(
     hub_ids: Optional[List[int]] = Query(None, description="Specific hub IDs"),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -8919,51 +9114,10 @@ async def get_hub_summary(
             raise HTTPException(status_code=403, detail="Access denied to requested hubs")
         hub_ids = [user_hub_id]
     
-    if hub_ids is None:
-        if current_user.get('role') == UserRole.DATA_ADMIN:
-            hubs = db.query(SolarHub).all()
-        elif current_user.get('role') in [UserRole.ADMIN, UserRole.SUPERADMIN]:
-            hubs = db.query(SolarHub).all()
-        else:
-            hubs = db.query(SolarHub).filter(SolarHub.hub_id == current_user.get('hub_id')).all()
-    else:
-        hubs = db.query(SolarHub).filter(SolarHub.hub_id.in_(hub_ids)).all()
-    
-    hub_summaries = []
-    for hub in hubs:
-        battery_stats = db.query(
-            BEPPPBattery.status,
-            func.count(BEPPPBattery.battery_id).label('count')
-        ).filter(BEPPPBattery.hub_id == hub.hub_id).group_by(BEPPPBattery.status).all()
-        
-        pue_count = db.query(ProductiveUseEquipment).filter(
-            ProductiveUseEquipment.hub_id == hub.hub_id,
-            ProductiveUseEquipment.is_active == True
-        ).count()
-        
-        active_rentals = db.query(Rental).filter(
-            Rental.battery_id.in_(
-                db.query(BEPPPBattery.battery_id).filter(BEPPPBattery.hub_id == hub.hub_id)
-            ),
-            Rental.is_active == True,
-            Rental.battery_returned_date.is_(None)
-        ).count()
-        
-        hub_summaries.append({
-            "hub_id": hub.hub_id,
-            "hub_name": hub.what_three_word_location,
-            "country": hub.country,
-            "solar_capacity_kw": hub.solar_capacity_kw,
-            "battery_stats": {stat.status: stat.count for stat in battery_stats},
-            "total_batteries": sum(stat.count for stat in battery_stats),
-            "pue_count": pue_count,
-            "active_rentals": active_rentals
-        })
-    
-    return hub_summaries
+    return hub_summary_cache.get(db, hub_ids)
 
-@app.post("/analytics/power-usage")
-async def get_power_usage_analytics(
+@app.post("/analytics/power-usage", dependencies=[Depends(limit_analytics_concurrency)])
+def get_power_usage_analytics(
     request: DataAggregationRequest,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -9017,137 +9171,161 @@ async def get_power_usage_analytics(
         
         if not battery_ids:
             return {"error": "No batteries found matching criteria"}
-        
-        live_data_query = db.query(LiveData).filter(
-            LiveData.battery_id.in_(battery_ids),
-            LiveData.timestamp >= start_time,
-            LiveData.timestamp <= end_time
-        )
-        
-        live_data = live_data_query.all()
-        if not live_data:
-            return {"error": "No data found for the specified criteria"}
-        
-        data_dicts = []
-        for data_point in live_data:
-            data_dicts.append({
-                'battery_id': data_point.battery_id,
-                'timestamp': data_point.timestamp,
-                'power_watts': data_point.power_watts,
-                'state_of_charge': data_point.state_of_charge,
-                'voltage': data_point.voltage,
-                'current_amps': data_point.current_amps
-            })
-        
-        df = pd.DataFrame(data_dicts)
-        
-        if request.aggregation_period == "hour":
-            df['time_group'] = df['timestamp'].dt.floor('H')
-        elif request.aggregation_period == "day":
-            df['time_group'] = df['timestamp'].dt.floor('D')
-        elif request.aggregation_period == "week":
-            df['time_group'] = df['timestamp'].dt.to_period('W').dt.start_time
-        elif request.aggregation_period == "month":
-            df['time_group'] = df['timestamp'].dt.to_period('M').dt.start_time
-        
+
+        # sum/mean/min/max can be answered from the hourly/daily rollups
+        if request.aggregation_function in ROLLUP_FUNCTIONS:
+            rollup = query_rollups(
+                db, battery_ids, start_time, end_time,
+                request.aggregation_period, request.metric
+            )
+            if rollup is not None:
+                buckets = rollup['buckets']
+                if not buckets:
+                    return {"error": "No data found for the specified criteria"}
+
+                result_dict = [
+                    {
+                        'time_group': format_time_group(bucket['time_group'], request.aggregation_period),
+                        'battery_id': bucket['battery_id'],
+                        request.metric: bucket[request.aggregation_function]
+                    }
+                    for bucket in buckets
+                ]
+                values = sorted(row[request.metric] for row in result_dict if row[request.metric] is not None)
+                if values:
+                    mid = len(values) // 2
+                    metric_summary = {
+                        'min': float(values[0]),
+                        'max': float(values[-1]),
+                        'mean': float(sum(values) / len(values)),
+                        'median': float(values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2)
+                    }
+                else:
+                    metric_summary = {'min': None, 'max': None, 'mean': None, 'median': None}
+
+                return {
+                    'time_period': {
+                        'description': time_period_description,
+                        'start_time': start_time.isoformat(),
+                        'end_time': end_time.isoformat(),
+                        'days_analyzed': (end_time - start_time).days
+                    },
+                    'data': result_dict,
+                    'summary': {
+                        'total_data_points': sum(bucket['rows'] for bucket in buckets),
+                        'battery_count': len({bucket['battery_id'] for bucket in buckets}),
+                        'time_periods': len({row['time_group'] for row in result_dict}),
+                        'metric_summary': metric_summary,
+                        'source': rollup['source'],
+                        'rollup_watermark': rollup['watermark'].isoformat()
+                    },
+                    'request_parameters': {
+                        'metric': request.metric,
+                        'aggregation_period': request.aggregation_period,
+                        'aggregation_function': request.aggregation_function,
+                        'time_period': request.time_period
+                    }
+                }
+
+        try:
+            rows = aggregate_live_data(
+                db, battery_ids, start_time, end_time,
+                request.aggregation_period, request.aggregation_function, request.metric
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        if request.aggregation_function in ("stats", "split_stats"):
+            totals = rows.pop() if rows else {}
+            if not totals.get('raw_count'):
+                return {"error": "No data found for the specified criteria"}
+
         if request.aggregation_function == "stats":
-            # Return mean, median, std, count per time_group for non-zero readings
-            if request.metric not in df.columns:
-                raise HTTPException(status_code=400, detail=f"Metric '{request.metric}' not available")
-            active = df[df[request.metric].abs() > 1].copy()  # filter near-zero idle readings
-            if active.empty:
-                return {'data': [], 'summary': {'total_data_points': 0}, 'request_parameters': {'aggregation_function': 'stats'}}
-            grp = active.groupby('time_group')[request.metric].agg(['mean', 'median', 'std', 'count', 'sum']).reset_index()
-            grp['time_group'] = grp['time_group'].astype(str)
-            grp['std'] = grp['std'].fillna(0)
-            result_dict = grp.rename(columns={'mean': 'mean', 'median': 'median', 'std': 'std', 'count': 'count', 'sum': 'sum'}).to_dict('records')
+            # mean, median, std, count per time_group for non-zero readings
+            result_dict = [
+                {
+                    'time_group': format_time_group(row['time_group'], request.aggregation_period),
+                    'mean': row['mean'],
+                    'median': row['median'],
+                    'std': row['std'],
+                    'count': row['count'],
+                    'sum': row['sum']
+                }
+                for row in rows if row['count']
+            ]
             return {
                 'data': result_dict,
-                'summary': {'total_data_points': len(active), 'battery_count': active['battery_id'].nunique()},
+                'summary': {'total_data_points': totals['count'], 'battery_count': totals['battery_count']},
                 'request_parameters': {'metric': request.metric, 'aggregation_function': 'stats', 'aggregation_period': request.aggregation_period}
             }
 
         if request.aggregation_function == "split_stats":
             # Separate stats for power in (charging, >1W) vs power out (discharging, <-1W)
-            if request.metric not in df.columns:
-                raise HTTPException(status_code=400, detail=f"Metric '{request.metric}' not available")
-            in_df = df[df[request.metric] > 1].copy()
-            out_df = df[df[request.metric] < -1].copy()
-            def _agg_dir(d):
-                if d.empty:
-                    return {}
-                g = d.groupby('time_group')[request.metric].agg(['mean', 'median', 'std', 'count']).reset_index()
-                g['time_group'] = g['time_group'].astype(str)
-                g['std'] = g['std'].fillna(0)
-                return {row['time_group']: row for _, row in g.iterrows()}
-            in_idx = _agg_dir(in_df)
-            out_idx = _agg_dir(out_df)
-            all_tg = sorted(set(list(in_idx.keys()) + list(out_idx.keys())))
             result_dict = []
-            for tg in all_tg:
-                row = {'time_group': tg}
-                if tg in in_idx:
-                    r = in_idx[tg]
-                    row.update({'in_mean': round(float(r['mean']), 2), 'in_median': round(float(r['median']), 2), 'in_std': round(float(r['std']), 2), 'in_count': int(r['count'])})
-                if tg in out_idx:
-                    r = out_idx[tg]
-                    row.update({'out_mean': round(float(r['mean']), 2), 'out_median': round(float(r['median']), 2), 'out_std': round(float(r['std']), 2), 'out_count': int(r['count'])})
-                result_dict.append(row)
+            for row in rows:
+                if not row['in_count'] and not row['out_count']:
+                    continue
+                entry = {'time_group': format_time_group(row['time_group'], request.aggregation_period)}
+                for direction in ('in', 'out'):
+                    if row[f'{direction}_count']:
+                        entry.update({
+                            f'{direction}_mean': round(row[f'{direction}_mean'], 2),
+                            f'{direction}_median': round(row[f'{direction}_median'], 2),
+                            f'{direction}_std': round(row[f'{direction}_std'], 2),
+                            f'{direction}_count': int(row[f'{direction}_count'])
+                        })
+                result_dict.append(entry)
             return {
                 'data': result_dict,
-                'summary': {'in_points': len(in_df), 'out_points': len(out_df)},
+                'summary': {'in_points': totals['in_count'], 'out_points': totals['out_count']},
                 'request_parameters': {'metric': request.metric, 'aggregation_function': 'split_stats', 'aggregation_period': request.aggregation_period}
             }
 
-        if request.aggregation_function == "sum":
-            agg_func = 'sum'
-        elif request.aggregation_function == "mean":
-            agg_func = 'mean'
-        elif request.aggregation_function == "median":
-            agg_func = 'median'
-        elif request.aggregation_function == "min":
-            agg_func = 'min'
-        elif request.aggregation_function == "max":
-            agg_func = 'max'
-        else:
-            raise HTTPException(status_code=400, detail=f"Unknown aggregation_function: {request.aggregation_function}")
-
-        if request.metric in df.columns:
-            result = df.groupby(['time_group', 'battery_id'])[request.metric].agg(agg_func).reset_index()
+        if not rows:
+            return {"error": "No data found for the specified criteria"}
 
-            result['time_group'] = result['time_group'].astype(str)
-            result_dict = result.to_dict('records')
-            
-            summary = {
-                'total_data_points': len(df),
-                'battery_count': df['battery_id'].nunique(),
-                'time_periods': len(result['time_group'].unique()),
-                'metric_summary': {
-                    'min': float(result[request.metric].min()),
-                    'max': float(result[request.metric].max()),
-                    'mean': float(result[request.metric].mean()),
-                    'median': float(result[request.metric].median())
-                }
+        result_dict = [
+            {
+                'time_group': format_time_group(row['time_group'], request.aggregation_period),
+                'battery_id': row['battery_id'],
+                request.metric: row['value']
             }
-            
-            return {
-                'time_period': {
-                    'description': time_period_description,
-                    'start_time': start_time.isoformat(),
-                    'end_time': end_time.isoformat(),
-                    'days_analyzed': (end_time - start_time).days
-                },
-                'data': result_dict,
-                'summary': summary,
-                'request_parameters': {
-                    'metric': request.metric,
-                    'aggregation_period': request.aggregation_period,
-                    'aggregation_function': request.aggregation_function,
-                    'time_period': request.time_period.value if request.time_period else None
-                }
+            for row in rows
+        ]
+        values = sorted(row['value'] for row in rows if row['value'] is not None)
+        if values:
+            mid = len(values) // 2
+            metric_summary = {
+                'min': float(values[0]),
+                'max': float(values[-1]),
+                'mean': float(sum(values) / len(values)),
+                'median': float(values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2)
             }
         else:
-            raise HTTPException(status_code=400, detail=f"Metric '{request.metric}' not available")
+            metric_summary = {'min': None, 'max': None, 'mean': None, 'median': None}
+
+        return {
+            'time_period': {
+                'description': time_period_description,
+                'start_time': start_time.isoformat(),
+                'end_time': end_time.isoformat(),
+                'days_analyzed': (end_time - start_time).days
+            },
+            'data': result_dict,
+            'summary': {
+                'total_data_points': sum(row['raw_count'] for row in rows),
+                'battery_count': len({row['battery_id'] for row in rows}),
+                'time_periods': len({row['time_group'] for row in rows}),
+                'metric_summary': metric_summary,
+                'source': 'livedata'
+            },
+            'request_parameters': {
+                'metric': request.metric,
+                'aggregation_period': request.aggregation_period,
+                'aggregation_function': request.aggregation_function,
+                'time_period': request.time_period
+            }
+        }
             
     except HTTPException:
         raise
@@ -9155,10 +9333,11 @@ async def get_power_usage_analytics(
         raise HTTPException(status_code=500, detail=f"Analytics error: {str(e)}")
 
 @app.post("/analytics/power-by-pue-type",
+    dependencies=[Depends(limit_analytics_concurrency)],
     tags=["Data & Analytics"],
     summary="Power Usage grouped by Productive Use Type",
     description="Aggregate battery power data by the PUE type rented concurrently by the same user")
-async def get_power_by_pue_type(
+def get_power_by_pue_type(
     request: PowerByPUETypeRequest,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -9182,8 +9361,10 @@ async def get_power_by_pue_type(
         end_time = to_naive(_end)
         start_time = to_naive(_start)
 
-        # Load battery rentals in range
-        bat_rentals = db.query(BatteryRental).filter(
+        # Load battery rentals in range, with their battery items in one extra query
+        bat_rentals = db.query(BatteryRental).options(
+            selectinload(BatteryRental.battery_items)
+        ).filter(
             BatteryRental.hub_id == hub_id,
             BatteryRental.start_date <= end_time,
         ).filter(
@@ -9194,53 +9375,47 @@ async def get_power_by_pue_type(
         if not bat_rentals:
             return {"data": [], "pue_types": [], "summary": {"message": "No rentals found in range"}}
 
-        # Map rental_id -> (user_id, rental_start, rental_end, [battery_ids])
-        rental_info = {}
-        all_battery_ids = set()
+        # One interval per (rental, battery)
+        rental_rows = []
         for r in bat_rentals:
             r_end = to_naive(r.actual_return_date or r.end_date) or end_time
-            bat_ids = [item.battery_id for item in r.battery_items]
-            rental_info[r.rental_id] = {
-                "user_id": r.user_id,
-                "start": to_naive(r.start_date),
-                "end": r_end,
-                "battery_ids": bat_ids,
-            }
-            all_battery_ids.update(bat_ids)
-
-        # Load PUE rentals for those users in range (with PUE item + type)
-        user_ids = list({v["user_id"] for v in rental_info.values()})
-        pue_rentals = db.query(PUERental).filter(
+            for item in r.battery_items:
+                rental_rows.append((item.battery_id, to_naive(r.start_date), r_end, r.user_id))
+        rentals_df = pd.DataFrame(rental_rows, columns=["battery_id", "rental_start", "rental_end", "user_id"])
+        all_battery_ids = list(rentals_df["battery_id"].unique())
+        user_ids = list({r.user_id for r in bat_rentals})
+
+        # PUE rentals for those users in range, joined to their PUE type
+        pue_query = db.query(
+            PUERental.user_id,
+            PUERental.timestamp_taken,
+            PUERental.date_returned,
+            PUEType.type_name
+        ).join(
+            ProductiveUseEquipment, ProductiveUseEquipment.pue_id == PUERental.pue_id
+        ).join(
+            PUEType, PUEType.type_id == ProductiveUseEquipment.pue_type_id
+        ).filter(
             PUERental.user_id.in_(user_ids),
             PUERental.timestamp_taken <= end_time,
         ).filter(
             (PUERental.date_returned >= start_time) |
             (PUERental.date_returned.is_(None))
-        ).all()
-
-        # Build: user_id -> [(pue_type_id, pue_type_name, pue_start, pue_end)]
-        pue_type_by_user = {}
-        for pr in pue_rentals:
-            pue_item = db.query(ProductiveUseEquipment).filter_by(pue_id=pr.pue_id).first()
-            if not pue_item or not pue_item.pue_type_id:
-                continue
-            if request.pue_type_ids and pue_item.pue_type_id not in request.pue_type_ids:
-                continue
-            pue_type = db.query(PUEType).filter_by(type_id=pue_item.pue_type_id).first()
-            if not pue_type:
-                continue
-            uid = pr.user_id
-            if uid not in pue_type_by_user:
-                pue_type_by_user[uid] = []
-            pue_type_by_user[uid].append({
-                "type_name": pue_type.type_name,
-                "start": to_naive(pr.timestamp_taken),
-                "end": to_naive(pr.date_returned) or end_time,
-            })
+        )
+        if request.pue_type_ids:
+            pue_query = pue_query.filter(ProductiveUseEquipment.pue_type_id.in_(request.pue_type_ids))
+        segments_df = build_pue_segments(
+            (pr.user_id, to_naive(pr.timestamp_taken), to_naive(pr.date_returned) or end_time, pr.type_name)
+            for pr in pue_query.all()
+        )
 
-        # Load LiveData for all relevant batteries
-        live_rows = db.query(LiveData).filter(
-            LiveData.battery_id.in_(list(all_battery_ids)),
+        # Only the three columns needed from LiveData
+        live_rows = db.query(
+            LiveData.battery_id,
+            LiveData.timestamp,
+            LiveData.power_watts
+        ).filter(
+            LiveData.battery_id.in_(all_battery_ids),
             LiveData.timestamp >= start_time,
             LiveData.timestamp <= end_time,
         ).all()
@@ -9248,86 +9423,57 @@ async def get_power_by_pue_type(
         if not live_rows:
             return {"data": [], "pue_types": [], "summary": {"message": "No telemetry found for rentals in range"}}
 
-        # Build battery_id -> [(rental_id, ...)] lookup sorted by start
-        bat_to_rentals = {}
-        for rid, info in rental_info.items():
-            for bid in info["battery_ids"]:
-                if bid not in bat_to_rentals:
-                    bat_to_rentals[bid] = []
-                bat_to_rentals[bid].append(rid)
-
-        def find_pue_type(battery_id, ts):
-            """Return PUE type name for a LiveData point, or 'No PUE'."""
-            for rid in bat_to_rentals.get(battery_id, []):
-                info = rental_info[rid]
-                if info["start"] <= ts <= info["end"]:
-                    uid = info["user_id"]
-                    for pt in pue_type_by_user.get(uid, []):
-                        if pt["start"] <= ts <= pt["end"]:
-                            return pt["type_name"]
-                    return "No PUE"
-            return None  # outside any rental, skip
-
-        def floor_ts(ts, period):
-            if period == "hour":
-                return ts.replace(minute=0, second=0, microsecond=0)
-            if period == "day":
-                return ts.replace(hour=0, minute=0, second=0, microsecond=0)
-            if period == "week":
-                return (ts - timedelta(days=ts.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
-            # month
-            return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-        # Aggregate: {(time_group_str, pue_type_name): [power_watts values]}
-        buckets = {}
-        for row in live_rows:
-            if row.power_watts is None:
-                continue
-            pue_name = find_pue_type(row.battery_id, row.timestamp)
-            if pue_name is None:
-                continue
-            tg = floor_ts(row.timestamp, request.aggregation_period).isoformat()
-            key = (tg, pue_name)
-            if key not in buckets:
-                buckets[key] = []
-            buckets[key].append(row.power_watts)
-
-        def agg(vals, fn):
-            if not vals:
-                return 0.0
-            if fn == "sum":
-                return sum(vals)
-            if fn == "min":
-                return min(vals)
-            if fn == "max":
-                return max(vals)
-            return sum(vals) / len(vals)  # mean / default
-
-        import statistics as _statistics
+        points_df = pd.DataFrame(live_rows, columns=["battery_id", "timestamp", "power_watts"]).dropna()
+        points_df = attribute_pue_types(points_df, rentals_df, segments_df)
+
+        timestamps = points_df["timestamp"]
+        if request.aggregation_period == "hour":
+            time_group = timestamps.dt.floor("h")
+        elif request.aggregation_period == "day":
+            time_group = timestamps.dt.floor("D")
+        elif request.aggregation_period == "week":
+            time_group = (timestamps - pd.to_timedelta(timestamps.dt.weekday, unit="D")).dt.floor("D")
+        else:
+            time_group = timestamps.dt.to_period("M").dt.start_time
+        points_df = points_df.assign(time_group=time_group.map(lambda ts: ts.isoformat()))
+
+        grouped = points_df.groupby(["time_group", "pue_type_name"])["power_watts"]
         result_data = []
-        all_pue_types = set()
-        for (tg, pue_name), vals in sorted(buckets.items()):
-            all_pue_types.add(pue_name)
-            if request.aggregation_function == 'split_stats':
-                in_v = [v for v in vals if v > 1]
-                out_v = [v for v in vals if v < -1]
+        if request.aggregation_function == 'split_stats':
+            power = points_df["power_watts"]
+            directions = {}
+            for direction, mask in (("in", power > 1), ("out", power < -1)):
+                stats = points_df[mask].groupby(["time_group", "pue_type_name"])["power_watts"].agg(
+                    ["mean", "median", "std", "count"]
+                )
+                stats["std"] = stats["std"].fillna(0)
+                directions[direction] = stats.to_dict("index")
+            for tg, pue_name in sorted(grouped.groups.keys()):
                 row = {'time_group': tg, 'pue_type_name': pue_name}
-                if in_v:
-                    row.update({'in_mean': round(sum(in_v) / len(in_v), 2), 'in_median': round(_statistics.median(in_v), 2), 'in_std': round(_statistics.stdev(in_v) if len(in_v) > 1 else 0, 2), 'in_count': len(in_v)})
-                if out_v:
-                    row.update({'out_mean': round(sum(out_v) / len(out_v), 2), 'out_median': round(_statistics.median(out_v), 2), 'out_std': round(_statistics.stdev(out_v) if len(out_v) > 1 else 0, 2), 'out_count': len(out_v)})
+                for direction, stats in directions.items():
+                    s = stats.get((tg, pue_name))
+                    if s:
+                        row.update({
+                            f'{direction}_mean': round(float(s['mean']), 2),
+                            f'{direction}_median': round(float(s['median']), 2),
+                            f'{direction}_std': round(float(s['std']), 2),
+                            f'{direction}_count': int(s['count'])
+                        })
                 result_data.append(row)
-            else:
+        else:
+            agg_func = request.aggregation_function if request.aggregation_function in ("sum", "min", "max") else "mean"
+            aggregated = grouped.agg([agg_func, "count"]).sort_index()
+            for (tg, pue_name), values in aggregated.iterrows():
                 result_data.append({
                     "time_group": tg,
                     "pue_type_name": pue_name,
-                    "power_watts": round(agg(vals, request.aggregation_function), 2),
-                    "count": len(vals),
+                    "power_watts": round(float(values[agg_func]), 2),
+                    "count": int(values["count"]),
                 })
 
         return {
             "data": result_data,
-            "pue_types": sorted(all_pue_types),
+            "pue_types": sorted(points_df["pue_type_name"].unique().tolist()),
             "summary": {
                 "rentals_analyzed": len(bat_rentals),
                 "data_points": len(live_rows),
@@ -9343,15 +9489,20 @@ async def get_power_by_pue_type(
 
 
 @app.post("/analytics/user-report",
+    dependencies=[Depends(limit_analytics_concurrency)],
     tags=["Data & Analytics"],
     summary="User Report",
     description="Generate a detailed usage report for a specific user over a date range")
-async def get_user_report(
+def get_user_report(
     request: UserReportRequest,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """Generate detailed battery usage report for a user with power statistics."""
+    """
+    Generate detailed battery usage report for a user with power statistics.
+    Stats come from rental_usage_facts; where rentals of a battery overlap,
+    each reading counts for one rental only (the later-started one).
+    """
     if current_user.get('role') not in [UserRole.ADMIN, UserRole.SUPERADMIN, UserRole.DATA_ADMIN]:
         raise HTTPException(status_code=403, detail="Data access required")
 
@@ -9433,48 +9584,11 @@ async def get_user_report(
         for item in items:
             rental_batteries[item.rental_id].append(item.battery_id)
 
-        all_battery_ids = list({item.battery_id for item in items})
-
-        # Fetch LiveData for those batteries in date range
-        live_rows = []
-        if all_battery_ids:
-            live_rows = db.query(LiveData).filter(
-                LiveData.battery_id.in_(all_battery_ids),
-                LiveData.timestamp >= start_naive,
-                LiveData.timestamp <= end_naive,
-            ).order_by(LiveData.timestamp).all()
+        # Per-rental usage summaries (computed on the fly, unsaved, for rentals that have none yet)
+        facts = usage_facts(db, rental_ids)
 
-        # Build battery_intervals: battery_id -> [(start_naive, end_naive, rental_id)]
-        battery_intervals = defaultdict(list)
-        rental_map = {r.rental_id: r for r in rentals}
-        for r in rentals:
-            r_start = to_naive(r.start_date)
-            r_end = to_naive(r.actual_return_date or r.end_date) or end_naive
-            for bid in rental_batteries.get(r.rental_id, []):
-                battery_intervals[bid].append((r_start, r_end, r.rental_id))
-
-        def find_rental_for_point(battery_id, ts):
-            for (iv_start, iv_end, rid) in battery_intervals.get(battery_id, []):
-                if iv_start and iv_end and iv_start <= ts <= iv_end:
-                    return rid
-                elif iv_start and ts >= iv_start and iv_end is None:
-                    return rid
-            return None
-
-        # Assign live data points to rentals
-        rental_live = defaultdict(list)
-        power_timeline = []
-        for row in live_rows:
-            ts = to_naive(row.timestamp)
-            rid = find_rental_for_point(row.battery_id, ts)
-            if rid is not None:
-                rental_live[rid].append(row)
-                power_timeline.append({
-                    "timestamp": ts.isoformat() if ts else None,
-                    "power_watts": row.power_watts,
-                    "rental_id": rid,
-                    "battery_id": row.battery_id,
-                })
+        def rounded(value):
+            return round(value, 2) if value is not None else None
 
         # Build per-rental stats
         rental_stats = {}
@@ -9486,24 +9600,7 @@ async def get_user_report(
             if r_start and r_end:
                 duration_h = round((r_end - r_start).total_seconds() / 3600, 2)
 
-            live_pts = rental_live.get(rid, [])
-            # Usage = discharge = negative power_watts. Convert to positive for stats.
-            pw_usage = [abs(p.power_watts) for p in live_pts if p.power_watts is not None and p.power_watts < 0]
-
-            # Wh consumed during discharge only (trapezoidal integration of negative segments)
-            total_wh = None
-            pts_sorted = sorted(live_pts, key=lambda p: p.timestamp)
-            if len(pts_sorted) >= 2:
-                wh = 0.0
-                for i in range(1, len(pts_sorted)):
-                    dt_h = (to_naive(pts_sorted[i].timestamp) - to_naive(pts_sorted[i-1].timestamp)).total_seconds() / 3600
-                    w0 = pts_sorted[i-1].power_watts or 0
-                    w1 = pts_sorted[i].power_watts or 0
-                    avg_w = (w0 + w1) / 2
-                    if avg_w < 0:  # only count discharge
-                        wh += abs(avg_w) * dt_h
-                total_wh = round(wh, 2)
-
+            fact = facts.get(rid)
             bat_ids = rental_batteries.get(rid, [])
             battery_label = bat_ids[0] if bat_ids else None
             amount_paid = float(r.amount_paid) if r.amount_paid is not None else None
@@ -9516,12 +9613,14 @@ async def get_user_report(
                 "duration_h": duration_h,
                 "status": r.status,
                 "amount_paid": amount_paid,
-                "power_mean_w": safe_mean(pw_usage),
-                "power_median_w": safe_median(pw_usage),
-                "power_max_w": round(max(pw_usage), 2) if pw_usage else None,
-                "power_min_w": round(min(pw_usage), 2) if pw_usage else None,
-                "power_sd_w": safe_sd(pw_usage),
-                "total_wh": total_wh,
+                "power_mean_w": rounded(fact.power_mean_w) if fact else None,
+                "power_median_w": rounded(fact.power_median_w) if fact else None,
+                "power_max_w": rounded(fact.power_max_w) if fact else None,
+                "power_min_w": rounded(fact.power_min_w) if fact else None,
+                "power_sd_w": rounded(fact.power_sd_w) if fact else None,
+                "total_wh": rounded(fact.wh_discharged) if fact else None,
+                "active_hours": rounded(fact.active_hours) if fact else None,
+                "data_points": fact.point_count if fact else 0,
             }
 
         # Group by date (rental start date)
@@ -9536,7 +9635,6 @@ async def get_user_report(
         for day_key in sorted(daily_map.keys()):
             day_rental_ids = daily_map[day_key]
             day_stats = [rental_stats[rid] for rid in day_rental_ids if rid in rental_stats]
-            all_pw = []
             total_dur = 0.0
             total_wh_day = 0.0
             has_wh = False
@@ -9546,19 +9644,18 @@ async def get_user_report(
                 if rs["total_wh"] is not None:
                     total_wh_day += rs["total_wh"]
                     has_wh = True
-                live_pts = rental_live.get(rs["rental_id"], [])
-                all_pw.extend([abs(p.power_watts) for p in live_pts if p.power_watts is not None and p.power_watts < 0])
+            day_power = pooled_discharge_stats(facts[rid] for rid in day_rental_ids if rid in facts)
 
             daily_list.append({
                 "date": day_key,
                 "uses": len(day_rental_ids),
                 "total_duration_h": round(total_dur, 2),
                 "total_wh": round(total_wh_day, 2) if has_wh else None,
-                "power_max_w": round(max(all_pw), 2) if all_pw else None,
-                "power_min_w": round(min(all_pw), 2) if all_pw else None,
-                "power_mean_w": safe_mean(all_pw),
-                "power_median_w": safe_median(all_pw),
-                "power_sd_w": safe_sd(all_pw),
+                "power_max_w": rounded(day_power["max"]),
+                "power_min_w": rounded(day_power["min"]),
+                "power_mean_w": rounded(day_power["mean"]),
+                "power_median_w": rounded(day_power["median"]),
+                "power_sd_w": rounded(day_power["sd"]),
                 "rentals": [
                     {
                         "rental_id": rs["rental_id"],
@@ -9578,7 +9675,7 @@ async def get_user_report(
         uses_per_day = [len(v) for v in daily_map.values()]
 
         all_durations = [rs["duration_h"] for rs in rental_stats.values() if rs["duration_h"] is not None]
-        all_pw_global = [abs(p.power_watts) for pts in rental_live.values() for p in pts if p.power_watts is not None and p.power_watts < 0]
+        all_power = pooled_discharge_stats(facts.values())
         day_wh_list = [d["total_wh"] for d in daily_list if d["total_wh"] is not None]
 
         summary = {
@@ -9591,12 +9688,15 @@ async def get_user_report(
             "duration_mean_h": safe_mean(all_durations),
             "duration_median_h": safe_median(all_durations),
             "duration_sd_h": safe_sd(all_durations),
-            "power_mean_w": safe_mean(all_pw_global),
-            "power_median_w": safe_median(all_pw_global),
+            "power_mean_w": rounded(all_power["mean"]),
+            "power_median_w": rounded(all_power["median"]),
             "wh_per_day_mean": safe_mean(day_wh_list),
             "wh_per_day_median": safe_median(day_wh_list),
         }
 
+        # Hourly mean power while rented, from the livedata_hourly rollup
+        power_timeline = rental_power_timeline(db, rental_ids, start_naive, end_naive)
+
         return {
             "summary": summary,
             "daily": daily_list,
@@ -9611,10 +9711,11 @@ async def get_user_report(
 
 
 @app.get("/analytics/battery-performance",
+    dependencies=[Depends(limit_analytics_concurrency)],
     tags=["Data & Analytics"],
     summary="Battery Performance Analytics",
     description="Get performance analytics for specific batteries over a time period")
-async def get_battery_performance_analytics(
+def get_battery_performance_analytics(
     battery_ids: str = Query(..., description="Comma-separated battery IDs"),
     days_back: int = Query(7, description="Number of days to analyze"),
     db: Session = Depends(get_db),
@@ -9691,10 +9792,11 @@ async def get_battery_performance_analytics(
         raise HTTPException(status_code=500, detail=f"Battery performance analytics error: {str(e)}")
 
 @app.post("/analytics/rental-statistics",
+    dependencies=[Depends(limit_analytics_concurrency)],
     tags=["Data & Analytics"],
     summary="Rental Statistics Analytics",
     description="Get rental statistics for specified hubs and time period")
-async def get_rental_statistics_analytics(
+def get_rental_statistics_analytics(
     request: dict,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -9774,10 +9876,11 @@ async def get_rental_statistics_analytics(
         raise HTTPException(status_code=500, detail=f"Rental statistics error: {str(e)}")
 
 @app.get("/analytics/revenue",
+    dependencies=[Depends(limit_analytics_concurrency)],
     tags=["Data & Analytics"], 
     summary="Revenue Analytics",
     description="Get revenue analytics including rental and PUE income")
-async def get_revenue_analytics(
+def get_revenue_analytics(
     days_back: int = Query(30, description="Number of days to analyze"),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -9833,10 +9936,11 @@ async def get_revenue_analytics(
         raise HTTPException(status_code=500, detail=f"Revenue analytics error: {str(e)}")
 
 @app.get("/analytics/device-utilization/{hub_id}",
+    dependencies=[Depends(limit_analytics_concurrency)],
     tags=["Data & Analytics"],
     summary="Device Utilization Analytics", 
     description="Get device utilization rates for a specific hub")
-async def get_device_utilization_analytics(
+def get_device_utilization_analytics(
     hub_id: int,
     days_back: int = Query(30, description="Number of days to analyze"),
     db: Session = Depends(get_db),
@@ -9969,10 +10073,11 @@ async def get_device_utilization_analytics(
         raise HTTPException(status_code=500, detail=f"Device utilization error: {str(e)}")
 
 @app.get("/analytics/export/{hub_id}",
+    dependencies=[Depends(limit_analytics_concurrency)],
     tags=["Data & Analytics"],
     summary="Export Analytics Data",
     description="Export analytics data in CSV or JSON format")
-async def export_analytics_data(
+def export_analytics_data(
     hub_id: int,
     format: str = Query("json", description="Export format: csv or json"),
     days_back: int = Query(30, description="Number of days to include"),
@@ -10074,7 +10179,7 @@ async def export_analytics_data(
 # ============================================================================
 
 @app.get("/admin/webhook-logs")
-async def get_webhook_logs(
+def get_webhook_logs(
     limit: int = Query(1000, description="Number of recent webhook logs to return (max: limit from config)"),
     battery_id: Optional[str] = Query(None, description="Filter by battery ID"),
     db: Session = Depends(get_db),
@@ -10129,7 +10234,7 @@ async def get_webhook_logs(
         raise HTTPException(status_code=500, detail=f"Error reading webhook logs: {str(e)}")
 
 @app.delete("/admin/webhook-logs/cleanup")
-async def cleanup_webhook_logs(
+def cleanup_webhook_logs(
     before_date: str = Query(..., description="Delete logs before this date (ISO format: YYYY-MM-DD)"),
     battery_id: Optional[str] = Query(None, description="Optional: only delete logs for specific battery"),
     db: Session = Depends(get_db),
@@ -10222,12 +10327,54 @@ async def cleanup_webhook_logs(
         )
         raise HTTPException(status_code=500, detail=f"Error deleting webhook logs: {str(e)}")
 
+@app.get("/admin/ingest-stats")
+def get_ingest_stats(
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Live-data ingestion queue metrics for this API worker (admin/superadmin only).
+    Reports queue depth and batch flush latency when LIVE_DATA_INGEST_MODE=queued,
+    plus the buffered webhook audit log writer, the battery credential cache,
+    the battery error notification tracker and the hub summary cache.
+    """
+    if current_user.get('role') not in [UserRole.ADMIN, UserRole.SUPERADMIN]:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    return {
+        "mode": LIVE_DATA_INGEST_MODE,
+        "worker_pid": os.getpid(),
+        "queue": live_data_ingest_queue.stats(),
+        "audit_log": audit_log_writer.stats(),
+        "battery_credentials": battery_credentials.stats(),
+        "battery_errors": battery_error_tracker.stats(),
+        "hub_summary": hub_summary_cache.stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/admin/db-pool-stats")
+def get_db_pool_stats(
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Database connection pool metrics for this API worker (admin/superadmin only).
+    connections_opened growing in step with checkouts means connections are
+    not being reused (DB_POOL_MODE=null or a pool that is too small).
+    """
+    if current_user.get('role') not in [UserRole.ADMIN, UserRole.SUPERADMIN]:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    return {
+        "worker_pid": os.getpid(),
+        "pool": pool_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
 # ============================================================================
 # HEALTH CHECK AND ROOT ENDPOINTS
 # ============================================================================
 
 @app.get("/health")
-async def health_check(db: Session = Depends(get_db)):
+def health_check(db: Session = Depends(get_db)):
     """Health check endpoint"""
     try:
         result = db.execute(text("SELECT 1")).fetchone()
@@ -10243,7 +10390,7 @@ async def health_check(db: Session = Depends(get_db)):
     }
 
 @app.get("/")
-async def root():
+def root():
     """Root endpoint with API information"""
     return {
         "message": "Solar Hub Management API with PUE & Analytics",
@@ -10336,6 +10483,29 @@ async def startup():
         if DEBUG:
             webhook_logger.info("✅ Database schema managed by Alembic migrations")
 
+        # Threadpool that runs the (sync) route handlers and streamed responses, sized
+        # to the DB pool left over by the background writers (audit log, battery
+        # errors, and the ingest queue when enabled) unless set explicitly
+        background_writers = 3 if LIVE_DATA_INGEST_MODE == "queued" else 2
+        connections = pool_capacity()
+        threadpool_size = API_THREADPOOL_SIZE
+        if threadpool_size is None:
+            threadpool_size = max(connections - background_writers, 4) if connections else 40
+        elif connections and threadpool_size + background_writers > connections:
+            webhook_logger.warning(
+                f"⚠️ API_THREADPOOL_SIZE={threadpool_size} exceeds the DB pool "
+                f"({connections} connections, {background_writers} used by background writers): "
+                f"busy handlers will wait up to DB_POOL_TIMEOUT for a connection"
+            )
+        anyio.to_thread.current_default_thread_limiter().total_tokens = threadpool_size
+
+        audit_log_writer.start()
+        battery_error_tracker.start()
+
+        if LIVE_DATA_INGEST_MODE == "queued":
+            live_data_ingest_queue.start()
+            print(f"✅ Queued live-data ingestion enabled (flush every {LIVE_DATA_FLUSH_ROWS} rows / {LIVE_DATA_FLUSH_INTERVAL_MS} ms)")
+
         print("✅ Enhanced API ready with PUE management and data analytics")
 
     except Exception as e:
@@ -10344,12 +10514,19 @@ async def startup():
         print(f"❌ API startup failed: {e}")
         raise e
 
+@app.on_event("shutdown")
+def shutdown():
+    # Flush any queued telemetry, webhook log entries and error notifications before the worker exits
+    live_data_ingest_queue.stop()
+    audit_log_writer.stop()
+    battery_error_tracker.stop()
+
 # ============================================================================
 # SETTINGS ENDPOINTS
 # ============================================================================
 
 @app.get("/settings/rental-durations", tags=["Settings"])
-async def get_rental_duration_presets(
+def get_rental_duration_presets(
     hub_id: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -10385,7 +10562,7 @@ async def get_rental_duration_presets(
     }
 
 @app.post("/settings/rental-durations", tags=["Settings"])
-async def create_rental_duration_preset(
+def create_rental_duration_preset(
     label: str = Query(...),
     duration_value: int = Query(...),
     duration_unit: str = Query(...),
@@ -10412,7 +10589,7 @@ async def create_rental_duration_preset(
     return {"message": "Preset created", "preset_id": preset.preset_id}
 
 @app.put("/settings/rental-durations/{preset_id}", tags=["Settings"])
-async def update_rental_duration_preset(
+def update_rental_duration_preset(
     preset_id: int,
     label: Optional[str] = Query(None),
     duration_value: Optional[int] = Query(None),
@@ -10447,7 +10624,7 @@ async def update_rental_duration_preset(
     return {"message": "Preset updated", "preset_id": preset.preset_id}
 
 @app.delete("/settings/rental-durations/{preset_id}", tags=["Settings"])
-async def delete_rental_duration_preset(
+def delete_rental_duration_preset(
     preset_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -10466,7 +10643,7 @@ async def delete_rental_duration_preset(
     return {"message": "Preset deleted"}
 
 @app.get("/settings/pue-types", tags=["Settings"])
-async def get_pue_types(
+def get_pue_types(
     hub_id: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -10501,7 +10678,7 @@ async def get_pue_types(
     }
 
 @app.post("/settings/pue-types", tags=["Settings"])
-async def create_pue_type(
+def create_pue_type(
     type_name: str = Query(...),
     description: Optional[str] = Query(None),
     hub_id: Optional[int] = Query(None),
@@ -10525,7 +10702,7 @@ async def create_pue_type(
     return {"message": "PUE type created", "type_id": pue_type.type_id}
 
 @app.put("/settings/pue-types/{type_id}", tags=["Settings"])
-async def update_pue_type(
+def update_pue_type(
     type_id: int,
     type_name: Optional[str] = Query(None),
     description: Optional[str] = Query(None),
@@ -10554,7 +10731,7 @@ async def update_pue_type(
     return {"message": "PUE type updated", "type_id": pue_type.type_id}
 
 @app.delete("/settings/pue-types/{type_id}", tags=["Settings"])
-async def delete_pue_type(
+def delete_pue_type(
     type_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -10573,7 +10750,7 @@ async def delete_pue_type(
     return {"message": "PUE type deleted"}
 
 @app.get("/settings/pricing", tags=["Settings"])
-async def get_pricing_configs(
+def get_pricing_configs(
     hub_id: Optional[int] = Query(None),
     item_type: Optional[str] = Query(None),
     is_active: Optional[bool] = Query(None),
@@ -10611,7 +10788,7 @@ async def get_pricing_configs(
     } for c in configs]
 
 @app.post("/settings/pricing", tags=["Settings"])
-async def create_pricing_config(
+def create_pricing_config(
     item_type: str = Query(...),
     item_reference: str = Query(...),
     unit_type: str = Query(...),
@@ -10646,7 +10823,7 @@ async def create_pricing_config(
     return {"message": "Pricing created", "pricing_id": pricing.pricing_id}
 
 @app.delete("/settings/pricing/{pricing_id}", tags=["Settings"])
-async def delete_pricing_config(
+def delete_pricing_config(
     pricing_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -10665,7 +10842,7 @@ async def delete_pricing_config(
     return {"message": "Pricing deleted"}
 
 @app.get("/settings/deposit-presets", tags=["Settings"])
-async def get_deposit_presets(
+def get_deposit_presets(
     hub_id: Optional[int] = Query(None),
     item_type: Optional[str] = Query(None),
     is_active: Optional[bool] = Query(None),
@@ -10705,7 +10882,7 @@ async def get_deposit_presets(
     }
 
 @app.post("/settings/deposit-presets", tags=["Settings"])
-async def create_deposit_preset(
+def create_deposit_preset(
     item_type: str = Query(...),
     item_reference: str = Query(...),
     deposit_amount: float = Query(...),
@@ -10738,7 +10915,7 @@ async def create_deposit_preset(
     return {"message": "Deposit preset created", "preset_id": preset.preset_id}
 
 @app.delete("/settings/deposit-presets/{preset_id}", tags=["Settings"])
-async def delete_deposit_preset(
+def delete_deposit_preset(
     preset_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -10757,7 +10934,7 @@ async def delete_deposit_preset(
     return {"message": "Deposit preset deleted"}
 
 @app.get("/settings/payment-types", tags=["Settings"])
-async def get_payment_types(
+def get_payment_types(
     hub_id: Optional[int] = Query(None),
     is_active: Optional[bool] = Query(None),
     db: Session = Depends(get_db),
@@ -10792,7 +10969,7 @@ async def get_payment_types(
     }
 
 @app.post("/settings/payment-types", tags=["Settings"])
-async def create_payment_type(
+def create_payment_type(
     type_name: str = Query(...),
     description: Optional[str] = Query(None),
     hub_id: Optional[int] = Query(None),
@@ -10817,7 +10994,7 @@ async def create_payment_type(
     return {"message": "Payment type created", "type_id": payment_type.type_id}
 
 @app.delete("/settings/payment-types/{type_id}", tags=["Settings"])
-async def delete_payment_type(
+def delete_payment_type(
     type_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -10840,7 +11017,7 @@ async def delete_payment_type(
 # ============================================================================
 
 @app.get("/settings/customer-field-options", tags=["Settings"])
-async def get_customer_field_options(
+def get_customer_field_options(
     hub_id: Optional[int] = Query(None),
     field_name: Optional[str] = Query(None),
     is_active: Optional[bool] = Query(None),
@@ -10875,7 +11052,7 @@ async def get_customer_field_options(
     return options
 
 @app.post("/settings/customer-field-options", tags=["Settings"])
-async def create_customer_field_option(
+def create_customer_field_option(
     field_name: str = Query(..., description="Field name: gesi_status, business_category, main_reason_for_signup"),
     option_value: str = Query(...),
     description: Optional[str] = Query(None),
@@ -10907,7 +11084,7 @@ async def create_customer_field_option(
     return {"message": "Customer field option created", "option_id": option.option_id}
 
 @app.put("/settings/customer-field-options/{option_id}", tags=["Settings"])
-async def update_customer_field_option(
+def update_customer_field_option(
     option_id: int,
     option_value: Optional[str] = Query(None),
     description: Optional[str] = Query(None),
@@ -10939,7 +11116,7 @@ async def update_customer_field_option(
     return {"message": "Customer field option updated"}
 
 @app.delete("/settings/customer-field-options/{option_id}", tags=["Settings"])
-async def delete_customer_field_option(
+def delete_customer_field_option(
     option_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -10963,7 +11140,7 @@ async def delete_customer_field_option(
 # ============================================================================
 
 @app.get("/settings/return-survey-questions", tags=["Settings", "Survey"])
-async def get_return_survey_questions(
+def get_return_survey_questions(
     hub_id: Optional[int] = Query(None),
     applies_to_battery: Optional[bool] = Query(None),
     applies_to_pue: Optional[bool] = Query(None),
@@ -11023,7 +11200,7 @@ async def get_return_survey_questions(
 
 
 @app.post("/settings/return-survey-questions", tags=["Settings", "Survey"])
-async def create_return_survey_question(
+def create_return_survey_question(
     question_text: str = Query(...),
     question_type: str = Query(...),
     help_text: Optional[str] = Query(None),
@@ -11082,7 +11259,7 @@ async def create_return_survey_question(
 
 
 @app.put("/settings/return-survey-questions/{question_id}", tags=["Settings", "Survey"])
-async def update_return_survey_question(
+def update_return_survey_question(
     question_id: int,
     question_text: Optional[str] = Query(None),
     question_type: Optional[str] = Query(None),
@@ -11145,7 +11322,7 @@ async def update_return_survey_question(
 
 
 @app.delete("/settings/return-survey-questions/{question_id}", tags=["Settings", "Survey"])
-async def delete_return_survey_question(
+def delete_return_survey_question(
     question_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -11165,7 +11342,7 @@ async def delete_return_survey_question(
 
 
 @app.post("/settings/return-survey-questions/{question_id}/options", tags=["Settings", "Survey"])
-async def add_question_option(
+def add_question_option(
     question_id: int,
     option_text: str = Query(...),
     option_value: str = Query(...),
@@ -11208,7 +11385,7 @@ async def add_question_option(
 
 
 @app.put("/settings/return-survey-question-options/{option_id}", tags=["Settings", "Survey"])
-async def update_question_option(
+def update_question_option(
     option_id: int,
     option_text: Optional[str] = Query(None),
     option_value: Optional[str] = Query(None),
@@ -11241,7 +11418,7 @@ async def update_question_option(
 
 
 @app.delete("/settings/return-survey-question-options/{option_id}", tags=["Settings", "Survey"])
-async def delete_question_option(
+def delete_question_option(
     option_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -11263,7 +11440,7 @@ async def delete_question_option(
 # Survey Response Endpoints
 
 @app.get("/return-survey/questions", tags=["Survey"])
-async def get_active_survey_questions(
+def get_active_survey_questions(
     rental_type: str = Query(..., regex="^(battery|pue)$"),
     hub_id: Optional[int] = Query(None),
     db: Session = Depends(get_db)
@@ -11315,13 +11492,14 @@ async def get_active_survey_questions(
 
 
 @app.post("/return-survey/responses", tags=["Survey"])
-async def submit_survey_responses(
+def submit_survey_responses(
     request: Request,
+    raw_body: bytes = Depends(read_request_body),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """Submit survey responses for a rental return"""
-    data = await request.json()
+    data = json.loads(raw_body)
 
     battery_rental_id = data.get("battery_rental_id")
     pue_rental_id = data.get("pue_rental_id")
@@ -11372,7 +11550,7 @@ async def submit_survey_responses(
 
 
 @app.get("/return-survey/responses", tags=["Survey"])
-async def get_survey_responses(
+def get_survey_responses(
     hub_id: Optional[int] = Query(None),
     rental_type: Optional[str] = Query(None, regex="^(battery|pue)$"),
     start_date: Optional[str] = Query(None),
@@ -11435,7 +11613,7 @@ async def get_survey_responses(
 
 
 @app.get("/return-survey/responses/export", tags=["Survey"])
-async def export_survey_responses(
+def export_survey_responses(
     hub_id: Optional[int] = Query(None),
     rental_type: Optional[str] = Query(None, regex="^(battery|pue)$"),
     start_date: Optional[str] = Query(None),
@@ -11559,7 +11737,7 @@ async def export_survey_responses(
 # ============================================================================
 
 @app.get("/settings/cost-structures", tags=["Settings"])
-async def get_cost_structures(
+def get_cost_structures(
     hub_id: Optional[int] = Query(None),
     item_type: Optional[str] = Query(None),
     item_reference: Optional[str] = Query(None),
@@ -11657,7 +11835,7 @@ async def get_cost_structures(
     return {"cost_structures": result}
 
 @app.post("/settings/cost-structures", tags=["Settings"])
-async def create_cost_structure(
+def create_cost_structure(
     hub_id: Optional[int] = Query(None),
     name: str = Query(...),
     description: Optional[str] = Query(None),
@@ -11846,7 +12024,7 @@ async def create_cost_structure(
     }
 
 @app.put("/settings/cost-structures/{structure_id}", tags=["Settings"])
-async def update_cost_structure(
+def update_cost_structure(
     structure_id: int,
     name: Optional[str] = Query(None),
     description: Optional[str] = Query(None),
@@ -12031,7 +12209,7 @@ async def update_cost_structure(
     }
 
 @app.delete("/settings/cost-structures/{structure_id}", tags=["Settings"])
-async def delete_cost_structure(
+def delete_cost_structure(
     structure_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -12052,7 +12230,7 @@ async def delete_cost_structure(
     return {"message": "Cost structure deleted"}
 
 @app.post("/settings/cost-structures/{structure_id}/pue-items", tags=["Settings"])
-async def add_pue_item_to_cost_structure(
+def add_pue_item_to_cost_structure(
     structure_id: int,
     pue_id: str = Query(...),
     db: Session = Depends(get_db),
@@ -12084,7 +12262,7 @@ async def add_pue_item_to_cost_structure(
     return {"message": "PUE item added to cost structure", "structure_id": structure_id, "pue_id": pue_id}
 
 @app.delete("/settings/cost-structures/{structure_id}/pue-items/{pue_id}", tags=["Settings"])
-async def remove_pue_item_from_cost_structure(
+def remove_pue_item_from_cost_structure(
     structure_id: int,
     pue_id: str,
     db: Session = Depends(get_db),
@@ -12106,7 +12284,7 @@ async def remove_pue_item_from_cost_structure(
     return {"message": "PUE item removed from cost structure"}
 
 @app.post("/settings/cost-structures/{structure_id}/estimate", tags=["Settings"])
-async def estimate_rental_cost(
+def estimate_rental_cost(
     structure_id: int,
     duration_value: float = Query(...),
     duration_unit: str = Query(...),
@@ -12264,7 +12442,7 @@ async def estimate_rental_cost(
     }
 
 @app.get("/settings/hub/{hub_id}", tags=["Settings"])
-async def get_hub_settings(
+def get_hub_settings(
     hub_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -12307,7 +12485,7 @@ async def get_hub_settings(
     }
 
 @app.put("/settings/hub/{hub_id}", tags=["Settings"])
-async def update_hub_settings(
+def update_hub_settings(
     hub_id: int,
     debt_notification_threshold: Optional[float] = Query(None),
     default_currency: Optional[str] = Query(None),
@@ -12376,7 +12554,7 @@ async def update_hub_settings(
 # ============================================================================
 
 @app.get("/settings/subscription-packages", tags=["Settings", "Subscriptions"])
-async def get_subscription_packages(
+def get_subscription_packages(
     hub_id: Optional[int] = Query(None),
     include_inactive: bool = Query(False),
     db: Session = Depends(get_db),
@@ -12431,7 +12609,7 @@ async def get_subscription_packages(
 
 
 @app.post("/settings/subscription-packages", tags=["Settings", "Subscriptions"])
-async def create_subscription_package(
+def create_subscription_package(
     hub_id: int = Query(...),
     package_name: str = Query(...),
     billing_period: str = Query(...),  # 'daily', 'weekly', 'monthly', 'yearly'
@@ -12501,7 +12679,7 @@ async def create_subscription_package(
 
 
 @app.put("/settings/subscription-packages/{package_id}", tags=["Settings", "Subscriptions"])
-async def update_subscription_package(
+def update_subscription_package(
     package_id: int,
     package_name: Optional[str] = Query(None),
     billing_period: Optional[str] = Query(None),
@@ -12585,7 +12763,7 @@ async def update_subscription_package(
 
 
 @app.delete("/settings/subscription-packages/{package_id}", tags=["Settings", "Subscriptions"])
-async def delete_subscription_package(
+def delete_subscription_package(
     package_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -12626,7 +12804,7 @@ async def delete_subscription_package(
 
 
 @app.get("/users/{user_id}/subscriptions", tags=["Users", "Subscriptions"])
-async def get_user_subscriptions(
+def get_user_subscriptions(
     user_id: int,
     include_inactive: bool = Query(False),
     db: Session = Depends(get_db),
@@ -12682,7 +12860,7 @@ async def get_user_subscriptions(
 
 
 @app.post("/users/{user_id}/subscriptions", tags=["Users", "Subscriptions"])
-async def create_user_subscription(
+def create_user_subscription(
     user_id: int,
     package_id: int = Query(...),
     start_date: Optional[str] = Query(None),  # ISO format
@@ -12753,7 +12931,7 @@ async def create_user_subscription(
 
 
 @app.put("/users/{user_id}/subscriptions/{subscription_id}", tags=["Users", "Subscriptions"])
-async def update_user_subscription(
+def update_user_subscription(
     user_id: int,
     subscription_id: int,
     status: Optional[str] = Query(None),  # 'active', 'paused', 'cancelled', 'expired'
@@ -12800,7 +12978,7 @@ async def update_user_subscription(
 
 
 @app.delete("/users/{user_id}/subscriptions/{subscription_id}", tags=["Users", "Subscriptions"])
-async def delete_user_subscription(
+def delete_user_subscription(
     user_id: int,
     subscription_id: int,
     db: Session = Depends(get_db),
@@ -12825,7 +13003,7 @@ async def delete_user_subscription(
 
 
 @app.get("/rentals/check-subscription-coverage", tags=["Rentals", "Subscriptions"])
-async def check_subscription_coverage(
+def check_subscription_coverage(
     user_id: int = Query(...),
     item_type: str = Query(...),  # 'battery' or 'pue'
     item_reference: str = Query(...),  # battery capacity, 'all', pue_type, pue_item_id
@@ -12895,7 +13073,7 @@ async def check_subscription_coverage(
 # ============================================================================
 
 @app.get("/accounts/user/{user_id}", tags=["Accounts"])
-async def get_user_account(
+def get_user_account(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -12928,7 +13106,7 @@ async def get_user_account(
     }
 
 @app.post("/accounts/user/{user_id}/transaction", tags=["Accounts"])
-async def create_transaction(
+def create_transaction(
     user_id: int,
     transaction_type: str = Query(...),
     amount: float = Query(...),
@@ -13003,7 +13181,7 @@ async def create_transaction(
     }
 
 @app.get("/accounts/user/{user_id}/transactions", tags=["Accounts"])
-async def get_user_transactions(
+def get_user_transactions(
     user_id: int,
     limit: Optional[int] = Query(100),
     offset: Optional[int] = Query(0),
@@ -13047,7 +13225,7 @@ async def get_user_transactions(
     }
 
 @app.get("/accounts/user/{user_id}/deposit-holds", tags=["Accounts"])
-async def get_user_deposit_holds(
+def get_user_deposit_holds(
     user_id: int,
     status: Optional[str] = Query(None),
     db: Session = Depends(get_db),
@@ -13079,7 +13257,7 @@ async def get_user_deposit_holds(
 
 
 @app.get("/accounts/user/{user_id}/credit-summary", tags=["Accounts"])
-async def get_user_credit_summary(
+def get_user_credit_summary(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -13124,7 +13302,7 @@ async def get_user_credit_summary(
 
 
 @app.post("/accounts/user/{user_id}/deposit-holds/{hold_id}/return", tags=["Accounts"])
-async def return_deposit_hold(
+def return_deposit_hold(
     user_id: int,
     hold_id: int,
     db: Session = Depends(get_db),
@@ -13170,7 +13348,7 @@ async def return_deposit_hold(
 
 
 @app.get("/accounts/hub/{hub_id}/summary", tags=["Accounts"])
-async def get_hub_summary(
+def get_hub_summary(
     hub_id: int,
     time_period: Optional[str] = Query("all"),
     db: Session = Depends(get_db),
@@ -13226,7 +13404,7 @@ async def get_hub_summary(
     }
 
 @app.post("/accounts/{account_id}/reconcile", tags=["Accounts"])
-async def reconcile_user_account(
+def reconcile_user_account(
     account_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -13247,7 +13425,7 @@ async def reconcile_user_account(
     return result
 
 @app.get("/accounts/{account_id}/summary", tags=["Accounts"])
-async def get_user_account_summary(
+def get_user_account_summary(
     account_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -13262,7 +13440,7 @@ async def get_user_account_summary(
     return summary
 
 @app.post("/accounts/user/{user_id}/payment", tags=["Accounts"])
-async def record_payment(
+def record_payment(
     user_id: int,
     amount: float = Query(..., description="Payment amount"),
     payment_type: str = Query(..., description="Payment method: cash, mobile_money, bank_transfer, card"),
@@ -13347,7 +13525,7 @@ async def record_payment(
     }
 
 @app.post("/accounts/user/{user_id}/manual-adjustment", tags=["Accounts"])
-async def create_manual_adjustment(
+def create_manual_adjustment(
     user_id: int,
     amount: float = Query(..., description="Adjustment amount (positive increases balance, negative decreases)"),
     reason: str = Query(..., description="Reason for manual adjustment"),
@@ -13430,7 +13608,7 @@ async def create_manual_adjustment(
     }
 
 @app.get("/accounts/financial-report", tags=["Accounts"])
-async def get_financial_report(
+def get_financial_report(
     hub_id: Optional[int] = Query(None),
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
@@ -13455,7 +13633,7 @@ async def get_financial_report(
     return report
 
 @app.get("/accounts/users/in-debt", tags=["Accounts"])
-async def get_users_in_debt(
+def get_users_in_debt(
     hub_id: Optional[int] = Query(None),
     min_debt: Optional[float] = Query(0),
     db: Session = Depends(get_db),
@@ -13492,116 +13670,24 @@ async def get_users_in_debt(
 # NOTIFICATIONS
 # ============================================================================
 
-def check_and_create_notifications(hub_id: int, db: Session):
-    """
-    Check for conditions that warrant notifications and create them.
-    Called on user login.
-    """
-    # Get hub settings
-    hub_settings = db.query(HubSettings).filter(HubSettings.hub_id == hub_id).first()
-    if not hub_settings:
-        return
-
-    current_time = datetime.now(timezone.utc)
-
-    # 1. Check for overdue rentals
-    overdue_threshold_hours = hub_settings.overdue_notification_hours or 24
-    overdue_time = current_time - timedelta(hours=overdue_threshold_hours)
-
-    # Query rentals via battery to get hub_id
-    overdue_rentals = db.query(Rental).join(
-        BEPPPBattery, Rental.battery_id == BEPPPBattery.battery_id
-    ).filter(
-        BEPPPBattery.hub_id == hub_id,
-        Rental.status == 'active',
-        Rental.due_back < overdue_time
-    ).all()
-
-    for rental in overdue_rentals:
-        # Check if notification already exists for this rental
-        existing = db.query(Notification).filter(
-            Notification.hub_id == hub_id,
-            Notification.notification_type == 'overdue_rental',
-            Notification.link_id == str(rental.rentral_id)
-        ).first()
-
-        if not existing:
-            # Get user info
-            user = db.query(User).filter(User.user_id == rental.user_id).first()
-            user_name = user.username or user.Name or f"User {user.user_id}"
-
-            # Make due_back timezone-aware if it's naive
-            due_back_aware = rental.due_back.replace(tzinfo=timezone.utc) if rental.due_back.tzinfo is None else rental.due_back
-            hours_overdue = int((current_time - due_back_aware).total_seconds() / 3600)
-
-            notification = Notification(
-                hub_id=hub_id,
-                user_id=None,  # Hub-wide notification for admins
-                notification_type='overdue_rental',
-                title='Overdue Rental',
-                message=f'{user_name} has rental #{rental.rentral_id} overdue by {hours_overdue} hours.',
-                severity='warning',
-                link_type='rental',
-                link_id=str(rental.rentral_id)
-            )
-            db.add(notification)
-
-    # 2. Check for users exceeding debt threshold
-    debt_threshold = hub_settings.debt_notification_threshold or -100.0
-
-    # Get all users at this hub
-    users_at_hub = db.query(User).filter(User.hub_id == hub_id).all()
-    user_ids = [u.user_id for u in users_at_hub]
-
-    # Find accounts below threshold
-    accounts_below_threshold = db.query(UserAccount).filter(
-        UserAccount.user_id.in_(user_ids),
-        UserAccount.balance < debt_threshold
-    ).all()
-
-    for account in accounts_below_threshold:
-        # Check if notification already exists for this user's debt
-        existing = db.query(Notification).filter(
-            Notification.hub_id == hub_id,
-            Notification.notification_type == 'debt_threshold',
-            Notification.link_id == str(account.user_id),
-            Notification.is_read == False  # Only check unread notifications
-        ).first()
-
-        if not existing:
-            user = db.query(User).filter(User.user_id == account.user_id).first()
-            user_name = user.username or user.Name or f"User {user.user_id}"
-
-            # Get currency symbol
-            currency = hub_settings.default_currency or 'USD'
-            symbols = {'USD': '$', 'GBP': '£', 'EUR': '€', 'MWK': 'MK'}
-            symbol = symbols.get(currency, currency)
-
-            notification = Notification(
-                hub_id=hub_id,
-                user_id=None,  # Hub-wide notification for admins
-                notification_type='debt_threshold',
-                title='Debt Threshold Exceeded',
-                message=f'{user_name} has exceeded the debt threshold. Current balance: {symbol}{abs(account.balance):.2f}',
-                severity='error',
-                link_type='user',
-                link_id=str(account.user_id)
-            )
-            db.add(notification)
-
-    db.commit()
-
-
 @app.get("/notifications", tags=["Notifications"])
-async def get_notifications(
+def get_notifications(
     hub_id: Optional[int] = Query(None),
     unread_only: bool = Query(False),
     limit: int = Query(50),
     modified_after: Optional[str] = Query(None, description="ISO datetime - only return records updated after this time"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    page_size: Optional[int] = Query(None, ge=1, le=1000, description="Page size. Paged responses are ordered by most recently updated and include next_cursor"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return for each item"),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get notifications for the user's hub"""
+    """
+    Get notifications for the user's hub.
+    With page_size or cursor, limit is ignored, notifications are ordered by
+    most recently updated and the response includes next_cursor.
+    """
+    page = list_paging(page_size, cursor)
     if not hub_id:
         hub_id = current_user.get('hub_id')
 
@@ -13621,10 +13707,17 @@ async def get_notifications(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid modified_after format")
 
-    notifications = query.order_by(Notification.created_at.desc()).limit(limit).all()
+    next_cursor = None
+    if page:
+        notifications, next_cursor = split_page(
+            keyset_query(query, (Notification.updated_at, Notification.notification_id), cursor, page).all(),
+            page, key=lambda n: (n.updated_at, n.notification_id)
+        )
+    else:
+        notifications = query.order_by(Notification.created_at.desc()).limit(limit).all()
 
-    return {
-        "notifications": [
+    response = {
+        "notifications": project([
             {
                 "id": n.notification_id,
                 "type": n.notification_type,
@@ -13638,12 +13731,15 @@ async def get_notifications(
                 "updated_at": n.updated_at.isoformat() if n.updated_at else None
             }
             for n in notifications
-        ]
+        ], parse_fields(fields))
     }
+    if page:
+        response["next_cursor"] = next_cursor
+    return response
 
 
 @app.post("/notifications", tags=["Notifications"])
-async def create_notification(
+def create_notification(
     notification: dict,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -13718,25 +13814,32 @@ async def create_notification(
 
 
 @app.post("/notifications/check", tags=["Notifications"])
-async def trigger_notification_check(
+def trigger_notification_check(
     hub_id: Optional[int] = Query(None),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """Manually trigger notification check (called on login)"""
+    """
+    Run a full notification sweep for one hub now. Notifications are
+    otherwise created by the scheduled sweep (scripts/run_notification_sweep.py).
+    """
     if not hub_id:
         hub_id = current_user.get('hub_id')
 
     if not hub_id:
         raise HTTPException(status_code=400, detail="Hub ID required")
 
-    check_and_create_notifications(hub_id, db)
+    created = run_notification_sweep(db, hub_id=hub_id)
+    db.commit()
 
-    return {"message": "Notification check completed"}
+    return {
+        "message": "Notification check completed",
+        "created": {"overdue_rental": created["overdue_rental"], "debt_threshold": created["debt_threshold"]}
+    }
 
 
 @app.put("/notifications/{notification_id}/read", tags=["Notifications"])
-async def mark_notification_as_read(
+def mark_notification_as_read(
     notification_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -13756,11 +13859,15 @@ async def mark_notification_as_read(
     notification.is_read = True
     db.commit()
 
+    if notification.link_type == 'battery':
+        # The battery may need a fresh notification if the error persists
+        battery_error_tracker.invalidate(notification.link_id)
+
     return {"message": "Notification marked as read"}
 
 
 @app.put("/notifications/mark-all-read", tags=["Notifications"])
-async def mark_all_notifications_as_read(
+def mark_all_notifications_as_read(
     hub_id: Optional[int] = Query(None),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -13782,6 +13889,7 @@ async def mark_all_notifications_as_read(
     ).update({"is_read": True})
 
     db.commit()
+    battery_error_tracker.invalidate()
 
     return {"message": "All notifications marked as read"}
 
@@ -13791,7 +13899,7 @@ async def mark_all_notifications_as_read(
 # ============================================================================
 
 @app.post("/job-cards/", tags=["Job Cards"])
-async def create_job_card(
+def create_job_card(
     card: JobCardCreate,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -13856,19 +13964,28 @@ async def create_job_card(
 
 
 @app.get("/job-cards/", tags=["Job Cards"])
-async def list_job_cards(
+def list_job_cards(
     hub_id: Optional[int] = Query(None, description="Filter by hub ID"),
     status: Optional[str] = Query(None, description="Filter by status"),
     assigned_to: Optional[int] = Query(None, description="Filter by assigned user"),
     linked_entity_type: Optional[str] = Query(None, description="Filter by entity type"),
     linked_entity_id: Optional[str] = Query(None, description="Filter by entity ID"),
     modified_after: Optional[str] = Query(None, description="ISO datetime - only return records updated after this time"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    page_size: Optional[int] = Query(None, ge=1, le=1000, description="Page size. Paged responses are ordered by most recently updated and include next_cursor"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return for each item"),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """List job cards with optional filters"""
+    """
+    List job cards with optional filters.
+    With page_size or cursor, cards are ordered by most recently updated
+    (instead of board order) and the response includes next_cursor.
+    """
     from models import JobCard
 
+    page = list_paging(page_size, cursor)
+
     # Build query
     query = db.query(JobCard)
 
@@ -13903,10 +14020,17 @@ async def list_job_cards(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid modified_after format")
 
-    # Order by sort_order, then created_at
-    query = query.order_by(JobCard.sort_order, JobCard.created_at.desc())
-
-    cards = query.all()
+    next_cursor = None
+    if page:
+        # total stays the full filtered count, not the length of this page
+        total = query.count()
+        cards, next_cursor = split_page(
+            keyset_query(query, (JobCard.updated_at, JobCard.card_id), cursor, page).all(),
+            page, key=lambda card: (card.updated_at, card.card_id)
+        )
+    else:
+        # Order by sort_order, then created_at
+        cards = query.order_by(JobCard.sort_order, JobCard.created_at.desc()).all()
 
     # Format response
     result = []
@@ -13950,11 +14074,14 @@ async def list_job_cards(
 
         result.append(card_dict)
 
-    return {"cards": result, "total": len(result)}
+    response = {"cards": project(result, parse_fields(fields)), "total": total if page else len(result)}
+    if page:
+        response["next_cursor"] = next_cursor
+    return response
 
 
 @app.get("/job-cards/admin-users", tags=["Job Cards"])
-async def get_admin_users_for_assignment(
+def get_admin_users_for_assignment(
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
@@ -13979,7 +14106,7 @@ async def get_admin_users_for_assignment(
 
 
 @app.get("/job-cards/{card_id}", tags=["Job Cards"])
-async def get_job_card(
+def get_job_card(
     card_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -14068,7 +14195,7 @@ async def get_job_card(
 
 
 @app.put("/job-cards/{card_id}", tags=["Job Cards"])
-async def update_job_card(
+def update_job_card(
     card_id: int,
     card_update: JobCardUpdate,
     db: Session = Depends(get_db),
@@ -14175,7 +14302,7 @@ async def update_job_card(
 
 
 @app.delete("/job-cards/{card_id}", tags=["Job Cards"])
-async def delete_job_card(
+def delete_job_card(
     card_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -14199,7 +14326,7 @@ async def delete_job_card(
 
 
 @app.post("/job-cards/{card_id}/activities", tags=["Job Cards"])
-async def add_job_card_activity(
+def add_job_card_activity(
     card_id: int,
     activity: JobCardActivityCreate,
     db: Session = Depends(get_db),
@@ -14236,7 +14363,7 @@ async def add_job_card_activity(
 
 
 @app.put("/job-cards/reorder", tags=["Job Cards"])
-async def reorder_job_cards(
+def reorder_job_cards(
     updates: List[JobCardReorder],
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -14290,14 +14417,18 @@ async def reorder_job_cards(
 # ============================================================================
 
 @app.get("/search", tags=["Search"])
-async def global_search(
+def global_search(
     q: str = Query(..., min_length=2, description="Search query (min 2 characters)"),
     hub_id: Optional[int] = Query(None, description="Limit results to this hub"),
     limit: int = Query(5, ge=1, le=20),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """Search across users, batteries, battery rentals, and PUE rentals."""
+    """
+    Search across hubs, users, batteries, battery rentals, and PUE rentals.
+    Matches are substrings (trigram-indexed), closest matches first, at most
+    `limit` per category.
+    """
     role = current_user.get('role')
     user_hub_id = current_user.get('hub_id')
 
@@ -14305,19 +14436,11 @@ async def global_search(
     if role in ('hub_admin', 'user'):
         hub_id = user_hub_id
 
-    search = f"%{q.lower()}%"
     results = {"hubs": [], "users": [], "batteries": [], "battery_rentals": [], "pue_rentals": []}
 
     # --- Hubs (admin/superadmin/data_admin only) ---
     if role in ('superadmin', 'admin', 'data_admin'):
-        hq = db.query(SolarHub).filter(
-            or_(
-                func.lower(SolarHub.what_three_word_location).like(search),
-                func.lower(SolarHub.country).like(search),
-                func.lower(func.cast(SolarHub.hub_id, String)).like(search),
-            )
-        )
-        for h in hq.limit(limit).all():
+        for h in search_hubs(db, q, limit):
             results["hubs"].append({
                 "id": h.hub_id,
                 "label": h.what_three_word_location or f"Hub {h.hub_id}",
@@ -14326,18 +14449,7 @@ async def global_search(
             })
 
     # --- Users ---
-    uq = db.query(User).filter(
-        or_(
-            func.lower(User.Name).like(search),
-            func.lower(User.username).like(search),
-            func.lower(User.mobile_number).like(search),
-            func.lower(User.short_id).like(search),
-            func.lower(User.users_identification_document_number).like(search),
-        )
-    )
-    if hub_id:
-        uq = uq.filter(User.hub_id == hub_id)
-    for u in uq.limit(limit).all():
+    for u in search_users(db, q, hub_id, limit):
         results["users"].append({
             "id": u.user_id,
             "label": u.Name or u.username or f"User {u.user_id}",
@@ -14347,15 +14459,7 @@ async def global_search(
         })
 
     # --- Batteries ---
-    bq = db.query(BEPPPBattery).filter(
-        or_(
-            func.lower(func.cast(BEPPPBattery.battery_id, String)).like(search),
-            func.lower(BEPPPBattery.short_id).like(search),
-        )
-    )
-    if hub_id:
-        bq = bq.filter(BEPPPBattery.hub_id == hub_id)
-    for b in bq.limit(limit).all():
+    for b in search_batteries(db, q, hub_id, limit):
         results["batteries"].append({
             "id": b.battery_id,
             "label": f"Battery {b.battery_id}",
@@ -14366,16 +14470,7 @@ async def global_search(
 
     # --- Battery Rentals + PUE Rentals (hub_admin and above only) ---
     if role != 'user':
-        brq = db.query(BatteryRental, User).join(User, BatteryRental.user_id == User.user_id).filter(
-            or_(
-                func.lower(func.cast(BatteryRental.rental_id, String)).like(search),
-                func.lower(User.Name).like(search),
-                func.lower(User.username).like(search),
-            )
-        )
-        if hub_id:
-            brq = brq.filter(BatteryRental.hub_id == hub_id)
-        for rental, user in brq.order_by(BatteryRental.start_date.desc()).limit(limit).all():
+        for rental, user in search_battery_rentals(db, q, hub_id, limit):
             results["battery_rentals"].append({
                 "id": rental.rental_id,
                 "label": f"Rental #{rental.rental_id}",
@@ -14384,20 +14479,7 @@ async def global_search(
                 "route": {"name": "battery-rental-detail", "params": {"id": rental.rental_id}}
             })
 
-        prq = db.query(PUERental, User, ProductiveUseEquipment)\
-            .join(User, PUERental.user_id == User.user_id)\
-            .join(ProductiveUseEquipment, PUERental.pue_id == ProductiveUseEquipment.pue_id)\
-            .filter(
-                or_(
-                    func.lower(func.cast(PUERental.pue_rental_id, String)).like(search),
-                    func.lower(User.Name).like(search),
-                    func.lower(User.username).like(search),
-                    func.lower(ProductiveUseEquipment.name).like(search),
-                )
-            )
-        if hub_id:
-            prq = prq.filter(ProductiveUseEquipment.hub_id == hub_id)
-        for rental, user, pue in prq.order_by(PUERental.timestamp_taken.desc()).limit(limit).all():
+        for rental, user, pue in search_pue_rentals(db, q, hub_id, limit):
             results["pue_rentals"].append({
                 "id": rental.pue_rental_id,
                 "label": f"PUE Rental #{rental.pue_rental_id}",
@@ -14443,6 +14525,69 @@ async def global_search(
     return {"query": q, "total": total, "results": results}
 
 
+# ============================================================================
+# OFFLINE SYNC
+# ============================================================================
+
+@app.get("/sync/changes", tags=["Sync"])
+def sync_changes(
+    since: Optional[str] = Query(None, description="next_cursor from the previous response; omit to start a sync"),
+    hub_id: Optional[int] = Query(None, description="Only this hub (default: every hub you can access)"),
+    entities: Optional[str] = Query(None, description="Comma-separated entity types: " + ", ".join(SYNC_ENTITIES)),
+    limit: Optional[int] = Query(None, ge=1, le=5000, description="Max changes in this response"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Upserts and tombstones for users, batteries, PUE items, battery rentals,
+    PUE rentals and notifications, oldest first, in a single response.
+
+    - Without `since` (or with a cursor older than the change_log retention
+      window) the response is `{"reset": true, "changes": []}` with a fresh
+      `next_cursor`: re-fetch the entity endpoints in full, then keep calling
+      with `since=next_cursor`.
+    - Call again straight away while `has_more` is true.
+    - Upserts carry the row as it is now; deletes carry only the id.
+    """
+    role = current_user.get('role')
+    if hub_id is not None:
+        if not user_has_hub_access(current_user, hub_id):
+            raise HTTPException(status_code=403, detail="Access denied to this hub")
+        hub_ids = [hub_id]
+    elif role == UserRole.SUPERADMIN:
+        hub_ids = None
+    elif role == UserRole.DATA_ADMIN:
+        hub_ids = current_user.get('accessible_hub_ids', [])
+    else:
+        hub_ids = [current_user.get('hub_id')]
+
+    selected = parse_fields(entities) or set(SYNC_ENTITIES)
+    unknown = selected - set(SYNC_ENTITIES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown entities: {', '.join(sorted(unknown))}")
+    if role == UserRole.DATA_ADMIN:
+        # Data admins cannot access user information
+        selected.discard('user')
+
+    if since:
+        try:
+            txid, change_id, issued_at = parse_sync_cursor(since)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not cursor_expired(issued_at, SYNC_CHANGE_LOG_RETENTION_DAYS):
+            result = changes_since(
+                db, txid, change_id,
+                limit=limit or SYNC_CHANGES_PAGE_SIZE,
+                hub_ids=hub_ids,
+                entities=selected,
+                serializers={'user': serialize_user},
+            )
+            result["reset"] = False
+            return result
+
+    return {"changes": [], "next_cursor": head_cursor(db), "has_more": False, "reset": True}
+
+
 # ============================================================================
 # RUN THE APP
 # ============================================================================
@@ -0,0 +1,215 @@
+"""
+Webhook Audit Log Writer
+Buffers webhook_logs entries in memory and writes them in batches from a
+background thread, so logging a webhook or login costs the request handler
+nothing but a queue put.
+
+Retention is handled by the same thread: every `prune_interval_seconds` it
+deletes everything older than the newest `retention` entries, instead of
+counting and pruning the table after every insert.
+
+If a batch insert fails, its entries are retried one at a time; an entry
+whose battery_id has no bepppbattery row (a request for an unknown battery)
+is written without it rather than dropped.
+"""
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, text
+
+from database import SessionLocal
+from models import WebhookLog
+
+logger = logging.getLogger('webhook')
+
+AUDIT_LOG_COLUMNS = (
+    "battery_id", "endpoint", "method", "request_headers", "request_body",
+    "response_status", "response_body", "error_message", "processing_time_ms", "created_at",
+)
+
+
+class AuditLogWriter:
+    """
+    Batched writer for webhook_logs.
+
+    Entries are flushed when `flush_rows` are waiting or `flush_interval_ms`
+    after the first one arrived. If the writer is not running (scripts,
+    tests) or the buffer is full, write() falls back to an immediate insert.
+    Each uvicorn worker owns its own writer; stop() drains it on shutdown.
+    """
+
+    def __init__(self, retention: int = 100, flush_rows: int = 500, flush_interval_ms: int = 1000,
+                 prune_interval_seconds: int = 60, max_size: int = 10000):
+        self.retention = retention
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = max(1, flush_interval_ms) / 1000.0
+        self.prune_interval = max(1, prune_interval_seconds)
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max_size)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_prune = 0.0
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "entries_buffered": 0,
+            "entries_written_directly": 0,
+            "entries_flushed": 0,
+            "entries_dropped": 0,
+            "flushes": 0,
+            "failed_flushes": 0,
+            "prunes": 0,
+            "rows_pruned": 0,
+            "last_flush_at": None,
+            "last_prune_at": None,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the background writer (no-op if already running)"""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the writer after flushing everything still buffered"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def write(self, **values):
+        """Record one webhook_logs entry (see AUDIT_LOG_COLUMNS)"""
+        entry = {column: values.get(column) for column in AUDIT_LOG_COLUMNS}
+        if entry["created_at"] is None:
+            entry["created_at"] = datetime.now(timezone.utc)
+
+        if self.running:
+            try:
+                self._queue.put_nowait(entry)
+                with self._stats_lock:
+                    self._stats["entries_buffered"] += 1
+                return
+            except queue.Full:
+                pass
+
+        with self._stats_lock:
+            self._stats["entries_written_directly"] += 1
+        self._insert([entry])
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["buffer_depth"] = self._queue.qsize()
+        stats["retention"] = self.retention
+        stats["flush_interval_ms"] = int(self.flush_interval * 1000)
+        stats["prune_interval_seconds"] = self.prune_interval
+        stats["running"] = self.running
+        return stats
+
+    def prune(self) -> int:
+        """Delete everything but the newest `retention` entries. Returns rows deleted."""
+        db = SessionLocal()
+        try:
+            deleted = db.execute(text("""
+                DELETE FROM webhook_logs
+                WHERE log_id <= (
+                    SELECT log_id FROM webhook_logs
+                    ORDER BY log_id DESC
+                    OFFSET :retention LIMIT 1
+                )
+            """), {"retention": self.retention}).rowcount
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to prune webhook logs: {e}")
+            deleted = 0
+        finally:
+            db.close()
+
+        with self._stats_lock:
+            self._stats["prunes"] += 1
+            self._stats["rows_pruned"] += deleted
+            self._stats["last_prune_at"] = datetime.now(timezone.utc).isoformat()
+        return deleted
+
+    def _insert(self, entries: List[Dict]) -> int:
+        """Write entries, falling back to one at a time if the batch fails. Returns entries written."""
+        db = SessionLocal()
+        dropped = 0
+        try:
+            try:
+                db.execute(insert(WebhookLog), entries)
+                db.commit()
+            except Exception as e:
+                # Don't let logging failures surface anywhere else, and don't let one
+                # bad entry (e.g. a battery_id with no bepppbattery row) drop the batch
+                db.rollback()
+                logger.error(f"Webhook log batch of {len(entries)} entries failed, retrying one by one: {e}")
+                with self._stats_lock:
+                    self._stats["failed_flushes"] += 1
+                for entry in entries:
+                    if not self._insert_one(db, entry):
+                        dropped += 1
+        finally:
+            db.close()
+
+        if dropped:
+            with self._stats_lock:
+                self._stats["entries_dropped"] += dropped
+        return len(entries) - dropped
+
+    def _insert_one(self, db, entry: Dict) -> bool:
+        """Write one entry, without its battery_id if that is what the database rejects"""
+        attempts = [entry]
+        if entry.get("battery_id") is not None:
+            attempts.append({**entry, "battery_id": None})
+        for attempt in attempts:
+            try:
+                db.execute(insert(WebhookLog), [attempt])
+                db.commit()
+                return True
+            except Exception as e:
+                db.rollback()
+                error = e
+        logger.error(f"Dropped webhook log entry for {entry.get('endpoint')}: {error}")
+        return False
+
+    def _next_batch(self) -> List[Dict]:
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.flush_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                written = self._insert(batch)
+                with self._stats_lock:
+                    self._stats["flushes"] += 1
+                    self._stats["entries_flushed"] += written
+                    self._stats["last_flush_at"] = datetime.now(timezone.utc).isoformat()
+
+            if time.monotonic() - self._last_prune >= self.prune_interval:
+                self._last_prune = time.monotonic()
+                self.prune()
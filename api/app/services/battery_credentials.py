@@ -0,0 +1,92 @@
+"""
+Battery Credential Cache
+Keeps battery secrets in memory for a short TTL so /auth/battery-login and
+/auth/battery-refresh don't hit the database on every device call.
+
+Entries are dropped when a secret is changed or a battery is deleted
+(invalidate()), and expire after `ttl_seconds` anyway so other workers pick
+up changes made elsewhere. Unknown batteries are not cached, so a newly
+registered battery can log in immediately.
+"""
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from models import BEPPPBattery
+
+# lookup() result for a battery that doesn't exist
+NOT_FOUND = (False, None)
+
+
+class BatteryCredentialCache:
+    """TTL + LRU cache of battery_id -> battery_secret for one process"""
+
+    def __init__(self, ttl_seconds: int = 300, max_entries: int = 10000):
+        self.ttl = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, Tuple[float, Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def lookup(self, db, battery_id) -> Tuple[bool, Optional[str]]:
+        """
+        Returns (exists, battery_secret). battery_secret is None when the
+        battery exists but isn't configured for authentication.
+        """
+        key = str(battery_id)
+        now = time.monotonic()
+        if self.ttl > 0:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return True, entry[1]
+                self._stats["misses"] += 1
+
+        row = db.query(BEPPPBattery.battery_secret).filter(BEPPPBattery.battery_id == key).first()
+        if row is None:
+            return NOT_FOUND
+
+        secret = row.battery_secret or None
+        if self.ttl > 0:
+            with self._lock:
+                self._entries[key] = (now + self.ttl, secret)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return True, secret
+
+    def verify(self, db, battery_id, battery_secret: str) -> Tuple[bool, Optional[str]]:
+        """
+        Check a login attempt. Returns (ok, error) where error is one of
+        "Battery not found", "Battery not configured for authentication" or
+        "Invalid battery secret".
+        """
+        exists, secret = self.lookup(db, battery_id)
+        if not exists:
+            return False, "Battery not found"
+        if not secret:
+            return False, "Battery not configured for authentication"
+        if not hmac.compare_digest(secret.encode(), (battery_secret or "").encode()):
+            return False, "Invalid battery secret"
+        return True, None
+
+    def invalidate(self, battery_id=None):
+        """Forget one battery, or everything when battery_id is None"""
+        with self._lock:
+            if battery_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(battery_id), None)
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        stats["ttl_seconds"] = self.ttl
+        stats["max_entries"] = self.max_entries
+        return stats
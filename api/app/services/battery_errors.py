@@ -0,0 +1,273 @@
+"""
+Battery Error Notifications
+Decodes the error string batteries send with their telemetry (`err`, e.g.
+"TG") and raises one hub notification per battery and error code.
+
+No-flooding rule: a battery_error_<code> notification is only created when
+the battery has no UNREAD notification of that type, so an error that keeps
+being reported produces one notification, and a new one only after the
+previous one was read.
+
+BatteryErrorTracker keeps, per battery, the error codes known to have an
+unread notification. Readings whose codes are all known cost nothing; new
+codes are queued and a background thread inserts every queued notification
+from a flush window with one INSERT ... SELECT ... WHERE NOT EXISTS, which
+still applies the rule above against the database (other workers, cold
+start). Marking notifications read calls invalidate(); entries also expire
+after `ttl_seconds` so reads handled by another worker are picked up.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from database import SessionLocal
+
+logger = logging.getLogger('webhook')
+
+# Error code mapping for battery diagnostics
+BATTERY_ERROR_CODES = {
+    'R': {'name': 'rtcError', 'description': 'Real-time clock error', 'severity': 'warning'},
+    'C': {'name': 'powerSensorChargeError', 'description': 'Power sensor charge error', 'severity': 'error'},
+    'U': {'name': 'powerSensorUsbError', 'description': 'Power sensor USB error', 'severity': 'warning'},
+    'T': {'name': 'tempSensorError', 'description': 'Temperature sensor error', 'severity': 'warning'},
+    'B': {'name': 'batteryMonitorError', 'description': 'Battery monitor error', 'severity': 'error'},
+    'G': {'name': 'gpsError', 'description': 'GPS error', 'severity': 'warning'},
+    'S': {'name': 'sdError', 'description': 'SD card error', 'severity': 'warning'},
+    'L': {'name': 'lteError', 'description': 'LTE connection error', 'severity': 'error'},
+    'D': {'name': 'displayError', 'description': 'Display error', 'severity': 'info'},
+}
+
+
+def decode_error_string(error_string: str) -> list[dict]:
+    """
+    Decode battery error string into list of errors
+
+    Args:
+        error_string: String containing error codes (e.g., "TG", "RCB")
+
+    Returns:
+        List of error dictionaries with code, name, description, and severity
+        Unknown codes are still included with a generic description
+    """
+    errors = []
+    for char in error_string.strip().upper():
+        if char in BATTERY_ERROR_CODES:
+            error_info = BATTERY_ERROR_CODES[char].copy()
+            error_info['code'] = char
+            errors.append(error_info)
+        else:
+            # Handle unknown error codes - still record them
+            errors.append({
+                'code': char,
+                'name': f'unknownError_{char}',
+                'description': f'Unknown error code: {char}',
+                'severity': 'warning'
+            })
+    return errors
+
+
+def error_notification(battery_id: str, battery_name: str, hub_id: int, error: Dict) -> Dict:
+    """notifications row for one decoded error"""
+    return {
+        "hub_id": hub_id,
+        "notification_type": f"battery_error_{error['code']}",
+        "title": f"{battery_name}: {error['description']}",
+        "message": (
+            f"Error code '{error['code']}' detected on {battery_name}. {error['description']}. "
+            f"Please check the battery error log for more details."
+        ),
+        "severity": error['severity'],
+        "link_id": str(battery_id),
+    }
+
+
+def insert_error_notifications(db, notifications: List[Dict]) -> int:
+    """
+    Insert the notifications that have no unread duplicate (same hub,
+    battery and type) in one statement. Returns rows inserted; does not commit.
+    """
+    if not notifications:
+        return 0
+    return db.execute(text("""
+        INSERT INTO notifications
+            (hub_id, user_id, notification_type, title, message, severity, is_read, link_type, link_id)
+        SELECT v.hub_id, NULL, v.notification_type, v.title, v.message, v.severity, false, 'battery', v.link_id
+        FROM json_to_recordset(CAST(:rows AS json)) AS v(
+            hub_id bigint, notification_type text, title text, message text, severity text, link_id text
+        )
+        WHERE NOT EXISTS (
+            SELECT 1 FROM notifications n
+            WHERE n.hub_id = v.hub_id
+              AND n.link_type = 'battery'
+              AND n.link_id = v.link_id
+              AND n.notification_type = v.notification_type
+              AND n.is_read = false
+        )
+    """), {"rows": json.dumps(notifications)}).rowcount
+
+
+class BatteryErrorTracker:
+    """
+    Per-worker record of which battery error codes already have an unread
+    notification, plus the batched writer for new ones.
+
+    If the writer is not running (scripts, tests) or the buffer is full,
+    report() inserts immediately. stop() drains the buffer on shutdown.
+    """
+
+    def __init__(self, ttl_seconds: int = 300, flush_interval_ms: int = 1000,
+                 max_entries: int = 100000, max_size: int = 10000):
+        self.ttl = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.flush_interval = max(1, flush_interval_ms) / 1000.0
+        # battery_id -> (expires_at, hub_id, codes with an unread notification)
+        self._known: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max_size)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            "reports": 0,
+            "reports_unchanged": 0,
+            "notifications_queued": 0,
+            "notifications_written_directly": 0,
+            "notifications_created": 0,
+            "flushes": 0,
+            "flush_failures": 0,
+            "invalidations": 0,
+            "last_flush_at": None,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the background writer (no-op if already running)"""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="battery-error-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the writer after flushing everything still buffered"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def report(self, battery_id: str, hub_id: int, error_string: Optional[str], battery_name: Optional[str] = None):
+        """Record the error codes of a battery's latest reading"""
+        errors = {error['code']: error for error in decode_error_string(error_string or "")}
+        if not errors:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            self._stats["reports"] += 1
+            entry = self._known.get(battery_id)
+            known = entry[2] if entry and entry[0] > now and entry[1] == hub_id else frozenset()
+            new_codes = set(errors) - known
+            if not new_codes:
+                self._stats["reports_unchanged"] += 1
+                return
+            # Assume the new codes are notified; a failed flush forgets the battery
+            self._known.pop(battery_id, None)
+            self._known[battery_id] = (now + self.ttl, hub_id, known | new_codes)
+            while len(self._known) > self.max_entries:
+                self._known.pop(next(iter(self._known)))
+
+        name = battery_name or f"Battery #{battery_id}"
+        notifications = [
+            error_notification(battery_id, name, hub_id, errors[code])
+            for code in sorted(new_codes)
+        ]
+
+        if self.running:
+            try:
+                for notification in notifications:
+                    self._queue.put_nowait(notification)
+                with self._lock:
+                    self._stats["notifications_queued"] += len(notifications)
+                return
+            except queue.Full:
+                pass
+
+        with self._lock:
+            self._stats["notifications_written_directly"] += len(notifications)
+        self._insert(notifications)
+
+    def invalidate(self, battery_id: Optional[str] = None):
+        """Forget one battery, or every battery when battery_id is None"""
+        with self._lock:
+            if battery_id is None:
+                self._known.clear()
+            else:
+                self._known.pop(str(battery_id), None)
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["batteries_tracked"] = len(self._known)
+        stats["buffer_depth"] = self._queue.qsize()
+        stats["ttl_seconds"] = self.ttl
+        stats["flush_interval_ms"] = int(self.flush_interval * 1000)
+        stats["running"] = self.running
+        return stats
+
+    def _insert(self, notifications: List[Dict]) -> bool:
+        # One row per (hub, battery, type) per statement
+        unique = list({
+            (n["hub_id"], n["link_id"], n["notification_type"]): n for n in notifications
+        }.values())
+        db = SessionLocal()
+        try:
+            created = insert_error_notifications(db, unique)
+            db.commit()
+            with self._lock:
+                self._stats["notifications_created"] += created
+            return True
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to create {len(unique)} battery error notifications: {e}")
+            with self._lock:
+                self._stats["flush_failures"] += 1
+                for notification in unique:
+                    self._known.pop(notification["link_id"], None)
+            return False
+        finally:
+            db.close()
+
+    def _next_batch(self) -> List[Dict]:
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch and self._insert(batch):
+                with self._lock:
+                    self._stats["flushes"] += 1
+                    self._stats["last_flush_at"] = datetime.now(timezone.utc).isoformat()
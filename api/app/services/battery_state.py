@@ -0,0 +1,129 @@
+"""
+Battery Latest State
+Keeps battery_latest_state (one row per battery) up to date as telemetry is
+ingested, so "current state" reads (/data/latest, fleet views, return-cost
+kWh estimates) are a primary-key lookup instead of a newest-first scan of
+livedata per battery.
+
+Each row holds the newest reading by timestamp (key metrics, error string
+and the full reading as JSON), plus the last known SoC and the last GPS fix,
+which survive readings that don't carry them. Upserts only move a column
+group forward in time, so late uploads of old SD-card readings never
+overwrite newer state. Rows without a timestamp are ignored.
+"""
+import json
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from models import BatteryLatestState
+
+UPSERT_SQL = text("""
+    INSERT INTO battery_latest_state AS s (
+        battery_id, livedata_id, reading_at, voltage, current_amps, power_watts,
+        amp_hours_consumed, err, reading,
+        last_soc, last_soc_at, latitude, longitude, gps_at, updated_at
+    )
+    VALUES (
+        :battery_id, :livedata_id, :reading_at, :voltage, :current_amps, :power_watts,
+        :amp_hours_consumed, :err, :reading,
+        :last_soc, :last_soc_at, :latitude, :longitude, :gps_at, now()
+    )
+    ON CONFLICT (battery_id) DO UPDATE SET
+        livedata_id = CASE WHEN s.reading_at IS NULL OR EXCLUDED.reading_at >= s.reading_at THEN EXCLUDED.livedata_id ELSE s.livedata_id END,
+        voltage = CASE WHEN s.reading_at IS NULL OR EXCLUDED.reading_at >= s.reading_at THEN EXCLUDED.voltage ELSE s.voltage END,
+        current_amps = CASE WHEN s.reading_at IS NULL OR EXCLUDED.reading_at >= s.reading_at THEN EXCLUDED.current_amps ELSE s.current_amps END,
+        power_watts = CASE WHEN s.reading_at IS NULL OR EXCLUDED.reading_at >= s.reading_at THEN EXCLUDED.power_watts ELSE s.power_watts END,
+        amp_hours_consumed = CASE WHEN s.reading_at IS NULL OR EXCLUDED.reading_at >= s.reading_at THEN EXCLUDED.amp_hours_consumed ELSE s.amp_hours_consumed END,
+        err = CASE WHEN s.reading_at IS NULL OR EXCLUDED.reading_at >= s.reading_at THEN EXCLUDED.err ELSE s.err END,
+        reading = CASE WHEN s.reading_at IS NULL OR EXCLUDED.reading_at >= s.reading_at THEN EXCLUDED.reading ELSE s.reading END,
+        reading_at = GREATEST(s.reading_at, EXCLUDED.reading_at),
+        last_soc = CASE WHEN EXCLUDED.last_soc_at IS NOT NULL AND (s.last_soc_at IS NULL OR EXCLUDED.last_soc_at >= s.last_soc_at)
+                        THEN EXCLUDED.last_soc ELSE s.last_soc END,
+        last_soc_at = GREATEST(s.last_soc_at, EXCLUDED.last_soc_at),
+        latitude = CASE WHEN EXCLUDED.gps_at IS NOT NULL AND (s.gps_at IS NULL OR EXCLUDED.gps_at >= s.gps_at)
+                        THEN EXCLUDED.latitude ELSE s.latitude END,
+        longitude = CASE WHEN EXCLUDED.gps_at IS NOT NULL AND (s.gps_at IS NULL OR EXCLUDED.gps_at >= s.gps_at)
+                         THEN EXCLUDED.longitude ELSE s.longitude END,
+        gps_at = GREATEST(s.gps_at, EXCLUDED.gps_at),
+        updated_at = now()
+""")
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _newest(rows: List[Dict], predicate=lambda row: True) -> Optional[Dict]:
+    candidates = [row for row in rows if row.get('timestamp') is not None and predicate(row)]
+    return max(candidates, key=lambda row: row['timestamp']) if candidates else None
+
+
+def _state_params(battery_id: str, rows: List[Dict]) -> Optional[Dict]:
+    latest = _newest(rows)
+    if latest is None:
+        return None
+    soc = _newest(rows, lambda row: row.get('state_of_charge') is not None)
+    gps = _newest(rows, lambda row: row.get('latitude') is not None and row.get('longitude') is not None)
+    return {
+        "battery_id": battery_id,
+        "livedata_id": latest.get('id'),
+        "reading_at": latest['timestamp'],
+        "voltage": latest.get('voltage'),
+        "current_amps": latest.get('current_amps'),
+        "power_watts": latest.get('power_watts'),
+        "amp_hours_consumed": latest.get('amp_hours_consumed'),
+        "err": latest.get('err'),
+        "reading": json.dumps(latest, default=_json_default),
+        "last_soc": soc['state_of_charge'] if soc else None,
+        "last_soc_at": soc['timestamp'] if soc else None,
+        "latitude": gps['latitude'] if gps else None,
+        "longitude": gps['longitude'] if gps else None,
+        "gps_at": gps['timestamp'] if gps else None,
+    }
+
+
+def upsert_latest_state(db: Session, rows: Iterable[Dict]) -> int:
+    """
+    Fold newly ingested LiveData rows (live_data_row() dicts) into
+    battery_latest_state: one upsert per battery present. Does not commit.
+    Batteries are upserted in id order so concurrent batches can't deadlock.
+    """
+    by_battery: Dict[str, List[Dict]] = {}
+    for row in rows:
+        if row.get('battery_id'):
+            by_battery.setdefault(row['battery_id'], []).append(row)
+
+    params = [
+        state for state in (_state_params(battery_id, by_battery[battery_id]) for battery_id in sorted(by_battery))
+        if state is not None
+    ]
+    if params:
+        db.execute(UPSERT_SQL, params)
+    return len(params)
+
+
+def latest_state(db: Session, battery_id: str) -> Optional[BatteryLatestState]:
+    return db.query(BatteryLatestState).filter(BatteryLatestState.battery_id == battery_id).first()
+
+
+def latest_reading(state: Optional[BatteryLatestState]) -> Optional[Dict]:
+    """The full newest LiveData reading stored with the state, as a dict"""
+    if state is None or not state.reading:
+        return None
+    return json.loads(state.reading)
+
+
+def serialize_state(state: BatteryLatestState, include_reading: bool = False) -> Dict:
+    data = {
+        c.name: (getattr(state, c.name).isoformat() if isinstance(getattr(state, c.name), datetime) else getattr(state, c.name))
+        for c in state.__table__.columns
+        if c.name != 'reading'
+    }
+    if include_reading:
+        data["reading"] = latest_reading(state)
+    return data
@@ -0,0 +1,125 @@
+"""
+Hub Summary
+Battery, PUE and active rental counts for /analytics/hub-summary, for any
+number of hubs in one grouped query instead of three queries per hub.
+
+Results are cached per API worker for `ttl_seconds`, keyed by the set of
+hubs requested, so the dashboard landing page doesn't recount on every
+load. Writes don't invalidate it (other workers couldn't see that anyway):
+counts can lag by up to the TTL; 0 disables the cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+HUB_SUMMARY_SQL = """
+    WITH hubs AS (
+        SELECT hub_id, what_three_word_location, country, solar_capacity_kw
+        FROM solarhub
+        {hub_filter}
+    ),
+    battery_counts AS (
+        SELECT b.hub_id, COALESCE(b.status, 'null') AS status, count(*) AS n
+        FROM bepppbattery b
+        JOIN hubs h ON h.hub_id = b.hub_id
+        GROUP BY b.hub_id, COALESCE(b.status, 'null')
+    ),
+    battery_stats AS (
+        SELECT hub_id, json_object_agg(status, n) AS by_status, sum(n)::bigint AS total
+        FROM battery_counts
+        GROUP BY hub_id
+    ),
+    pue_counts AS (
+        SELECT p.hub_id, count(*) AS n
+        FROM productiveuseequipment p
+        JOIN hubs h ON h.hub_id = p.hub_id
+        WHERE p.is_active
+        GROUP BY p.hub_id
+    ),
+    rental_counts AS (
+        SELECT b.hub_id, count(*) AS n
+        FROM rental r
+        JOIN bepppbattery b ON b.battery_id = r.battery_id
+        JOIN hubs h ON h.hub_id = b.hub_id
+        WHERE r.is_active AND r.battery_returned_date IS NULL
+        GROUP BY b.hub_id
+    )
+    SELECT h.hub_id, h.what_three_word_location, h.country, h.solar_capacity_kw,
+           bs.by_status, COALESCE(bs.total, 0) AS total_batteries,
+           COALESCE(pc.n, 0) AS pue_count,
+           COALESCE(rc.n, 0) AS active_rentals
+    FROM hubs h
+    LEFT JOIN battery_stats bs ON bs.hub_id = h.hub_id
+    LEFT JOIN pue_counts pc ON pc.hub_id = h.hub_id
+    LEFT JOIN rental_counts rc ON rc.hub_id = h.hub_id
+    ORDER BY h.hub_id
+"""
+
+
+def load_hub_summaries(db, hub_ids: Optional[List[int]] = None) -> List[Dict]:
+    """Summaries of the given hubs (all hubs when hub_ids is None)"""
+    if hub_ids is None:
+        sql, params = HUB_SUMMARY_SQL.format(hub_filter=""), {}
+    else:
+        if not hub_ids:
+            return []
+        sql = HUB_SUMMARY_SQL.format(hub_filter="WHERE hub_id = ANY(:hub_ids)")
+        params = {"hub_ids": list(hub_ids)}
+
+    return [
+        {
+            "hub_id": row.hub_id,
+            "hub_name": row.what_three_word_location,
+            "country": row.country,
+            "solar_capacity_kw": row.solar_capacity_kw,
+            "battery_stats": row.by_status or {},
+            "total_batteries": row.total_batteries,
+            "pue_count": row.pue_count,
+            "active_rentals": row.active_rentals,
+        }
+        for row in db.execute(text(sql), params)
+    ]
+
+
+class HubSummaryCache:
+    """TTL + LRU cache of requested hub set -> hub summaries for one process"""
+
+    def __init__(self, ttl_seconds: int = 30, max_entries: int = 256):
+        self.ttl = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Optional[tuple], tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, db, hub_ids: Optional[List[int]] = None) -> List[Dict]:
+        key = None if hub_ids is None else tuple(sorted(set(hub_ids)))
+
+        now = time.monotonic()
+        if self.ttl > 0:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return [dict(summary) for summary in entry[1]]
+                self._stats["misses"] += 1
+
+        summaries = load_hub_summaries(db, None if key is None else list(key))
+        if self.ttl > 0:
+            with self._lock:
+                self._entries[key] = (now + self.ttl, summaries)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return [dict(summary) for summary in summaries]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        stats["ttl_seconds"] = self.ttl
+        stats["max_entries"] = self.max_entries
+        return stats
@@ -0,0 +1,177 @@
+"""
+Live Data Export
+Streams a battery's LiveData history as CSV, NDJSON or Parquet without
+holding it in memory. Rows are read through a server-side cursor
+(yield_per) in chunks of EXPORT_CHUNK_ROWS, and each chunk is encoded and
+sent as soon as it arrives.
+
+The generators open their own session because they keep running after the
+request handler has returned.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import BigInteger, Boolean, DateTime, Float, Integer, select
+
+from database import SessionLocal
+from models import LiveData
+
+EXPORT_CHUNK_ROWS = 5000
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+EXPORT_COLUMNS = [column.name for column in LiveData.__table__.columns]
+
+
+def _export_query(battery_id: str, start_timestamp: Optional[datetime], end_timestamp: Optional[datetime],
+                  limit: Optional[int]):
+    table = LiveData.__table__
+    query = select(table).where(table.c.battery_id == battery_id)
+    if start_timestamp:
+        query = query.where(table.c.timestamp >= start_timestamp)
+    if end_timestamp:
+        query = query.where(table.c.timestamp <= end_timestamp)
+    query = query.order_by(table.c.timestamp.desc())
+    if limit:
+        query = query.limit(limit)
+    return query.execution_options(yield_per=EXPORT_CHUNK_ROWS)
+
+
+def _iter_chunks(battery_id: str, start_timestamp: Optional[datetime], end_timestamp: Optional[datetime],
+                 limit: Optional[int]) -> Iterator[List[Dict]]:
+    """Yield lists of row dicts, one server-side cursor fetch at a time"""
+    db = SessionLocal()
+    try:
+        result = db.execute(_export_query(battery_id, start_timestamp, end_timestamp, limit))
+        for partition in result.mappings().partitions():
+            yield [dict(row) for row in partition]
+    finally:
+        db.close()
+
+
+def _isoformat(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def stream_csv(battery_id: str, start_timestamp: Optional[datetime] = None,
+               end_timestamp: Optional[datetime] = None, limit: Optional[int] = None) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for chunk in _iter_chunks(battery_id, start_timestamp, end_timestamp, limit):
+        writer.writerows({key: _isoformat(value) for key, value in row.items()} for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_ndjson(battery_id: str, start_timestamp: Optional[datetime] = None,
+                  end_timestamp: Optional[datetime] = None, limit: Optional[int] = None) -> Iterator[str]:
+    for chunk in _iter_chunks(battery_id, start_timestamp, end_timestamp, limit):
+        yield "".join(
+            json.dumps({key: _isoformat(value) for key, value in row.items()}) + "\n"
+            for row in chunk
+        )
+
+
+class _ChunkSink:
+    """
+    Write-only file object for pyarrow that hands written bytes back to the
+    caller. tell() keeps counting across drains so the Parquet footer
+    offsets stay correct.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    fields = []
+    for column in LiveData.__table__.columns:
+        if isinstance(column.type, BigInteger):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, Integer):
+            arrow_type = pa.int32()
+        elif isinstance(column.type, Float):
+            arrow_type = pa.float64()
+        elif isinstance(column.type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us")
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def stream_parquet(battery_id: str, start_timestamp: Optional[datetime] = None,
+                   end_timestamp: Optional[datetime] = None, limit: Optional[int] = None) -> Iterator[bytes]:
+    """One Parquet row group per fetched chunk"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for chunk in _iter_chunks(battery_id, start_timestamp, end_timestamp, limit):
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+EXPORT_STREAMS = {
+    "csv": stream_csv,
+    "ndjson": stream_ndjson,
+    "parquet": stream_parquet,
+}
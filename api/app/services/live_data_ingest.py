@@ -0,0 +1,251 @@
+"""
+Live Data Ingestion Queue
+Buffers parsed battery telemetry in-process and writes it to the database
+in batches, so the webhook handler does not pay for a commit per reading.
+"""
+import csv
+import io
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import LiveData, BEPPPBattery
+from api.app.services.battery_state import upsert_latest_state
+
+logger = logging.getLogger('webhook')
+
+LIVE_DATA_COLUMNS = [column.name for column in LiveData.__table__.columns]
+
+
+def live_data_row(parsed_data: Dict) -> Dict:
+    """
+    Normalise a parsed telemetry dict into a full LiveData row.
+
+    Multi-row INSERTs need every row to carry the same set of keys, so
+    columns the battery did not send are filled with None and keys that
+    are not LiveData columns are dropped.
+    """
+    return {column: parsed_data.get(column) for column in LIVE_DATA_COLUMNS}
+
+
+def _touch_batteries(db: Session, rows: List[Dict]):
+    """Set last_data_received once for every battery present in the rows"""
+    battery_ids = {row['battery_id'] for row in rows if row.get('battery_id')}
+    if battery_ids:
+        db.execute(
+            update(BEPPPBattery)
+            .where(BEPPPBattery.battery_id.in_(battery_ids))
+            .values(last_data_received=datetime.now(timezone.utc))
+        )
+
+
+def bulk_insert_live_data(db: Session, rows: List[Dict]) -> int:
+    """
+    Insert LiveData rows with a single multi-row INSERT, touch each
+    battery's last_data_received once and fold the rows into
+    battery_latest_state. Does not commit.
+
+    Args:
+        db: Database session
+        rows: Rows produced by live_data_row()
+
+    Returns:
+        Number of rows inserted
+    """
+    if not rows:
+        return 0
+
+    db.execute(insert(LiveData), rows)
+
+    _touch_batteries(db, rows)
+    upsert_latest_state(db, rows)
+    return len(rows)
+
+
+def copy_live_data(db: Session, rows: List[Dict]) -> int:
+    """
+    Load LiveData rows with PostgreSQL COPY (falls back to a multi-row INSERT
+    on other databases), touch each battery's last_data_received once and
+    fold the rows into battery_latest_state. Does not commit. COPY is all-or-nothing, so callers that need per-row
+    outcomes should retry a failed load with bulk_insert_live_data().
+
+    Args:
+        db: Database session
+        rows: Rows produced by live_data_row()
+
+    Returns:
+        Number of rows loaded
+    """
+    if not rows:
+        return 0
+
+    if db.get_bind().dialect.name != 'postgresql':
+        return bulk_insert_live_data(db, rows)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # csv writes None as an unquoted empty field, which COPY reads as NULL
+        writer.writerow([row.get(column) for column in LIVE_DATA_COLUMNS])
+    buffer.seek(0)
+
+    column_list = ", ".join(f'"{column}"' for column in LIVE_DATA_COLUMNS)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY livedata ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+    _touch_batteries(db, rows)
+    upsert_latest_state(db, rows)
+    return len(rows)
+
+
+class LiveDataIngestQueue:
+    """
+    In-process telemetry queue with a background writer thread.
+
+    The writer flushes when `flush_rows` rows are waiting or `flush_interval_ms`
+    has passed since the first row of the batch arrived, whichever is first.
+    Each uvicorn worker owns its own queue; rows still queued are flushed on
+    shutdown via stop().
+    """
+
+    def __init__(self, flush_rows: int = 200, flush_interval_ms: int = 500, max_size: int = 10000):
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = max(1, flush_interval_ms) / 1000.0
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max_size)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "rows_enqueued": 0,
+            "rows_rejected_full": 0,
+            "rows_flushed": 0,
+            "rows_failed": 0,
+            "flushes": 0,
+            "failed_flushes": 0,
+            "last_flush_rows": 0,
+            "last_flush_ms": None,
+            "max_flush_ms": None,
+            "total_flush_ms": 0.0,
+            "last_flush_at": None,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the background writer (no-op if already running)"""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="livedata-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the writer after draining everything still queued"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def enqueue(self, row: Dict) -> bool:
+        """
+        Queue a row for the next flush.
+
+        Returns False if the writer is not running or the queue is full, in
+        which case the caller should write the row synchronously instead.
+        """
+        if not self.running:
+            return False
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["rows_rejected_full"] += 1
+            return False
+        with self._stats_lock:
+            self._stats["rows_enqueued"] += 1
+        return True
+
+    def stats(self) -> Dict:
+        """Queue depth and flush latency metrics"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        flushes = stats.pop("total_flush_ms")
+        stats["avg_flush_ms"] = round(flushes / stats["flushes"], 2) if stats["flushes"] else None
+        stats["queue_depth"] = self._queue.qsize()
+        stats["queue_capacity"] = self._queue.maxsize
+        stats["flush_rows"] = self.flush_rows
+        stats["flush_interval_ms"] = int(self.flush_interval * 1000)
+        stats["running"] = self.running
+        return stats
+
+    def _next_batch(self) -> List[Dict]:
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.flush_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch: List[Dict]):
+        started = time.perf_counter()
+        db = SessionLocal()
+        failed_rows = 0
+        try:
+            try:
+                bulk_insert_live_data(db, batch)
+                db.commit()
+            except Exception as e:
+                # One bad row must not take the whole batch down with it
+                db.rollback()
+                logger.error(f"LiveData batch insert of {len(batch)} rows failed, retrying row by row: {e}")
+                with self._stats_lock:
+                    self._stats["failed_flushes"] += 1
+                for row in batch:
+                    try:
+                        bulk_insert_live_data(db, [row])
+                        db.commit()
+                    except Exception as row_err:
+                        db.rollback()
+                        failed_rows += 1
+                        logger.error(f"Dropped LiveData row for battery {row.get('battery_id')}: {row_err}")
+        finally:
+            db.close()
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self._stats["flushes"] += 1
+            self._stats["rows_flushed"] += len(batch) - failed_rows
+            self._stats["rows_failed"] += failed_rows
+            self._stats["last_flush_rows"] = len(batch)
+            self._stats["last_flush_ms"] = round(elapsed_ms, 2)
+            self._stats["max_flush_ms"] = round(max(elapsed_ms, self._stats["max_flush_ms"] or 0), 2)
+            self._stats["total_flush_ms"] += elapsed_ms
+            self._stats["last_flush_at"] = datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,140 @@
+"""
+LiveData Aggregation
+Compiles a power-usage analytics request (metric, aggregation_period,
+aggregation_function) into a single date_trunc / GROUP BY query over raw
+livedata, so only the aggregated buckets leave the database.
+
+Used by /analytics/power-usage for everything the hourly/daily rollups
+cannot answer (median, stats, split_stats, or before the first rollup
+refresh).
+"""
+from datetime import datetime
+from typing import Dict, List, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from api.app.services.livedata_rollups import ROLLUP_METRICS, ROLLUP_PERIODS
+
+AGGREGATION_METRICS = ROLLUP_METRICS
+AGGREGATION_PERIODS = ROLLUP_PERIODS
+AGGREGATION_FUNCTIONS = ("sum", "mean", "median", "min", "max", "stats", "split_stats")
+
+# stats/split_stats ignore near-zero idle readings
+IDLE_THRESHOLD_WATTS = 1
+
+
+def _aggregates(value: str, condition: str = None) -> Dict[str, str]:
+    """SQL aggregate expressions over `value`, optionally restricted by a FILTER condition"""
+    where = f" FILTER (WHERE {condition})" if condition else ""
+    return {
+        "sum": f"sum({value}){where}",
+        "mean": f"avg({value}){where}",
+        "median": f"percentile_cont(0.5) WITHIN GROUP (ORDER BY {value}){where}",
+        "min": f"min({value}){where}",
+        "max": f"max({value}){where}",
+        "std": f"coalesce(stddev_samp({value}){where}, 0)",
+        "count": f"count({value}){where}",
+    }
+
+
+def format_time_group(time_group: datetime, period: str) -> str:
+    """
+    Response label for a bucket (naive UTC): 'YYYY-MM-DD' for day/week/month,
+    ISO-8601 with a Z suffix for hours so clients parse it as UTC
+    """
+    if period == "hour":
+        return time_group.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return time_group.strftime("%Y-%m-%d")
+
+
+def compile_aggregation(period: str, function: str, metric: str) -> str:
+    """
+    Build the SQL for one aggregation request.
+
+    Column and period names are interpolated, so they are checked against
+    the allowed lists first; battery_ids/start/end are bind parameters.
+
+    Raises:
+        ValueError: If the metric, period or function is not supported
+    """
+    if metric not in AGGREGATION_METRICS:
+        raise ValueError(f"Metric '{metric}' not available")
+    if period not in AGGREGATION_PERIODS:
+        raise ValueError(f"Unknown aggregation_period: {period}")
+    if function not in AGGREGATION_FUNCTIONS:
+        raise ValueError(f"Unknown aggregation_function: {function}")
+
+    time_group = f"date_trunc('{period}', \"timestamp\")"
+    value = f"{metric}::double precision"
+    window = """
+        FROM livedata
+        WHERE battery_id = ANY(:battery_ids)
+          AND "timestamp" >= :start_time AND "timestamp" <= :end_time
+    """
+
+    if function == "stats":
+        active = f"abs({value}) > {IDLE_THRESHOLD_WATTS}"
+        agg = _aggregates(value, active)
+        return f"""
+            SELECT {time_group} AS time_group, GROUPING({time_group}) = 1 AS is_total,
+                   {agg['mean']} AS mean, {agg['median']} AS median, {agg['std']} AS std,
+                   {agg['count']} AS count, {agg['sum']} AS sum,
+                   count(DISTINCT battery_id) FILTER (WHERE {active}) AS battery_count,
+                   count(*) AS raw_count
+            {window}
+            GROUP BY GROUPING SETS (({time_group}), ())
+            ORDER BY 1
+        """
+
+    if function == "split_stats":
+        columns = []
+        for direction, condition in (("in", f"{value} > {IDLE_THRESHOLD_WATTS}"),
+                                     ("out", f"{value} < -{IDLE_THRESHOLD_WATTS}")):
+            agg = _aggregates(value, condition)
+            columns.extend(
+                f"{agg[name]} AS {direction}_{name}" for name in ("mean", "median", "std", "count")
+            )
+        return f"""
+            SELECT {time_group} AS time_group, GROUPING({time_group}) = 1 AS is_total,
+                   {", ".join(columns)},
+                   count(*) AS raw_count
+            {window}
+            GROUP BY GROUPING SETS (({time_group}), ())
+            ORDER BY 1
+        """
+
+    expression = _aggregates(value)[function]
+    if function == "sum":
+        expression = f"coalesce({expression}, 0)"
+    return f"""
+        SELECT {time_group} AS time_group, battery_id, {expression} AS value, count(*) AS raw_count
+        {window}
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+    """
+
+
+def aggregate_live_data(
+    db: Session,
+    battery_ids: Sequence[str],
+    start_time: datetime,
+    end_time: datetime,
+    period: str,
+    function: str,
+    metric: str
+) -> List[Dict]:
+    """
+    Run the compiled aggregation and return its rows as dicts.
+
+    For stats/split_stats the last row (is_total) carries window-wide
+    totals; raw_count counts every reading in a bucket, including nulls and
+    idle readings.
+    """
+    sql = compile_aggregation(period, function, metric)
+    rows = db.execute(text(sql), {
+        "battery_ids": list(battery_ids),
+        "start_time": start_time,
+        "end_time": end_time,
+    }).mappings().all()
+    return [dict(row) for row in rows]
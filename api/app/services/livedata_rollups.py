@@ -0,0 +1,350 @@
+"""
+LiveData Rollups
+Maintains per-battery hourly and daily aggregates of the main telemetry
+metrics (livedata_hourly, livedata_daily) and answers time-bucketed analytics
+queries from them instead of scanning raw livedata.
+
+Refreshing is incremental: rollup_watermarks records how far (by
+livedata.created_at) the rollups are up to date. Each refresh finds the
+(battery, hour) buckets touched by rows created since the watermark,
+recomputes exactly those hours from raw data, then recomputes the affected
+days from the hourly table. Late uploads of old readings land in the right
+buckets, but only once a refresh has passed their created_at: rows are
+rolled up DEFAULT_LAG (2 minutes) after insert at the earliest, and cron runs
+scripts/refresh_livedata_rollups.py every 5 minutes, so rollups trail raw
+data by up to ~7 minutes. query_rollups() reads raw livedata for anything
+newer than the watermark, so power-usage totals are not affected, but
+readers of livedata_hourly/livedata_daily (dashboards) see that lag.
+
+Rows changed after insert (e.g. NULL timestamps backfilled by
+scripts/reconstruct_timestamps.py) are not seen by the watermark; whatever
+changes them calls reroll_buckets() for the readings it touched.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+ROLLUP_METRICS = ("power_watts", "state_of_charge", "voltage", "current_amps")
+ROLLUP_FUNCTIONS = ("sum", "mean", "min", "max")
+ROLLUP_PERIODS = ("hour", "day", "week", "month")
+WATERMARK_NAME = "livedata_rollups"
+
+# Rows are only rolled up once they are this old, so that readings still
+# sitting in an open transaction (ingest queue, batch COPY) are not skipped.
+DEFAULT_LAG = timedelta(minutes=2)
+# Maximum span of created_at processed per transaction during a backfill
+DEFAULT_CHUNK = timedelta(days=1)
+
+
+def _metric_select(source: str) -> str:
+    """count/sum/min/max select list for every metric over raw livedata rows"""
+    parts = []
+    for metric in ROLLUP_METRICS:
+        value = f"{source}.{metric}::double precision"
+        parts.append(f"count({source}.{metric}), sum({value}), min({value}), max({value})")
+    return ",\n               ".join(parts)
+
+
+def _metric_merge_select(source: str) -> str:
+    """count/sum/min/max select list merging finer rollup rows"""
+    parts = []
+    for metric in ROLLUP_METRICS:
+        parts.append(
+            f"sum({source}.{metric}_count), sum({source}.{metric}_sum), "
+            f"min({source}.{metric}_min), max({source}.{metric}_max)"
+        )
+    return ",\n               ".join(parts)
+
+
+def _metric_columns() -> List[str]:
+    columns = []
+    for metric in ROLLUP_METRICS:
+        columns.extend([f"{metric}_count", f"{metric}_sum", f"{metric}_min", f"{metric}_max"])
+    return columns
+
+
+def _upsert_sql(table: str, select_sql: str) -> str:
+    columns = ["battery_id", "bucket", "sample_count"] + _metric_columns() + ["updated_at"]
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns[2:])
+    return f"""
+        INSERT INTO {table} ({", ".join(columns)})
+        {select_sql}
+        ON CONFLICT (battery_id, bucket) DO UPDATE SET {updates}
+    """
+
+
+def get_watermark(db: Session) -> Optional[datetime]:
+    return db.execute(
+        text("SELECT watermark FROM rollup_watermarks WHERE name = :name"),
+        {"name": WATERMARK_NAME}
+    ).scalar()
+
+
+def _set_watermark(db: Session, watermark: datetime):
+    db.execute(text("""
+        INSERT INTO rollup_watermarks (name, watermark, updated_at)
+        VALUES (:name, :watermark, :now)
+        ON CONFLICT (name) DO UPDATE SET watermark = EXCLUDED.watermark, updated_at = EXCLUDED.updated_at
+    """), {"name": WATERMARK_NAME, "watermark": watermark, "now": datetime.utcnow()})
+
+
+def _refresh_window(db: Session, low: datetime, high: datetime) -> Tuple[int, int]:
+    """Recompute every hour/day touched by rows with low < created_at <= high"""
+    db.execute(text("DROP TABLE IF EXISTS rollup_touched_hours"))
+    db.execute(text("""
+        CREATE TEMP TABLE rollup_touched_hours ON COMMIT DROP AS
+        SELECT DISTINCT battery_id, date_trunc('hour', "timestamp") AS bucket
+        FROM livedata
+        WHERE created_at > :low AND created_at <= :high
+          AND battery_id IS NOT NULL AND "timestamp" IS NOT NULL
+    """), {"low": low, "high": high})
+    return _rebuild_touched_hours(db)
+
+
+def _rebuild_touched_hours(db: Session) -> Tuple[int, int]:
+    """Recompute the hours in rollup_touched_hours and the days containing them"""
+    hours = db.execute(text(_upsert_sql("livedata_hourly", f"""
+        SELECT l.battery_id, t.bucket, count(*),
+               {_metric_select("l")},
+               :now
+        FROM rollup_touched_hours t
+        JOIN livedata l
+          ON l.battery_id = t.battery_id
+         AND l."timestamp" >= t.bucket
+         AND l."timestamp" < t.bucket + interval '1 hour'
+        GROUP BY l.battery_id, t.bucket
+    """)), {"now": datetime.utcnow()}).rowcount
+
+    days = db.execute(text(_upsert_sql("livedata_daily", f"""
+        SELECT h.battery_id, d.bucket, sum(h.sample_count),
+               {_metric_merge_select("h")},
+               :now
+        FROM (SELECT DISTINCT battery_id, date_trunc('day', bucket) AS bucket FROM rollup_touched_hours) d
+        JOIN livedata_hourly h
+          ON h.battery_id = d.battery_id
+         AND h.bucket >= d.bucket
+         AND h.bucket < d.bucket + interval '1 day'
+        GROUP BY h.battery_id, d.bucket
+    """)), {"now": datetime.utcnow()}).rowcount
+
+    return hours, days
+
+
+def reroll_buckets(db: Session, readings: Iterable[Tuple[str, datetime]]) -> Tuple[int, int]:
+    """
+    Recompute the hours/days containing the given (battery_id, timestamp)
+    readings, for rows whose timestamp or metrics were changed after insert
+    (the created_at watermark never revisits them). Pass both the old and
+    the new timestamp of a moved reading; buckets left without readings are
+    removed. Does not commit.
+
+    Returns:
+        (hourly, daily) buckets rewritten
+    """
+    touched = {
+        (battery_id, timestamp.replace(minute=0, second=0, microsecond=0))
+        for battery_id, timestamp in readings
+        if battery_id is not None and timestamp is not None
+    }
+    if not touched:
+        return 0, 0
+
+    db.execute(text("DROP TABLE IF EXISTS rollup_touched_hours"))
+    db.execute(text("""
+        CREATE TEMP TABLE rollup_touched_hours (battery_id varchar(50), bucket timestamp) ON COMMIT DROP
+    """))
+    db.execute(
+        text("INSERT INTO rollup_touched_hours (battery_id, bucket) VALUES (:battery_id, :bucket)"),
+        [{"battery_id": battery_id, "bucket": bucket} for battery_id, bucket in sorted(touched)]
+    )
+    db.execute(text("""
+        DELETE FROM livedata_hourly h
+        USING rollup_touched_hours t
+        WHERE h.battery_id = t.battery_id AND h.bucket = t.bucket
+    """))
+    db.execute(text("""
+        DELETE FROM livedata_daily d
+        USING (SELECT DISTINCT battery_id, date_trunc('day', bucket) AS bucket FROM rollup_touched_hours) t
+        WHERE d.battery_id = t.battery_id AND d.bucket = t.bucket
+    """))
+    return _rebuild_touched_hours(db)
+
+
+def refresh_rollups(db: Session, lag: timedelta = DEFAULT_LAG, chunk: timedelta = DEFAULT_CHUNK) -> Dict:
+    """
+    Bring livedata_hourly and livedata_daily up to date.
+
+    Processes rows created since the stored watermark in `chunk`-sized
+    windows of created_at, committing and advancing the watermark after each
+    window so an interrupted backfill resumes where it stopped.
+
+    Returns:
+        Dict with the new watermark and how many hourly/daily buckets were rewritten
+    """
+    upper = datetime.utcnow() - lag
+    watermark = get_watermark(db)
+    if watermark is None:
+        first = db.execute(text("SELECT MIN(created_at) FROM livedata")).scalar()
+        if first is None:
+            return {"watermark": None, "hours": 0, "days": 0, "windows": 0}
+        watermark = first - timedelta(microseconds=1)
+
+    hours = days = windows = 0
+    while watermark < upper:
+        high = min(watermark + chunk, upper)
+        window_hours, window_days = _refresh_window(db, watermark, high)
+        _set_watermark(db, high)
+        db.commit()
+        hours += window_hours
+        days += window_days
+        windows += 1
+        watermark = high
+
+    return {"watermark": watermark, "hours": hours, "days": days, "windows": windows}
+
+
+def delete_battery_rollups(db: Session, battery_id: str):
+    """Remove a battery's rollup rows (used when its raw data is force-deleted). Does not commit."""
+    for table in ("livedata_hourly", "livedata_daily"):
+        db.execute(text(f"DELETE FROM {table} WHERE battery_id = :battery_id"), {"battery_id": battery_id})
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _ceil_hour(value: datetime) -> datetime:
+    floored = _floor_hour(value)
+    return floored if floored == value else floored + timedelta(hours=1)
+
+
+def _floor_day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _ceil_day(value: datetime) -> datetime:
+    floored = _floor_day(value)
+    return floored if floored == value else floored + timedelta(days=1)
+
+
+def plan_segments(start: datetime, end: datetime, period: str, watermark: datetime) -> List[Tuple[str, datetime, datetime]]:
+    """
+    Split [start, end] into (source, lower, upper) segments that together
+    cover it exactly: whole days from livedata_daily (for day/week/month
+    periods), whole hours from livedata_hourly, and raw livedata only for the
+    partial hours at either edge and for anything newer than the watermark.
+    The final segment includes its upper bound.
+    """
+    rolled_end = min(end, watermark)
+    hour_start, hour_end = _ceil_hour(start), _floor_hour(rolled_end)
+    if hour_start >= hour_end:
+        return [("livedata", start, end)]
+
+    segments = []
+    if start < hour_start:
+        segments.append(("livedata", start, hour_start))
+
+    day_start, day_end = _ceil_day(start), _floor_day(rolled_end)
+    if period != "hour" and day_start < day_end:
+        if hour_start < day_start:
+            segments.append(("livedata_hourly", hour_start, day_start))
+        segments.append(("livedata_daily", day_start, day_end))
+        if day_end < hour_end:
+            segments.append(("livedata_hourly", day_end, hour_end))
+    else:
+        segments.append(("livedata_hourly", hour_start, hour_end))
+
+    segments.append(("livedata", hour_end, end))
+    return segments
+
+
+def query_rollups(
+    db: Session,
+    battery_ids: Sequence[str],
+    start: datetime,
+    end: datetime,
+    period: str,
+    metric: str
+) -> Optional[Dict]:
+    """
+    Per (time_group, battery_id) count/sum/min/max/mean of `metric` over
+    [start, end], read from the coarsest rollups that cover the window.
+    `rows` counts readings and `count` the non-null `metric` values; like
+    the raw aggregation, a bucket whose readings have no `metric` value has
+    a sum of 0 and no min/max/mean.
+
+    Returns None when the rollups cannot answer (unsupported metric/period,
+    or never refreshed) so the caller can fall back to raw data.
+    """
+    if metric not in ROLLUP_METRICS or period not in ROLLUP_PERIODS:
+        return None
+    watermark = get_watermark(db)
+    if watermark is None:
+        return None
+
+    start, end = _naive_utc(start), _naive_utc(end)
+    segments = plan_segments(start, end, period, watermark)
+
+    params = {"battery_ids": list(battery_ids)}
+    parts = []
+    for index, (source, lower, upper) in enumerate(segments):
+        params[f"lower_{index}"] = lower
+        params[f"upper_{index}"] = upper
+        upper_op = "<=" if index == len(segments) - 1 else "<"
+        if source == "livedata":
+            value = f"{metric}::double precision"
+            parts.append(f"""
+                SELECT battery_id, date_trunc('{period}', "timestamp") AS time_group,
+                       count(*) AS r, count({metric}) AS n, sum({value}) AS s, min({value}) AS lo, max({value}) AS hi
+                FROM livedata
+                WHERE battery_id = ANY(:battery_ids)
+                  AND "timestamp" >= :lower_{index} AND "timestamp" {upper_op} :upper_{index}
+                GROUP BY 1, 2
+            """)
+        else:
+            parts.append(f"""
+                SELECT battery_id, date_trunc('{period}', bucket) AS time_group,
+                       sum(sample_count) AS r, sum({metric}_count) AS n, sum({metric}_sum) AS s,
+                       min({metric}_min) AS lo, max({metric}_max) AS hi
+                FROM {source}
+                WHERE battery_id = ANY(:battery_ids)
+                  AND bucket >= :lower_{index} AND bucket < :upper_{index}
+                GROUP BY 1, 2
+            """)
+
+    rows = db.execute(text(f"""
+        SELECT time_group, battery_id, sum(r)::bigint AS r, sum(n)::bigint AS n,
+               sum(s) AS s, min(lo) AS lo, max(hi) AS hi
+        FROM ({" UNION ALL ".join(parts)}) partials
+        GROUP BY time_group, battery_id
+        HAVING sum(r) > 0
+        ORDER BY time_group, battery_id
+    """), params).all()
+
+    buckets = [
+        {
+            "time_group": row.time_group,
+            "battery_id": row.battery_id,
+            "rows": int(row.r),
+            "count": int(row.n),
+            "sum": row.s if row.s is not None else 0.0,
+            "min": row.lo,
+            "max": row.hi,
+            "mean": row.s / row.n if row.n else None,
+        }
+        for row in rows
+    ]
+    sources = {source for source, _, _ in segments}
+    coarsest = next(
+        (table for table in ("livedata_daily", "livedata_hourly", "livedata") if table in sources),
+        "livedata"
+    )
+    return {"buckets": buckets, "source": coarsest, "watermark": watermark}
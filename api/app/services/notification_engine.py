@@ -0,0 +1,163 @@
+"""
+Notification Engine
+Creates the rule-based hub notifications (overdue rentals, accounts past the
+hub's debt threshold) with one set-based INSERT ... SELECT ... WHERE NOT
+EXISTS per rule, instead of a query per rental or account.
+
+Sweeps are incremental: rollup_watermarks records when the last sweep ran,
+and the next one only considers rentals that became overdue, accounts whose
+balance changed, or hubs whose notification settings changed since then
+(minus a small overlap for transactions that were still open). The NOT
+EXISTS clause makes re-checking the overlap harmless. Run every few minutes
+by scripts/run_notification_sweep.py; POST /notifications/check runs a full
+sweep of one hub on demand.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+WATERMARK_NAME = "notification_sweep"
+
+# Re-check this much before the watermark so changes committed just after
+# the previous sweep started are not missed
+DEFAULT_OVERLAP = timedelta(minutes=10)
+
+# Symbols used in debt messages; other currencies show their code
+CURRENCY_SYMBOLS = {'USD': '$', 'GBP': '£', 'EUR': '€', 'MWK': 'MK'}
+
+
+def _user_name(alias: str, user_id: str) -> str:
+    return f"""COALESCE(NULLIF({alias}.username, ''), NULLIF({alias}."Name", ''), 'User ' || {user_id})"""
+
+
+def _currency_symbol(currency: str) -> str:
+    cases = " ".join(f"WHEN '{code}' THEN '{symbol}'" for code, symbol in CURRENCY_SYMBOLS.items())
+    return f"CASE {currency} {cases} ELSE {currency} END"
+
+
+def get_watermark(db: Session) -> Optional[datetime]:
+    watermark = db.execute(
+        text("SELECT watermark FROM rollup_watermarks WHERE name = :name"),
+        {"name": WATERMARK_NAME}
+    ).scalar()
+    return watermark.replace(tzinfo=timezone.utc) if watermark else None
+
+
+def _set_watermark(db: Session, watermark: datetime):
+    db.execute(text("""
+        INSERT INTO rollup_watermarks (name, watermark, updated_at)
+        VALUES (:name, :watermark, :now)
+        ON CONFLICT (name) DO UPDATE SET watermark = EXCLUDED.watermark, updated_at = EXCLUDED.updated_at
+    """), {"name": WATERMARK_NAME, "watermark": watermark.replace(tzinfo=None), "now": datetime.utcnow()})
+
+
+def create_overdue_rental_notifications(
+    db: Session, now: datetime, since: Optional[datetime] = None, hub_id: Optional[int] = None
+) -> int:
+    """
+    One 'overdue_rental' notification per active rental more than the hub's
+    overdue_notification_hours past due_back. With `since`, only rentals that
+    crossed that line after `since` (or in hubs whose settings changed) are
+    considered. Returns the number created; does not commit.
+    """
+    # due_back is stored as naive UTC
+    due_back = "(r.due_back AT TIME ZONE 'UTC')"
+    overdue_after = "make_interval(hours => COALESCE(s.overdue_notification_hours, 24))"
+    filters, params = [], {"now": now}
+    if since is not None:
+        filters.append(f"AND ({due_back} + {overdue_after} > :since OR s.updated_at > :since)")
+        params["since"] = since
+    if hub_id is not None:
+        filters.append("AND b.hub_id = :hub_id")
+        params["hub_id"] = hub_id
+
+    return db.execute(text(f"""
+        INSERT INTO notifications
+            (hub_id, user_id, notification_type, title, message, severity, link_type, link_id)
+        SELECT b.hub_id, NULL, 'overdue_rental', 'Overdue Rental',
+               {_user_name("u", "r.user_id")} || ' has rental #' || r.rentral_id || ' overdue by '
+                   || floor(extract(epoch FROM (:now - {due_back})) / 3600)::bigint || ' hours.',
+               'warning', 'rental', r.rentral_id::text
+        FROM rental r
+        JOIN bepppbattery b ON b.battery_id = r.battery_id
+        JOIN hub_settings s ON s.hub_id = b.hub_id
+        LEFT JOIN "user" u ON u.user_id = r.user_id
+        WHERE r.status = 'active'
+          AND {due_back} + {overdue_after} < :now
+          {" ".join(filters)}
+          AND NOT EXISTS (
+              SELECT 1 FROM notifications n
+              WHERE n.hub_id = b.hub_id
+                AND n.notification_type = 'overdue_rental'
+                AND n.link_id = r.rentral_id::text
+          )
+    """), params).rowcount
+
+
+def create_debt_notifications(
+    db: Session, since: Optional[datetime] = None, hub_id: Optional[int] = None
+) -> int:
+    """
+    One 'debt_threshold' notification per account below its hub's
+    debt_notification_threshold, unless an unread one already exists. With
+    `since`, only accounts updated after `since` (or in hubs whose settings
+    changed) are considered. Returns the number created; does not commit.
+    """
+    filters, params = [], {}
+    if since is not None:
+        filters.append("AND (a.updated_at > :since OR s.updated_at > :since)")
+        params["since"] = since
+    if hub_id is not None:
+        filters.append("AND u.hub_id = :hub_id")
+        params["hub_id"] = hub_id
+
+    return db.execute(text(f"""
+        INSERT INTO notifications
+            (hub_id, user_id, notification_type, title, message, severity, link_type, link_id)
+        SELECT u.hub_id, NULL, 'debt_threshold', 'Debt Threshold Exceeded',
+               {_user_name("u", "u.user_id")} || ' has exceeded the debt threshold. Current balance: '
+                   || {_currency_symbol("COALESCE(s.default_currency, 'USD')")}
+                   || round(abs(a.balance)::numeric, 2)::text,
+               'error', 'user', a.user_id::text
+        FROM user_accounts a
+        JOIN "user" u ON u.user_id = a.user_id
+        JOIN hub_settings s ON s.hub_id = u.hub_id
+        WHERE a.balance < COALESCE(s.debt_notification_threshold, -100)
+          {" ".join(filters)}
+          AND NOT EXISTS (
+              SELECT 1 FROM notifications n
+              WHERE n.hub_id = u.hub_id
+                AND n.notification_type = 'debt_threshold'
+                AND n.link_id = a.user_id::text
+                AND n.is_read = false
+          )
+    """), params).rowcount
+
+
+def run_notification_sweep(db: Session, hub_id: Optional[int] = None, full: bool = False) -> Dict:
+    """
+    Evaluate every notification rule. A sweep of all hubs is incremental
+    from the watermark (full on the first run or with full=True) and moves
+    the watermark; a single-hub sweep is always full and leaves it alone.
+    Sweeps are serialised with an advisory lock. Does not commit.
+    """
+    now = datetime.now(timezone.utc)
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": WATERMARK_NAME})
+
+    watermark = None if (full or hub_id is not None) else get_watermark(db)
+    since = watermark - DEFAULT_OVERLAP if watermark else None
+
+    overdue = create_overdue_rental_notifications(db, now, since, hub_id)
+    debt = create_debt_notifications(db, since, hub_id)
+
+    if hub_id is None:
+        _set_watermark(db, now)
+
+    return {
+        "overdue_rental": overdue,
+        "debt_threshold": debt,
+        "since": since,
+        "watermark": now,
+    }
@@ -0,0 +1,83 @@
+"""
+Principal Cache
+Resolves the hub access of an authenticated user (hub_id, plus
+accessible_hub_ids for DATA_ADMIN users) without a database round trip on
+every request.
+
+Entries are keyed by username (the token's `sub`), kept for `ttl_seconds`
+and evicted least-recently-used beyond `max_entries`. Endpoints that change
+a user's hub, role or DATA_ADMIN hub grants call invalidate(); the TTL bounds
+how long other API workers can serve the old value.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from models import User, UserRole
+
+
+class PrincipalCache:
+    """TTL + LRU cache of username -> hub access claims for one process"""
+
+    def __init__(self, ttl_seconds: int = 60, max_entries: int = 10000):
+        self.ttl = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, db, username: Optional[str]) -> Optional[Dict]:
+        """
+        Claims to merge into the token payload, or None when the user no
+        longer exists. Unknown users are cached too, so stale tokens for a
+        deleted account don't query the database on every request.
+        """
+        if not username:
+            return None
+
+        now = time.monotonic()
+        if self.ttl > 0:
+            with self._lock:
+                entry = self._entries.get(username)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(username)
+                    self._stats["hits"] += 1
+                    return dict(entry[1]) if entry[1] is not None else None
+                self._stats["misses"] += 1
+
+        principal = self._load(db, username)
+        if self.ttl > 0:
+            with self._lock:
+                self._entries[username] = (now + self.ttl, principal)
+                self._entries.move_to_end(username)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return dict(principal) if principal is not None else None
+
+    def _load(self, db, username: str) -> Optional[Dict]:
+        user = db.query(User).filter(User.username == username).first()
+        if user is None:
+            return None
+
+        principal = {"hub_id": user.hub_id}
+        if user.user_access_level == UserRole.DATA_ADMIN.value:
+            principal["accessible_hub_ids"] = [hub.hub_id for hub in user.accessible_hubs]
+        return principal
+
+    def invalidate(self, username: Optional[str] = None):
+        """Forget one user, or everyone when username is None"""
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(username, None)
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        stats["ttl_seconds"] = self.ttl
+        stats["max_entries"] = self.max_entries
+        return stats
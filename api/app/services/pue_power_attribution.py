@@ -0,0 +1,148 @@
+"""
+PUE Power Attribution
+Attributes battery telemetry points to the PUE type the renter was using at
+the time, for /analytics/power-by-pue-type.
+
+Both lookups are sorted-interval joins (pandas merge_asof) instead of a scan
+of every rental per point:
+1. point -> battery rental, by battery_id on non-overlapping rental segments
+2. rental's user -> PUE type, by user_id on non-overlapping PUE segments
+
+Overlapping intervals for the same key (battery rentals of one battery, PUE
+rentals of one user) are flattened into segments first, where each segment
+carries the most recently started interval that is still open. A point in a
+rental nested inside a longer one belongs to the inner rental, and to the
+outer one again once the inner rental has ended.
+Total cost is O((N + M) log M) for N points and M intervals.
+"""
+import heapq
+from datetime import timedelta
+from typing import Iterable, List, Tuple
+
+import pandas as pd
+
+NO_PUE = "No PUE"
+
+# Interval ends are inclusive; segments are stored half-open
+_END_EPSILON = timedelta(microseconds=1)
+
+
+def _flatten_intervals(intervals: Iterable[Tuple[object, object, object, object]]) -> List[Tuple]:
+    """
+    Flatten (key, start, end, value) intervals with inclusive, naive UTC
+    bounds into non-overlapping (key, seg_start, seg_end, value) segments
+    with exclusive ends; the latest started interval wins where they overlap.
+    """
+    by_key = {}
+    for key, start, end, value in intervals:
+        if start is None or end is None or end < start:
+            continue
+        by_key.setdefault(key, []).append((start, end + _END_EPSILON, value))
+
+    segments: List[Tuple] = []
+    for key, key_intervals in by_key.items():
+        key_intervals.sort(key=lambda interval: interval[0])
+        boundaries = sorted({start for start, _, _ in key_intervals} | {end for _, end, _ in key_intervals})
+        active = []  # heap of (-start, end, value): latest start on top
+        next_interval = 0
+        for lower, upper in zip(boundaries, boundaries[1:]):
+            while next_interval < len(key_intervals) and key_intervals[next_interval][0] <= lower:
+                start, end, value = key_intervals[next_interval]
+                heapq.heappush(active, (-start.timestamp(), end, value))
+                next_interval += 1
+            while active and active[0][1] <= lower:
+                heapq.heappop(active)
+            if active:
+                segments.append((key, lower, upper, active[0][2]))
+    return segments
+
+
+def build_pue_segments(intervals: Iterable[Tuple[int, object, object, str]]) -> pd.DataFrame:
+    """
+    Flatten PUE rental intervals into non-overlapping per-user segments.
+
+    Args:
+        intervals: (user_id, start, end, type_name) with inclusive, naive UTC bounds
+
+    Returns:
+        DataFrame with user_id, seg_start, seg_end (exclusive) and pue_type_name
+    """
+    return pd.DataFrame(
+        _flatten_intervals(intervals), columns=["user_id", "seg_start", "seg_end", "pue_type_name"]
+    )
+
+
+def build_rental_segments(rentals: pd.DataFrame) -> pd.DataFrame:
+    """
+    Flatten battery rentals into non-overlapping per-battery segments.
+
+    Args:
+        rentals: battery_id, rental_start, rental_end (inclusive), user_id
+
+    Returns:
+        DataFrame with battery_id, seg_start, seg_end (exclusive) and user_id
+    """
+    intervals = (
+        (row.battery_id, row.rental_start, row.rental_end, row.user_id)
+        for row in rentals.itertuples(index=False)
+        if pd.notna(row.rental_start) and pd.notna(row.rental_end)
+    )
+    return pd.DataFrame(
+        _flatten_intervals(intervals), columns=["battery_id", "seg_start", "seg_end", "user_id"]
+    )
+
+
+def attribute_pue_types(points: pd.DataFrame, rentals: pd.DataFrame, segments: pd.DataFrame) -> pd.DataFrame:
+    """
+    Label telemetry points with the concurrent PUE type.
+
+    Args:
+        points: battery_id, timestamp, power_watts
+        rentals: battery_id, rental_start, rental_end (inclusive), user_id
+        segments: output of build_pue_segments()
+
+    Returns:
+        The points that fall inside a battery rental, with a pue_type_name
+        column ("No PUE" when the renter had no matching PUE out)
+    """
+    if points.empty or rentals.empty:
+        return points.iloc[0:0].assign(pue_type_name=pd.Series(dtype=object))
+
+    # merge_asof needs identical key dtypes on both sides
+    points = points.astype({"timestamp": "datetime64[ns]"}).sort_values("timestamp")
+    rentals = rentals.astype({"rental_start": "datetime64[ns]", "rental_end": "datetime64[ns]"})
+    rental_segments = build_rental_segments(rentals)
+    if rental_segments.empty:
+        return points.iloc[0:0].assign(pue_type_name=pd.Series(dtype=object))
+    rental_segments = rental_segments.astype({
+        "seg_start": "datetime64[ns]", "seg_end": "datetime64[ns]"
+    }).sort_values("seg_start")
+    in_rental = pd.merge_asof(
+        points,
+        rental_segments,
+        left_on="timestamp",
+        right_on="seg_start",
+        by="battery_id",
+        direction="backward",
+    )
+    in_rental = in_rental[in_rental["seg_end"].notna() & (in_rental["timestamp"] < in_rental["seg_end"])]
+    in_rental = in_rental.drop(columns=["seg_start", "seg_end"])
+    in_rental["user_id"] = in_rental["user_id"].astype("int64")
+
+    if segments.empty:
+        return in_rental.assign(pue_type_name=NO_PUE)
+
+    segments = segments.astype({
+        "user_id": "int64", "seg_start": "datetime64[ns]", "seg_end": "datetime64[ns]"
+    }).sort_values("seg_start")
+    labelled = pd.merge_asof(
+        in_rental,
+        segments,
+        left_on="timestamp",
+        right_on="seg_start",
+        by="user_id",
+        direction="backward",
+    )
+    outside = labelled["seg_end"].isna() | (labelled["timestamp"] >= labelled["seg_end"])
+    labelled.loc[outside, "pue_type_name"] = NO_PUE
+    return labelled.drop(columns=["seg_start", "seg_end"])
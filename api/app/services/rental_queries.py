@@ -0,0 +1,63 @@
+"""
+Rental Queries
+Shared query builders for the rental list endpoints (/rentals/,
+/rentals/overdue-upcoming, /battery-rentals, /pue-rentals).
+
+Everything a list row needs (user, hub, battery items and their batteries,
+PUE item, pay-to-own ledger) is loaded with selectinload, one extra
+statement per relationship for the whole result, so a page costs the same
+handful of queries whether it holds 10 rentals or 2,000.
+"""
+from typing import List, Optional
+
+from sqlalchemy.orm import Query, Session, configure_mappers, selectinload
+
+from models import (
+    BatteryRental, BatteryRentalItem, PUERental, ProductiveUseEquipment, User,
+)
+
+
+def _user_options(relationship, with_account: bool):
+    option = selectinload(relationship)
+    if with_account:
+        # User.account is a backref, only present once mappers are configured
+        configure_mappers()
+        option = option.selectinload(User.account)
+    return option
+
+
+def battery_rentals_query(db: Session, with_account: bool = False) -> Query:
+    """BatteryRental query with user, hub and battery items (with batteries) preloaded"""
+    return db.query(BatteryRental).options(
+        _user_options(BatteryRental.user, with_account),
+        selectinload(BatteryRental.hub),
+        selectinload(BatteryRental.battery_items).selectinload(BatteryRentalItem.battery),
+    )
+
+
+def pue_rentals_query(db: Session, with_account: bool = False, with_ledger: bool = False) -> Query:
+    """PUERental query with user and PUE item (with hub) preloaded"""
+    options = [
+        _user_options(PUERental.user, with_account),
+        selectinload(PUERental.pue).selectinload(ProductiveUseEquipment.hub),
+    ]
+    if with_ledger:
+        options.append(selectinload(PUERental.pay_to_own_ledger))
+    return db.query(PUERental).options(*options)
+
+
+def rental_items(rental: BatteryRental) -> List[BatteryRentalItem]:
+    """A rental's battery items in the order they were added"""
+    return sorted(rental.battery_items, key=lambda item: item.item_id)
+
+
+def active_rental_item(items: List[BatteryRentalItem]) -> Optional[BatteryRentalItem]:
+    """The battery currently out on the rental (after any swaps), else the first one"""
+    return next((item for item in items if item.returned_at is None), None) or (items[0] if items else None)
+
+
+def user_account_balance(user: Optional[User]) -> float:
+    account = getattr(user, 'account', None) if user else None
+    if account is None or account.balance is None:
+        return 0.0
+    return float(account.balance)
@@ -0,0 +1,321 @@
+"""
+Rental Usage Facts
+Per-rental battery usage summarised once into rental_usage_facts, so
+/analytics/user-report aggregates one row per rental instead of pulling and
+integrating every LiveData point on each request.
+
+A rental's facts cover the LiveData of its batteries between start_date and
+actual_return_date (or end_date while active). When rentals of the same
+battery overlap, each point counts once, for the most recently started
+rental that covers it (as in /analytics/power-by-pue-type), so energy is
+not double-counted across rentals. Facts hold discharge power stats (power
+is negative while discharging; stats use its magnitude), Wh discharged by
+trapezoidal integration of discharging segments, and the hours spent
+discharging. Facts are marked final once the rental is returned or
+cancelled, but readings for its window that arrive later (SD-card backfills,
+queued rows flushed after the return) still re-queue it.
+
+They are computed when a rental is returned, and every few minutes by
+scripts/refresh_rental_usage_facts.py for rentals without facts, active
+rentals whose batteries sent new data, rentals edited since, and rentals
+with readings created since the last run (rollup_watermarks) inside their
+window. The report computes facts it doesn't find on the fly, without
+saving them.
+"""
+import math
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from models import RentalUsageFact
+
+FINAL_STATUSES = ('returned', 'cancelled')
+WATERMARK_NAME = "rental_usage_facts"
+
+# Re-check readings created this long before the watermark, for rows that
+# were still in an open transaction (ingest queue, batch COPY) last run
+DEFAULT_OVERLAP = timedelta(minutes=10)
+
+FACTS_SELECT = """
+    WITH intervals AS (
+        SELECT r.rental_id, i.battery_id, r.start_date,
+               r.start_date AT TIME ZONE 'UTC' AS starts_at,
+               COALESCE(r.actual_return_date, r.end_date) AT TIME ZONE 'UTC' AS ends_at
+        FROM battery_rentals r
+        JOIN battery_rental_items i ON i.rental_id = r.rental_id
+        WHERE r.rental_id = ANY(:rental_ids)
+    ),
+    later AS (
+        -- Rentals of the same battery that started later and overlap: they own the shared points
+        SELECT iv.rental_id, iv.battery_id,
+               o.start_date AT TIME ZONE 'UTC' AS starts_at,
+               COALESCE(o.actual_return_date, o.end_date) AT TIME ZONE 'UTC' AS ends_at
+        FROM intervals iv
+        JOIN battery_rental_items oi ON oi.battery_id = iv.battery_id AND oi.rental_id <> iv.rental_id
+        JOIN battery_rentals o ON o.rental_id = oi.rental_id
+        WHERE (o.start_date, o.rental_id) > (iv.start_date, iv.rental_id)
+          AND o.start_date AT TIME ZONE 'UTC' <= iv.ends_at
+          AND COALESCE(o.actual_return_date, o.end_date) AT TIME ZONE 'UTC' >= iv.starts_at
+    ),
+    points AS (
+        SELECT iv.rental_id, l."timestamp", l.power_watts
+        FROM intervals iv
+        JOIN livedata l ON l.battery_id = iv.battery_id
+                       AND l."timestamp" BETWEEN iv.starts_at AND iv.ends_at
+        WHERE NOT EXISTS (
+            SELECT 1 FROM later o
+            WHERE o.rental_id = iv.rental_id AND o.battery_id = iv.battery_id
+              AND l."timestamp" BETWEEN o.starts_at AND o.ends_at
+        )
+    ),
+    segments AS (
+        SELECT rental_id, "timestamp", power_watts,
+               EXTRACT(EPOCH FROM "timestamp" - lag("timestamp") OVER w) / 3600 AS hours,
+               (COALESCE(lag(power_watts) OVER w, 0) + COALESCE(power_watts, 0)) / 2 AS segment_w
+        FROM points
+        WINDOW w AS (PARTITION BY rental_id ORDER BY "timestamp")
+    ),
+    stats AS (
+        SELECT rental_id,
+               count(*) AS point_count,
+               count(*) FILTER (WHERE power_watts < 0) AS discharge_point_count,
+               sum(-power_watts) FILTER (WHERE power_watts < 0) AS discharge_sum_w,
+               sum(power_watts * power_watts) FILTER (WHERE power_watts < 0) AS discharge_sumsq_w,
+               avg(-power_watts) FILTER (WHERE power_watts < 0) AS power_mean_w,
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY -power_watts) FILTER (WHERE power_watts < 0) AS power_median_w,
+               max(-power_watts) FILTER (WHERE power_watts < 0) AS power_max_w,
+               min(-power_watts) FILTER (WHERE power_watts < 0) AS power_min_w,
+               stddev_samp(-power_watts) FILTER (WHERE power_watts < 0) AS power_sd_w,
+               CASE WHEN count(*) >= 2
+                    THEN COALESCE(sum(-segment_w * hours) FILTER (WHERE segment_w < 0 AND hours IS NOT NULL), 0)
+               END AS wh_discharged,
+               COALESCE(sum(hours) FILTER (WHERE segment_w < 0 AND hours IS NOT NULL), 0) AS active_hours,
+               min("timestamp") AS first_point_at,
+               max("timestamp") AS last_point_at
+        FROM segments
+        GROUP BY rental_id
+    )
+    SELECT r.rental_id, COALESCE(s.point_count, 0) AS point_count,
+           COALESCE(s.discharge_point_count, 0) AS discharge_point_count,
+           s.discharge_sum_w, s.discharge_sumsq_w,
+           s.power_mean_w, s.power_median_w, s.power_max_w, s.power_min_w, s.power_sd_w,
+           s.wh_discharged, COALESCE(s.active_hours, 0) AS active_hours, s.first_point_at, s.last_point_at,
+           r.status IN ('returned', 'cancelled') AS is_final, now() AS computed_at
+    FROM battery_rentals r
+    LEFT JOIN stats s ON s.rental_id = r.rental_id
+    WHERE r.rental_id = ANY(:rental_ids)
+"""
+
+REFRESH_SQL = text(f"""
+    INSERT INTO rental_usage_facts AS f (
+        rental_id, point_count, discharge_point_count, discharge_sum_w, discharge_sumsq_w,
+        power_mean_w, power_median_w, power_max_w, power_min_w, power_sd_w,
+        wh_discharged, active_hours, first_point_at, last_point_at, is_final, computed_at
+    )
+    {FACTS_SELECT}
+    ON CONFLICT (rental_id) DO UPDATE SET
+        point_count = EXCLUDED.point_count,
+        discharge_point_count = EXCLUDED.discharge_point_count,
+        discharge_sum_w = EXCLUDED.discharge_sum_w,
+        discharge_sumsq_w = EXCLUDED.discharge_sumsq_w,
+        power_mean_w = EXCLUDED.power_mean_w,
+        power_median_w = EXCLUDED.power_median_w,
+        power_max_w = EXCLUDED.power_max_w,
+        power_min_w = EXCLUDED.power_min_w,
+        power_sd_w = EXCLUDED.power_sd_w,
+        wh_discharged = EXCLUDED.wh_discharged,
+        active_hours = EXCLUDED.active_hours,
+        first_point_at = EXCLUDED.first_point_at,
+        last_point_at = EXCLUDED.last_point_at,
+        is_final = EXCLUDED.is_final,
+        computed_at = EXCLUDED.computed_at
+""")
+
+
+def refresh_rental_usage_facts(db: Session, rental_ids: Iterable[int]) -> int:
+    """(Re)compute the facts of the given battery rentals. Does not commit."""
+    rental_ids = sorted({int(rental_id) for rental_id in rental_ids})
+    if not rental_ids:
+        return 0
+    return db.execute(REFRESH_SQL, {"rental_ids": rental_ids}).rowcount
+
+
+def rentals_needing_refresh(db: Session, limit: Optional[int] = None) -> List[int]:
+    """
+    Rentals without facts, edited since their facts were computed (or with
+    an overlapping rental of the same battery edited since, which can take
+    over some of their points), or not final yet and either finished since
+    or with batteries that sent data since (battery_latest_state.updated_at)
+    """
+    query = """
+        SELECT r.rental_id
+        FROM battery_rentals r
+        LEFT JOIN rental_usage_facts f ON f.rental_id = r.rental_id
+        WHERE f.rental_id IS NULL
+           OR r.updated_at > f.computed_at
+           OR EXISTS (
+                   SELECT 1 FROM battery_rental_items i
+                   JOIN battery_rental_items oi ON oi.battery_id = i.battery_id AND oi.rental_id <> i.rental_id
+                   JOIN battery_rentals o ON o.rental_id = oi.rental_id
+                   WHERE i.rental_id = r.rental_id
+                     AND o.updated_at > f.computed_at
+                     AND o.start_date <= COALESCE(r.actual_return_date, r.end_date)
+                     AND COALESCE(o.actual_return_date, o.end_date) >= r.start_date
+               )
+           OR (NOT f.is_final AND (
+                   r.status IN ('returned', 'cancelled')
+                   OR EXISTS (
+                       SELECT 1 FROM battery_rental_items i
+                       JOIN battery_latest_state s ON s.battery_id = i.battery_id
+                       WHERE i.rental_id = r.rental_id AND s.updated_at > f.computed_at
+                   )
+               ))
+        ORDER BY r.rental_id
+    """
+    params = {}
+    if limit:
+        query += " LIMIT :limit"
+        params["limit"] = limit
+    return [row[0] for row in db.execute(text(query), params)]
+
+
+def rentals_with_late_readings(db: Session, since: datetime) -> List[int]:
+    """
+    Rentals with facts computed before LiveData rows created after `since`
+    (naive UTC) that fall inside the rental's window, whether the facts are
+    final or not: SD-card backfills (/webhook/batch-live-data) and queued
+    readings flushed after the rental was returned. Found from the new rows
+    (BRIN index on created_at), per battery and hour.
+    """
+    rows = db.execute(text("""
+        WITH touched AS (
+            SELECT battery_id, date_trunc('hour', "timestamp") AS hour, max(created_at) AS last_created_at
+            FROM livedata
+            WHERE created_at > :since
+              AND battery_id IS NOT NULL AND "timestamp" IS NOT NULL
+            GROUP BY 1, 2
+        )
+        SELECT DISTINCT r.rental_id
+        FROM touched t
+        JOIN battery_rental_items i ON i.battery_id = t.battery_id
+        JOIN battery_rentals r ON r.rental_id = i.rental_id
+        JOIN rental_usage_facts f ON f.rental_id = r.rental_id
+        WHERE t.hour <= COALESCE(r.actual_return_date, r.end_date) AT TIME ZONE 'UTC'
+          AND t.hour + interval '1 hour' > r.start_date AT TIME ZONE 'UTC'
+          AND f.computed_at < t.last_created_at AT TIME ZONE 'UTC'
+        ORDER BY r.rental_id
+    """), {"since": since})
+    return [row[0] for row in rows]
+
+
+def get_watermark(db: Session) -> Optional[datetime]:
+    return db.execute(
+        text("SELECT watermark FROM rollup_watermarks WHERE name = :name"),
+        {"name": WATERMARK_NAME}
+    ).scalar()
+
+
+def set_watermark(db: Session, watermark: datetime):
+    """Record that readings created up to `watermark` (naive UTC) are in the facts. Does not commit."""
+    db.execute(text("""
+        INSERT INTO rollup_watermarks (name, watermark, updated_at)
+        VALUES (:name, :watermark, :now)
+        ON CONFLICT (name) DO UPDATE SET watermark = EXCLUDED.watermark, updated_at = EXCLUDED.updated_at
+    """), {"name": WATERMARK_NAME, "watermark": watermark, "now": datetime.utcnow()})
+
+
+def usage_facts(db: Session, rental_ids: Iterable[int]) -> Dict[int, RentalUsageFact]:
+    """
+    Facts for the given rentals. Rentals the refresh script hasn't reached
+    yet are computed on the fly and returned as unsaved (transient) rows, so
+    reading facts never writes to the database.
+    """
+    rental_ids = list(rental_ids)
+    facts = {
+        fact.rental_id: fact
+        for fact in db.query(RentalUsageFact).filter(RentalUsageFact.rental_id.in_(rental_ids)).all()
+    }
+    missing = sorted({rental_id for rental_id in rental_ids if rental_id not in facts})
+    if missing:
+        for row in db.execute(text(FACTS_SELECT), {"rental_ids": missing}):
+            facts[row.rental_id] = RentalUsageFact(**row._mapping)
+    return facts
+
+
+def pooled_discharge_stats(facts: Iterable[RentalUsageFact]) -> Dict[str, Optional[float]]:
+    """
+    Discharge power stats over the points of several rentals. Mean, SD, min
+    and max are exact (from counts, sums and sums of squares); the median is
+    the point-weighted median of the rentals' medians.
+    """
+    facts = [fact for fact in facts if fact.discharge_point_count]
+    count = sum(fact.discharge_point_count for fact in facts)
+    if not count:
+        return {"mean": None, "median": None, "sd": None, "min": None, "max": None}
+
+    total = sum(fact.discharge_sum_w or 0 for fact in facts)
+    total_sq = sum(fact.discharge_sumsq_w or 0 for fact in facts)
+    sd = None
+    if count > 1:
+        sd = math.sqrt(max(total_sq - total * total / count, 0) / (count - 1))
+
+    median = None
+    weighted = sorted(
+        (fact.power_median_w, fact.discharge_point_count) for fact in facts if fact.power_median_w is not None
+    )
+    seen = 0
+    for value, weight in weighted:
+        seen += weight
+        if seen * 2 >= count:
+            median = value
+            break
+
+    return {
+        "mean": total / count,
+        "median": median,
+        "sd": sd,
+        "min": min(fact.power_min_w for fact in facts),
+        "max": max(fact.power_max_w for fact in facts),
+    }
+
+
+def rental_power_timeline(db: Session, rental_ids: List[int], start, end) -> List[Dict]:
+    """
+    Hourly mean power (livedata_hourly) of each rental's batteries while
+    rented, within [start, end] (naive UTC). An hour shared by overlapping
+    rentals of a battery is listed once, under the later-started rental.
+    """
+    if not rental_ids:
+        return []
+    rows = db.execute(text("""
+        SELECT i.rental_id, i.battery_id, h.bucket, h.power_watts_mean
+        FROM battery_rental_items i
+        JOIN battery_rentals r ON r.rental_id = i.rental_id
+        JOIN livedata_hourly h ON h.battery_id = i.battery_id
+        WHERE i.rental_id = ANY(:rental_ids)
+          AND h.bucket >= date_trunc('hour', r.start_date AT TIME ZONE 'UTC')
+          AND h.bucket <= COALESCE(r.actual_return_date, r.end_date) AT TIME ZONE 'UTC'
+          AND h.bucket >= date_trunc('hour', CAST(:start AS timestamp))
+          AND h.bucket <= :end
+          AND h.power_watts_mean IS NOT NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM battery_rental_items oi
+              JOIN battery_rentals o ON o.rental_id = oi.rental_id
+              WHERE oi.battery_id = i.battery_id AND oi.rental_id <> i.rental_id
+                AND (o.start_date, o.rental_id) > (r.start_date, r.rental_id)
+                AND h.bucket >= date_trunc('hour', o.start_date AT TIME ZONE 'UTC')
+                AND h.bucket <= COALESCE(o.actual_return_date, o.end_date) AT TIME ZONE 'UTC'
+          )
+        ORDER BY h.bucket, i.rental_id
+    """), {"rental_ids": rental_ids, "start": start, "end": end})
+    return [
+        {
+            "timestamp": row.bucket.isoformat(),
+            "power_watts": round(row.power_watts_mean, 2),
+            "rental_id": row.rental_id,
+            "battery_id": row.battery_id,
+        }
+        for row in rows
+    ]
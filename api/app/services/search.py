@@ -0,0 +1,125 @@
+"""
+Global Search
+Per-category queries behind GET /search (the search-as-you-type box).
+
+Every filter is a substring match on an expression that has a pg_trgm GIN
+index (migration l2m3n4o5p6q7), e.g. lower("Name") LIKE '%q%', so lookups
+stay index scans as hubs grow; keep the expressions here and the index
+definitions in step. Results are ranked by trigram similarity to the query
+(closest first) and limited per category. Rentals are found through the
+matching customers / items first, then by rental id.
+"""
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Text, cast, func, or_, select, union
+from sqlalchemy.orm import Session
+
+from models import BatteryRental, BEPPPBattery, ProductiveUseEquipment, PUERental, SolarHub, User
+
+
+def like_pattern(q: str) -> str:
+    """'%q%' with LIKE wildcards in the query escaped"""
+    escaped = q.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def _rank(q: str, *expressions):
+    return func.greatest(*[func.similarity(expression, q.lower()) for expression in expressions])
+
+
+def _user_name_expressions():
+    return func.lower(User.Name), func.lower(User.username)
+
+
+def _matching_user_ids(pattern: str):
+    return select(User.user_id).where(or_(*[e.like(pattern) for e in _user_name_expressions()]))
+
+
+def search_hubs(db: Session, q: str, limit: int) -> List[SolarHub]:
+    pattern = like_pattern(q)
+    expressions = (
+        func.lower(SolarHub.what_three_word_location),
+        func.lower(SolarHub.country),
+        cast(SolarHub.hub_id, Text),
+    )
+    return (
+        db.query(SolarHub)
+        .filter(or_(*[e.like(pattern) for e in expressions]))
+        .order_by(_rank(q, *expressions).desc(), SolarHub.hub_id)
+        .limit(limit)
+        .all()
+    )
+
+
+def search_users(db: Session, q: str, hub_id: Optional[int], limit: int) -> List[User]:
+    pattern = like_pattern(q)
+    expressions = (
+        *_user_name_expressions(),
+        func.lower(User.mobile_number),
+        func.lower(User.short_id),
+        func.lower(User.users_identification_document_number),
+    )
+    query = db.query(User).filter(or_(*[e.like(pattern) for e in expressions]))
+    if hub_id:
+        query = query.filter(User.hub_id == hub_id)
+    return query.order_by(_rank(q, *expressions).desc(), User.user_id).limit(limit).all()
+
+
+def search_batteries(db: Session, q: str, hub_id: Optional[int], limit: int) -> List[BEPPPBattery]:
+    pattern = like_pattern(q)
+    expressions = (func.lower(BEPPPBattery.battery_id), func.lower(BEPPPBattery.short_id))
+    query = db.query(BEPPPBattery).filter(or_(*[e.like(pattern) for e in expressions]))
+    if hub_id:
+        query = query.filter(BEPPPBattery.hub_id == hub_id)
+    return query.order_by(_rank(q, *expressions).desc(), BEPPPBattery.battery_id).limit(limit).all()
+
+
+def search_battery_rentals(db: Session, q: str, hub_id: Optional[int], limit: int) -> List[Tuple[BatteryRental, User]]:
+    pattern = like_pattern(q)
+    rental_id = cast(BatteryRental.rental_id, Text)
+    candidates = union(
+        select(BatteryRental.rental_id).where(rental_id.like(pattern)),
+        select(BatteryRental.rental_id).where(BatteryRental.user_id.in_(_matching_user_ids(pattern))),
+    ).subquery()
+
+    query = (
+        db.query(BatteryRental, User)
+        .join(User, BatteryRental.user_id == User.user_id)
+        .filter(BatteryRental.rental_id.in_(select(candidates.c.rental_id)))
+    )
+    if hub_id:
+        query = query.filter(BatteryRental.hub_id == hub_id)
+    return (
+        query.order_by(_rank(q, rental_id, *_user_name_expressions()).desc(), BatteryRental.start_date.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def search_pue_rentals(
+    db: Session, q: str, hub_id: Optional[int], limit: int
+) -> List[Tuple[PUERental, User, ProductiveUseEquipment]]:
+    pattern = like_pattern(q)
+    rental_id = cast(PUERental.pue_rental_id, Text)
+    pue_name = func.lower(ProductiveUseEquipment.name)
+    candidates = union(
+        select(PUERental.pue_rental_id).where(rental_id.like(pattern)),
+        select(PUERental.pue_rental_id).where(PUERental.user_id.in_(_matching_user_ids(pattern))),
+        select(PUERental.pue_rental_id).where(PUERental.pue_id.in_(
+            select(ProductiveUseEquipment.pue_id).where(pue_name.like(pattern))
+        )),
+    ).subquery()
+
+    query = (
+        db.query(PUERental, User, ProductiveUseEquipment)
+        .join(User, PUERental.user_id == User.user_id)
+        .join(ProductiveUseEquipment, PUERental.pue_id == ProductiveUseEquipment.pue_id)
+        .filter(PUERental.pue_rental_id.in_(select(candidates.c.pue_rental_id)))
+    )
+    if hub_id:
+        query = query.filter(ProductiveUseEquipment.hub_id == hub_id)
+    return (
+        query.order_by(_rank(q, rental_id, *_user_name_expressions(), pue_name).desc(), PUERental.timestamp_taken.desc())
+        .limit(limit)
+        .all()
+    )
@@ -0,0 +1,164 @@
+"""
+Sync Change Feed
+Reads change_log (filled by the record_sync_change() trigger, migration
+j0k1l2m3n4o5) for GET /sync/changes, so an offline client can bring a whole
+hub up to date in one request instead of polling every entity endpoint with
+modified_after, and learns about deletes.
+
+A cursor is (txid, change_id, issued_at). Only changes written by
+transactions older than every transaction still in progress are served,
+ordered by (txid, change_id): anything committed later has a higher txid,
+so it can't land behind a cursor already handed out. issued_at lets the
+endpoint spot cursors older than the change_log retention window, whose
+client must re-sync in full.
+
+Within a page, repeated changes to the same row collapse into the last one;
+upserts carry the row as it is now (secrets removed), deletes only the id.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import and_, func, literal, or_, tuple_
+from sqlalchemy.orm import Session
+
+from api.app.utils.pagination import decode_cursor, encode_cursor
+from models import (
+    BEPPPBattery, BatteryRental, ChangeLog, Notification, ProductiveUseEquipment, PUERental, User,
+)
+
+SYNC_ENTITIES = {
+    'user': User,
+    'battery': BEPPPBattery,
+    'pue': ProductiveUseEquipment,
+    'battery_rental': BatteryRental,
+    'pue_rental': PUERental,
+    'notification': Notification,
+}
+
+# Never sent to clients, whatever the serializer returns
+SENSITIVE_COLUMNS = {'password_hash', 'battery_secret'}
+
+
+def _visible_txid_limit():
+    """Oldest transaction still in progress; every txid below it has finished"""
+    return func.txid_snapshot_xmin(func.txid_current_snapshot())
+
+
+def row_dict(obj) -> Dict:
+    return {c.name: getattr(obj, c.name) for c in obj.__table__.columns if c.name not in SENSITIVE_COLUMNS}
+
+
+def head_cursor(db: Session) -> str:
+    """Cursor positioned after every change visible right now"""
+    head = (
+        db.query(ChangeLog.txid, ChangeLog.change_id)
+        .filter(ChangeLog.txid < _visible_txid_limit())
+        .order_by(ChangeLog.txid.desc(), ChangeLog.change_id.desc())
+        .first()
+    )
+    txid, change_id = head if head else (0, 0)
+    return encode_cursor([txid, change_id, datetime.now(timezone.utc)])
+
+
+def parse_sync_cursor(cursor: str) -> Sequence:
+    """(txid, change_id, issued_at); raises ValueError for anything else"""
+    values = decode_cursor(cursor)
+    if len(values) != 3 or not isinstance(values[2], datetime):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def cursor_expired(issued_at: datetime, retention_days: int) -> bool:
+    """True when changes the cursor hasn't seen may already have been pruned"""
+    if issued_at.tzinfo is None:
+        issued_at = issued_at.replace(tzinfo=timezone.utc)
+    return issued_at < datetime.now(timezone.utc) - timedelta(days=retention_days)
+
+
+def _load_rows(db: Session, entity: str, entity_ids: Iterable[str]) -> Dict[str, object]:
+    model = SYNC_ENTITIES[entity]
+    pk = model.__table__.primary_key.columns.values()[0]
+    python_type = pk.type.python_type
+    rows = db.query(model).filter(pk.in_({python_type(i) for i in entity_ids})).all()
+    return {str(getattr(row, pk.key)): row for row in rows}
+
+
+def changes_since(
+    db: Session,
+    txid: int,
+    change_id: int,
+    limit: int,
+    hub_ids: Optional[List[int]] = None,
+    entities: Optional[Iterable[str]] = None,
+    serializers: Optional[Dict[str, Callable]] = None,
+) -> Dict:
+    """
+    Up to `limit` changes after (txid, change_id), oldest first.
+
+    Args:
+        hub_ids: Hubs the caller can see (None = all). Tombstones without a
+            hub (e.g. a PUE rental whose item was deleted with it) are sent
+            to everyone; they carry nothing but the id.
+        entities: Entity names to include (default: all of SYNC_ENTITIES)
+        serializers: Per-entity override of row_dict()
+
+    Returns:
+        {"changes": [...], "next_cursor": str, "has_more": bool}
+    """
+    serializers = serializers or {}
+    query = db.query(ChangeLog).filter(
+        ChangeLog.txid < _visible_txid_limit(),
+        tuple_(ChangeLog.txid, ChangeLog.change_id) > tuple_(literal(txid), literal(change_id)),
+    )
+    if hub_ids is not None:
+        query = query.filter(or_(
+            ChangeLog.hub_id.in_(hub_ids),
+            and_(ChangeLog.hub_id.is_(None), ChangeLog.op == 'delete'),
+        ))
+    if entities is not None:
+        query = query.filter(ChangeLog.entity.in_(list(entities)))
+
+    log = query.order_by(ChangeLog.txid, ChangeLog.change_id).limit(limit + 1).all()
+    has_more = len(log) > limit
+    log = log[:limit]
+    if log:
+        txid, change_id = log[-1].txid, log[-1].change_id
+
+    # Last change per row wins; keep rows in the order of their last change
+    latest: Dict[tuple, ChangeLog] = {}
+    for change in log:
+        key = (change.entity, change.entity_id)
+        latest.pop(key, None)
+        latest[key] = change
+
+    upserted: Dict[str, set] = {}
+    for entity, entity_id in (key for key, change in latest.items() if change.op == 'upsert'):
+        upserted.setdefault(entity, set()).add(entity_id)
+    rows = {entity: _load_rows(db, entity, ids) for entity, ids in upserted.items()}
+
+    changes = []
+    for (entity, entity_id), change in latest.items():
+        obj = rows.get(entity, {}).get(entity_id) if change.op == 'upsert' else None
+        if obj is None:
+            # Deleted since (or a tombstone to begin with)
+            changes.append({"entity": entity, "id": entity_id, "op": "delete", "hub_id": change.hub_id})
+            continue
+        if hub_ids is not None and getattr(obj, 'hub_id', None) not in (None, *hub_ids):
+            # Moved to a hub the caller can't see; its tombstone follows
+            continue
+        data = serializers.get(entity, row_dict)(obj)
+        for column in SENSITIVE_COLUMNS:
+            data.pop(column, None)
+        changes.append({"entity": entity, "id": entity_id, "op": "upsert", "hub_id": change.hub_id, "data": data})
+
+    return {
+        "changes": changes,
+        "next_cursor": encode_cursor([txid, change_id, datetime.now(timezone.utc)]),
+        "has_more": has_more,
+    }
+
+
+def prune_change_log(db: Session, retention_days: int) -> int:
+    """Delete changes older than the retention window. Does not commit."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    return db.query(ChangeLog).filter(ChangeLog.created_at < cutoff).delete(synchronize_session=False)
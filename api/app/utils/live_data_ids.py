@@ -0,0 +1,87 @@
+"""
+LiveData ID Allocation
+
+Hands out collision-free, monotonically increasing LiveData primary keys using
+the `livedata_id_seq` PostgreSQL sequence as a hi/lo block allocator.
+
+The sequence is created with INCREMENT BY <block size>, so every nextval()
+reserves a whole block of IDs [value, value + block size) for the calling
+process. IDs are then handed out locally without another round trip until the
+block runs out. Separate uvicorn workers always get disjoint blocks, and rows
+inserted by scripts that rely on the column default simply consume a block
+start each.
+"""
+
+import threading
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+SEQUENCE_NAME = "livedata_id_seq"
+
+
+class LiveDataIdAllocator:
+    """Thread-safe hi/lo allocator backed by livedata_id_seq"""
+
+    def __init__(self, sequence_name: str = SEQUENCE_NAME):
+        self.sequence_name = sequence_name
+        self._lock = threading.Lock()
+        self._block_size: Optional[int] = None
+        self._blocks: List[int] = []
+        self._next_id = 0
+        self._block_end = 0
+
+    def _load_block_size(self, db: Session) -> int:
+        if self._block_size is None:
+            increment = db.execute(
+                text("SELECT increment_by FROM pg_sequences WHERE sequencename = :name"),
+                {"name": self.sequence_name}
+            ).scalar()
+            self._block_size = int(increment or 1)
+        return self._block_size
+
+    def _reserve_blocks(self, db: Session, count: int):
+        starts = db.execute(
+            text(f"SELECT nextval('{self.sequence_name}') FROM generate_series(1, :count)"),
+            {"count": count}
+        ).scalars().all()
+        self._blocks.extend(sorted(starts))
+
+    def allocate(self, db: Session, count: int = 1) -> List[int]:
+        """
+        Allocate `count` unique LiveData IDs.
+
+        At most one database round trip is made per call, however many
+        blocks are needed.
+
+        Args:
+            db: Database session used to call nextval()
+            count: Number of IDs required
+
+        Returns:
+            List of IDs in increasing order
+        """
+        if count <= 0:
+            return []
+
+        with self._lock:
+            block_size = self._load_block_size(db)
+
+            available = self._block_end - self._next_id + len(self._blocks) * block_size
+            if available < count:
+                missing = count - available
+                self._reserve_blocks(db, -(-missing // block_size))
+
+            ids = []
+            while len(ids) < count:
+                if self._next_id >= self._block_end:
+                    self._next_id = self._blocks.pop(0)
+                    self._block_end = self._next_id + block_size
+                take = min(count - len(ids), self._block_end - self._next_id)
+                ids.extend(range(self._next_id, self._next_id + take))
+                self._next_id += take
+            return ids
+
+
+live_data_ids = LiveDataIdAllocator()
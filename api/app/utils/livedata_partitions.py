@@ -0,0 +1,124 @@
+"""
+LiveData Partition Management
+
+`livedata` is range-partitioned by month on "timestamp" (migration
+h8i9j0k1l2m3). Monthly partitions are named livedata_yYYYYmMM; rows whose
+timestamp is NULL (corrupt RTC) or outside every monthly range land in
+livedata_default.
+
+These helpers create upcoming partitions ahead of time and detach/drop old
+ones for retention. They are used by scripts/manage_livedata_partitions.py.
+"""
+
+from datetime import date
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+PARENT_TABLE = "livedata"
+DEFAULT_PARTITION = "livedata_default"
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(day: date, months: int) -> date:
+    month_index = day.year * 12 + (day.month - 1) + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def list_partitions(conn: Connection) -> List[Tuple[str, date]]:
+    """Return (partition_name, month_start) for every monthly partition, oldest first"""
+    rows = conn.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+        JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+        WHERE parent.relname = :parent
+    """), {"parent": PARENT_TABLE}).scalars().all()
+
+    partitions = []
+    prefix = f"{PARENT_TABLE}_y"
+    for name in rows:
+        if not name.startswith(prefix):
+            continue
+        try:
+            year, month = name[len(prefix):].split("m")
+            partitions.append((name, date(int(year), int(month), 1)))
+        except ValueError:
+            continue
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_month_partition(conn: Connection, month: date) -> bool:
+    """
+    Create the partition for `month` if it does not exist yet.
+
+    Rows for that month that already fell into the default partition are
+    moved into the new partition before it is attached, otherwise ATTACH
+    would fail the default partition's constraint check.
+
+    Returns True if a partition was created.
+    """
+    name = partition_name(month)
+    exists = conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()
+    if exists:
+        return False
+
+    lower = month.isoformat()
+    upper = add_months(month, 1).isoformat()
+
+    conn.execute(text(f'CREATE TABLE "{name}" (LIKE {PARENT_TABLE} INCLUDING DEFAULTS)'))
+    conn.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION}
+            WHERE "timestamp" >= '{lower}' AND "timestamp" < '{upper}'
+            RETURNING *
+        )
+        INSERT INTO "{name}" SELECT * FROM moved
+    """))
+    conn.execute(text(
+        f"""ALTER TABLE {PARENT_TABLE} ATTACH PARTITION "{name}" FOR VALUES FROM ('{lower}') TO ('{upper}')"""
+    ))
+    return True
+
+
+def ensure_partitions(conn: Connection, months_ahead: int = 3, today: date = None) -> List[str]:
+    """
+    Make sure partitions exist from the current month through `months_ahead`
+    months in the future.
+
+    Returns names of the partitions that were created.
+    """
+    current = month_start(today or date.today())
+    created = []
+    for offset in range(0, months_ahead + 1):
+        month = add_months(current, offset)
+        if create_month_partition(conn, month):
+            created.append(partition_name(month))
+    return created
+
+
+def expire_partitions(conn: Connection, retention_months: int, drop: bool = True, today: date = None) -> List[str]:
+    """
+    Detach (and by default drop) monthly partitions whose whole month is older
+    than `retention_months` months before the current month.
+
+    Returns names of the partitions that were detached.
+    """
+    cutoff = add_months(month_start(today or date.today()), -retention_months)
+    expired = []
+    for name, month in list_partitions(conn):
+        if month >= cutoff:
+            continue
+        conn.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{name}"'))
+        if drop:
+            conn.execute(text(f'DROP TABLE "{name}"'))
+        expired.append(name)
+    return expired
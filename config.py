@@ -12,6 +12,34 @@ DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 USER_TOKEN_EXPIRE_HOURS = int(os.getenv("USER_TOKEN_EXPIRE_HOURS", "24"))
 BATTERY_TOKEN_EXPIRE_HOURS = int(os.getenv("BATTERY_TOKEN_EXPIRE_HOURS", "24"))
 BATTERY_SECRET_KEY = os.getenv("BATTERY_SECRET_KEY", "your-secret-key-change-this-in-production")
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))  # Users' hub access cached per worker for this long (0 disables)
+BATTERY_CREDENTIAL_CACHE_TTL_SECONDS = int(os.getenv("BATTERY_CREDENTIAL_CACHE_TTL_SECONDS", "300"))  # Battery secrets cached per worker for battery-login (0 disables)
+HUB_SUMMARY_CACHE_TTL_SECONDS = int(os.getenv("HUB_SUMMARY_CACHE_TTL_SECONDS", "30"))  # /analytics/hub-summary counts cached per worker for this long (0 disables)
 
 # Webhook logging configuration
-WEBHOOK_LOG_LIMIT = int(os.getenv("WEBHOOK_LOG_LIMIT", "100"))  # Keep last N webhook logs (default: 100, set to 200 or any number)
\ No newline at end of file
+WEBHOOK_LOG_LIMIT = int(os.getenv("WEBHOOK_LOG_LIMIT", "100"))  # Keep last N webhook logs (default: 100, set to 200 or any number)
+WEBHOOK_LOG_FLUSH_INTERVAL_MS = int(os.getenv("WEBHOOK_LOG_FLUSH_INTERVAL_MS", "1000"))  # Buffered log entries are written at least this often
+WEBHOOK_LOG_PRUNE_INTERVAL_SECONDS = int(os.getenv("WEBHOOK_LOG_PRUNE_INTERVAL_SECONDS", "60"))  # How often logs beyond WEBHOOK_LOG_LIMIT are deleted
+
+# Battery error notifications
+BATTERY_ERROR_FLUSH_INTERVAL_MS = int(os.getenv("BATTERY_ERROR_FLUSH_INTERVAL_MS", "1000"))  # New error notifications are inserted in batches this often
+BATTERY_ERROR_STATE_TTL_SECONDS = int(os.getenv("BATTERY_ERROR_STATE_TTL_SECONDS", "300"))  # How long a worker trusts its record of already-notified error codes
+
+# Live data ingestion configuration
+# "sync" writes each reading inside the request; "queued" hands it to a background writer that batches inserts
+LIVE_DATA_INGEST_MODE = os.getenv("LIVE_DATA_INGEST_MODE", "sync").lower()
+LIVE_DATA_FLUSH_ROWS = int(os.getenv("LIVE_DATA_FLUSH_ROWS", "200"))  # Flush once this many rows are queued
+LIVE_DATA_FLUSH_INTERVAL_MS = int(os.getenv("LIVE_DATA_FLUSH_INTERVAL_MS", "500"))  # ...or this long after the first queued row
+LIVE_DATA_QUEUE_MAX = int(os.getenv("LIVE_DATA_QUEUE_MAX", "10000"))  # Beyond this, readings fall back to synchronous writes
+BATCH_LIVE_DATA_MAX_ENTRIES = int(os.getenv("BATCH_LIVE_DATA_MAX_ENTRIES", "5000"))  # Max SD-card entries per /webhook/batch-live-data request
+
+# Request concurrency
+# Sync route handlers (all DB work) run in a threadpool of this many threads per worker.
+# Unset: sized to the worker's DB pool (DB_POOL_SIZE + DB_MAX_OVERFLOW, minus the
+# background writer threads), so handlers don't queue on the pool until DB_POOL_TIMEOUT
+API_THREADPOOL_SIZE = int(os.getenv("API_THREADPOOL_SIZE") or 0) or None
+ANALYTICS_MAX_CONCURRENCY = int(os.getenv("ANALYTICS_MAX_CONCURRENCY", "4"))  # /analytics/* requests allowed to run at once per worker
+
+# Offline sync (/sync/changes)
+SYNC_CHANGES_PAGE_SIZE = int(os.getenv("SYNC_CHANGES_PAGE_SIZE", "1000"))  # Max changes per response
+SYNC_CHANGE_LOG_RETENTION_DAYS = int(os.getenv("SYNC_CHANGE_LOG_RETENTION_DAYS", "30"))  # Older change_log rows are pruned; older cursors must re-sync in full
@@ -1,7 +1,8 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import NullPool, QueuePool
 import os
+import threading
 from models import Base
 
 from dotenv import load_dotenv
@@ -16,13 +17,107 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-# Create engine with connection pooling disabled for Heroku
+# Connection pooling
+# DB_POOL_MODE:
+#   queue     - each process keeps a QueuePool of open connections (default, Docker)
+#   pgbouncer - DATABASE_URL points at PgBouncer in transaction mode; keep a small
+#               local pool of cheap client connections and let PgBouncer check
+#               server connections, so pre-ping is off unless explicitly enabled
+#   null      - no pooling, a fresh connection per session (Heroku)
+#
+# Every API worker process has its own pool, shared with its background writer
+# threads (live-data ingest queue, audit log, battery errors), so a deployment
+# can open workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections. With the
+# production `uvicorn --workers 4` and the defaults that is 4 x (5 + 5) = 40,
+# leaving room under Postgres's default max_connections=100 for the Panel
+# dashboard (PANEL_DB_POOL_SIZE x 2 per process), cron scripts (one each) and
+# admin sessions. Raise the pool only together with max_connections, or use
+# pgbouncer mode.
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "queue").lower()
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))  # Connections kept open per worker process
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))  # Extra connections per worker allowed under burst load
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Reconnect connections older than this (seconds)
+DB_POOL_PRE_PING = os.getenv(
+    "DB_POOL_PRE_PING", "false" if DB_POOL_MODE == "pgbouncer" else "true"
+).lower() == "true"
+
+
+def pool_capacity():
+    """Most connections this process can hold at once (None without pooling)"""
+    if DB_POOL_MODE == "null":
+        return None
+    return DB_POOL_SIZE + DB_MAX_OVERFLOW
+
+
+def _engine_options() -> dict:
+    if DB_POOL_MODE == "null":
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": QueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
 engine = create_engine(
     DATABASE_URL,
-    poolclass=NullPool,  # Disable connection pooling for Heroku
-    echo=False  # Set to True for SQL query logging
+    echo=False,  # Set to True for SQL query logging
+    **_engine_options()
 )
 
+# Connection churn counters, reported by pool_stats()
+_pool_counters = {"connections_opened": 0, "checkouts": 0, "invalidated": 0}
+_pool_counters_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _pool_counters_lock:
+        _pool_counters[name] += 1
+
+
+@event.listens_for(engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    _count("connections_opened")
+
+
+@event.listens_for(engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    _count("checkouts")
+
+
+@event.listens_for(engine, "invalidate")
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    _count("invalidated")
+
+
+def pool_stats() -> dict:
+    """Current pool occupancy and connection churn for this process"""
+    pool = engine.pool
+    with _pool_counters_lock:
+        counters = dict(_pool_counters)
+
+    stats = {
+        "mode": DB_POOL_MODE,
+        "pool_class": type(pool).__name__,
+        **counters,
+    }
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "pool_size": pool.size(),
+            "max_overflow": DB_MAX_OVERFLOW,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pre_ping": DB_POOL_PRE_PING,
+        })
+    return stats
+
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -36,4 +131,4 @@ def get_db():
 
 # Create all tables
 def init_db():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
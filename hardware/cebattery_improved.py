@@ -58,6 +58,10 @@ import json
 # 10. ✅ GPS Reading Protection - Limited iterations to prevent I2C blocking (lines 567-580)
 #     Prevents blocking if GPS I2C communication hangs
 #
+# 11. ✅ Access Token Cache - Token and expiry persisted to TOKEN_CACHE_FILE
+#     Readings reuse the token instead of calling /auth/battery-login each time;
+#     it is renewed via /auth/battery-refresh only near expiry
+#
 # NEW CONSTANTS:
 # - HTTP_TIMEOUT_SECONDS = 30 (line 52)
 # - MAX_UART_FLUSH_ITERATIONS = 10 (line 55)
@@ -68,6 +72,8 @@ import json
 # NEW METHODS:
 # - feedWatchdog() - Feed watchdog timer (line 318)
 # - resetLteModem() - Power cycle modem (line 326)
+# - getAccessToken() / loginForToken() - Cached token, refresh near expiry
+# - loadCachedToken() / saveCachedToken() / clearCachedToken() - Flash token cache
 #
 # NEW STATE TRACKING:
 # - consecutiveInternetFailures (line 183)
@@ -115,6 +121,14 @@ WATCHDOG_TIMEOUT_MS = 120000  # 2 minutes
 # Limits GPS update attempts to prevent hanging if I2C communication fails
 MAX_GPS_UPDATE_ITERATIONS = 5
 
+# NEW: Access token cache (persisted to flash so it survives deep sleep)
+# The token is reused until it is within TOKEN_REFRESH_MARGIN_SECONDS of expiry,
+# then renewed via /auth/battery-refresh (falling back to /auth/battery-login)
+TOKEN_CACHE_FILE = "/token.json"
+TOKEN_REFRESH_MARGIN_SECONDS = 3600  # 1 hour
+
+API_BASE_URL = 'https://api.beppp.cloud'
+
 ###############################################################################
 
 ###############################################################################
@@ -192,6 +206,9 @@ class Battery:
         self.rtcTime = ""
         self.rtcError = False
 
+        self.accessToken = None
+        self.accessTokenExpiry = 0  # RTC seconds, see rtcSeconds()
+
         self.chargeCurrent = 0.0
         self.chargeVoltage = 0.0
         self.chargePower = 0.0
@@ -808,6 +825,107 @@ class Battery:
             if RAISE_EXCEPTIONS:
                 raise
 
+    ###########################################################################
+    # NEW METHODS: Access token cache
+    # Previously every reading cost two requests (battery-login + live-data).
+    # The token and its expiry are now kept in memory and in TOKEN_CACHE_FILE
+    # on flash, so a reading only needs the live-data request until the token
+    # is close to expiry. Expiry is tracked in RTC seconds because ticks_ms
+    # restarts on every wake.
+    ###########################################################################
+    def rtcSeconds(self):
+        if self.rtc is None:
+            return None
+        try:
+            n = self.rtc.get_time()
+            return time.mktime((n[0], n[1], n[2], n[3], n[4], n[5], 0, 0))
+        except Exception as E:
+            print("ERROR: Failed to read RTC for token expiry:", str(E))
+            return None
+
+    def loadCachedToken(self):
+        if self.accessToken is not None:
+            return
+        try:
+            with open(TOKEN_CACHE_FILE, "r") as f:
+                cached = json.load(f)
+            if cached.get("battery_id") == str(BATTERY_ID):
+                self.accessToken = cached["access_token"]
+                self.accessTokenExpiry = cached["expires_at"]
+        except OSError:
+            pass  # no cached token yet
+        except Exception as E:
+            print("WARNING: Ignoring unreadable token cache:", str(E))
+
+    def saveCachedToken(self, tokenResponse):
+        self.accessToken = tokenResponse['access_token']
+        now = self.rtcSeconds()
+        if now is None:
+            # Without a clock the expiry is unknown, so don't persist it
+            self.accessTokenExpiry = 0
+            return
+        self.accessTokenExpiry = now + int(tokenResponse.get('expires_in', 0))
+        try:
+            with open(TOKEN_CACHE_FILE, "w") as f:
+                json.dump({
+                    "battery_id": str(BATTERY_ID),
+                    "access_token": self.accessToken,
+                    "expires_at": self.accessTokenExpiry
+                }, f)
+        except Exception as E:
+            print("WARNING: Failed to save token cache:", str(E))
+
+    def clearCachedToken(self):
+        self.accessToken = None
+        self.accessTokenExpiry = 0
+        try:
+            uos.remove(TOKEN_CACHE_FILE)
+        except OSError:
+            pass
+
+    def loginForToken(self):
+        request = requests.post(
+            API_BASE_URL + '/auth/battery-login',
+            json={'battery_id': BATTERY_ID, 'battery_secret': BATTERY_KEY},
+            timeout=HTTP_TIMEOUT_SECONDS
+        )
+        if request.status_code != 200:
+            raise Exception("battery-login returned {}".format(request.status_code))
+        self.saveCachedToken(request.json())
+        print("logged in, access token:", self.accessToken[:20] + "...")
+        return self.accessToken
+
+    def getAccessToken(self):
+        """
+        Return a usable access token, making at most one request:
+        - cached token with more than TOKEN_REFRESH_MARGIN_SECONDS left: none
+        - cached token close to expiry: /auth/battery-refresh
+        - no token, expired token, failed refresh or no RTC: /auth/battery-login
+        """
+        self.loadCachedToken()
+        now = self.rtcSeconds()
+        if self.accessToken is not None and now is not None:
+            remaining = self.accessTokenExpiry - now
+            if remaining > TOKEN_REFRESH_MARGIN_SECONDS:
+                print("using cached access token ({}s left)".format(remaining))
+                return self.accessToken
+            if remaining > 0:
+                print("refresh access token ({}s left)".format(remaining))
+                try:
+                    request = requests.post(
+                        API_BASE_URL + '/auth/battery-refresh',
+                        headers={'Authorization': 'Bearer ' + self.accessToken},
+                        timeout=HTTP_TIMEOUT_SECONDS
+                    )
+                    if request.status_code == 200:
+                        self.saveCachedToken(request.json())
+                        return self.accessToken
+                    print("token refresh returned {}, logging in".format(request.status_code))
+                except Exception as E:
+                    print("ERROR: Token refresh failed, logging in:", str(E))
+                self.feedWatchdog()
+        return self.loginForToken()
+
     def logDataToInternet(self):
         """
         IMPROVED VERSION with ALL CRITICAL FIXES:
@@ -901,21 +1019,16 @@ class Battery:
             self.feedWatchdog()
 
             ###################################################################
-            # IMPROVED: Get token WITH TIMEOUT (ISSUE #1 - CRITICAL)
-            # Original: request = requests.post(...) with NO timeout
-            # Could hang forever if server doesn't respond
-            # Now: timeout=HTTP_TIMEOUT_SECONDS (30s)
+            # IMPROVED: Get token from the cache (see getAccessToken)
+            # Original: /auth/battery-login before every reading, with no
+            # timeout. Now a cached token is reused until it nears expiry,
+            # so most readings only make the live-data request.
+            # All token requests use timeout=HTTP_TIMEOUT_SECONDS (30s)
             ###################################################################
             print("get token")
             time.sleep(2)
             try:
-                request = requests.post(
-                    'https://api.beppp.cloud/auth/battery-login',
-                    json={'battery_id': BATTERY_ID, 'battery_secret': BATTERY_KEY},
-                    timeout=HTTP_TIMEOUT_SECONDS  # NEW: 30 second timeout
-                )
-                access_token = request.json()['access_token']
-                print("success, access token:", access_token[:20] + "...")
+                access_token = self.getAccessToken()
             except Exception as E:
                 print("ERROR: Failed to get access token:", str(E))  # NEW: Better error logging
                 raise
@@ -955,11 +1068,25 @@ class Battery:
 
             try:
                 request = requests.post(
-                    'https://api.beppp.cloud/webhook/live-data',
+                    API_BASE_URL + '/webhook/live-data',
                     json=data,
                     headers=headers,
                     timeout=HTTP_TIMEOUT_SECONDS  # NEW: 30 second timeout
                 )
+                if request.status_code == 401:
+                    # Cached token was rejected (secret changed, server key
+                    # rotated...): log in again and retry once
+                    print("token rejected, logging in again")
+                    self.clearCachedToken()
+                    self.feedWatchdog()
+                    headers = {'Authorization': 'Bearer ' + self.loginForToken()}
+                    self.feedWatchdog()
+                    request = requests.post(
+                        API_BASE_URL + '/webhook/live-data',
+                        json=data,
+                        headers=headers,
+                        timeout=HTTP_TIMEOUT_SECONDS
+                    )
                 print("data sent, results:", request.json())
             except Exception as E:
                 print("ERROR: Failed to send data:", str(E))  # NEW: Better error logging
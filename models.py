@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, BigInteger, String, Float, DateTime, ForeignKey, Table, Integer, func, Boolean, Text, Enum, Numeric
+from sqlalchemy import create_engine, Column, BigInteger, String, Float, DateTime, ForeignKey, Table, Integer, func, Boolean, Text, Enum, Numeric, Sequence, Index, Computed, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker, backref
 from datetime import datetime
@@ -193,7 +193,8 @@ class ProductiveUseEquipment(Base):
 class LiveData(Base):
     __tablename__ = 'livedata'
 
-    id = Column(BigInteger, primary_key=True)
+    # hi/lo block sequence: the API reserves 100 IDs per nextval() (see api/app/utils/live_data_ids.py)
+    id = Column(BigInteger, Sequence('livedata_id_seq', increment=100), primary_key=True)
     battery_id = Column(String(50), ForeignKey('bepppbattery.battery_id'))
     state_of_charge = Column(BigInteger)
     voltage = Column(Float)
@@ -242,6 +243,137 @@ class LiveData(Base):
     # Relations
     battery = relationship("BEPPPBattery", back_populates="live_data")
 
+    # In PostgreSQL the table is range-partitioned by month on "timestamp"
+    # (migration h8i9j0k1l2m3, maintained by scripts/manage_livedata_partitions.py).
+    # The database enforces uniqueness with ix_livedata_id_timestamp rather than a
+    # primary key, because partition keys must be part of every unique constraint.
+    __table_args__ = (
+        Index('ix_livedata_id_timestamp', id, timestamp, unique=True),
+        Index('ix_livedata_battery_id_timestamp', battery_id, timestamp.desc()),
+        Index('ix_livedata_created_at_brin', created_at, postgresql_using='brin'),
+    )
+
+class LiveDataHourly(Base):
+    """Hourly per-battery LiveData rollup (see api/app/services/livedata_rollups.py)"""
+    __tablename__ = 'livedata_hourly'
+
+    battery_id = Column(String(50), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  # date_trunc('hour', timestamp)
+    sample_count = Column(Integer, nullable=False, default=0)
+    power_watts_count = Column(Integer, nullable=False, default=0)
+    power_watts_sum = Column(Float)
+    power_watts_min = Column(Float)
+    power_watts_max = Column(Float)
+    power_watts_mean = Column(Float, Computed('power_watts_sum / NULLIF(power_watts_count, 0)'))
+    state_of_charge_count = Column(Integer, nullable=False, default=0)
+    state_of_charge_sum = Column(Float)
+    state_of_charge_min = Column(Float)
+    state_of_charge_max = Column(Float)
+    state_of_charge_mean = Column(Float, Computed('state_of_charge_sum / NULLIF(state_of_charge_count, 0)'))
+    voltage_count = Column(Integer, nullable=False, default=0)
+    voltage_sum = Column(Float)
+    voltage_min = Column(Float)
+    voltage_max = Column(Float)
+    voltage_mean = Column(Float, Computed('voltage_sum / NULLIF(voltage_count, 0)'))
+    current_amps_count = Column(Integer, nullable=False, default=0)
+    current_amps_sum = Column(Float)
+    current_amps_min = Column(Float)
+    current_amps_max = Column(Float)
+    current_amps_mean = Column(Float, Computed('current_amps_sum / NULLIF(current_amps_count, 0)'))
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_livedata_hourly_bucket', bucket),
+    )
+
+class LiveDataDaily(Base):
+    """Daily per-battery LiveData rollup, built from livedata_hourly"""
+    __tablename__ = 'livedata_daily'
+
+    battery_id = Column(String(50), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  # date_trunc('day', timestamp)
+    sample_count = Column(Integer, nullable=False, default=0)
+    power_watts_count = Column(Integer, nullable=False, default=0)
+    power_watts_sum = Column(Float)
+    power_watts_min = Column(Float)
+    power_watts_max = Column(Float)
+    power_watts_mean = Column(Float, Computed('power_watts_sum / NULLIF(power_watts_count, 0)'))
+    state_of_charge_count = Column(Integer, nullable=False, default=0)
+    state_of_charge_sum = Column(Float)
+    state_of_charge_min = Column(Float)
+    state_of_charge_max = Column(Float)
+    state_of_charge_mean = Column(Float, Computed('state_of_charge_sum / NULLIF(state_of_charge_count, 0)'))
+    voltage_count = Column(Integer, nullable=False, default=0)
+    voltage_sum = Column(Float)
+    voltage_min = Column(Float)
+    voltage_max = Column(Float)
+    voltage_mean = Column(Float, Computed('voltage_sum / NULLIF(voltage_count, 0)'))
+    current_amps_count = Column(Integer, nullable=False, default=0)
+    current_amps_sum = Column(Float)
+    current_amps_min = Column(Float)
+    current_amps_max = Column(Float)
+    current_amps_mean = Column(Float, Computed('current_amps_sum / NULLIF(current_amps_count, 0)'))
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_livedata_daily_bucket', bucket),
+    )
+
+class BatteryLatestState(Base):
+    """
+    Newest telemetry per battery, upserted as LiveData is ingested
+    (see api/app/services/battery_state.py)
+    """
+    __tablename__ = 'battery_latest_state'
+
+    battery_id = Column(String(50), ForeignKey('bepppbattery.battery_id', ondelete='CASCADE'), primary_key=True)
+    livedata_id = Column(BigInteger, nullable=True)
+    reading_at = Column(DateTime, nullable=True)  # timestamp of the newest reading
+    voltage = Column(Float, nullable=True)
+    current_amps = Column(Float, nullable=True)
+    power_watts = Column(Float, nullable=True)
+    amp_hours_consumed = Column(Float, nullable=True)
+    err = Column(String(255), nullable=True)
+    reading = Column(Text, nullable=True)  # JSON of the full newest LiveData row
+
+    # Last known values; kept when newer readings don't carry them
+    last_soc = Column(BigInteger, nullable=True)
+    last_soc_at = Column(DateTime, nullable=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    gps_at = Column(DateTime, nullable=True)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+class RollupWatermark(Base):
+    """High-water mark (on livedata.created_at) up to which a rollup has been refreshed"""
+    __tablename__ = 'rollup_watermarks'
+
+    name = Column(String(100), primary_key=True)
+    watermark = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ChangeLog(Base):
+    """
+    Row-level change feed for GET /sync/changes, written by the
+    record_sync_change() trigger (migration j0k1l2m3n4o5), never by the ORM
+    """
+    __tablename__ = 'change_log'
+
+    change_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    txid = Column(BigInteger, server_default=text('txid_current()'), nullable=False)  # Writing transaction
+    entity = Column(String(50), nullable=False)  # 'user', 'battery', 'pue', 'battery_rental', 'pue_rental', 'notification'
+    entity_id = Column(String(100), nullable=False)
+    hub_id = Column(BigInteger, nullable=True)
+    op = Column(String(10), nullable=False)  # 'upsert' or 'delete'
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('ix_change_log_txid_change_id', 'txid', 'change_id'),
+        Index('ix_change_log_hub_txid_change_id', 'hub_id', 'txid', 'change_id'),
+        Index('ix_change_log_created_at', 'created_at'),
+    )
+
 class Rental(Base):
     __tablename__ = 'rental'
     
@@ -335,8 +467,8 @@ class PUERental(Base):
     __tablename__ = 'puerental'
 
     pue_rental_id = Column(BigInteger, primary_key=True)
-    pue_id = Column(String(50), ForeignKey('productiveuseequipment.pue_id'))
-    user_id = Column(BigInteger, ForeignKey('user.user_id'))
+    pue_id = Column(String(50), ForeignKey('productiveuseequipment.pue_id'), index=True)
+    user_id = Column(BigInteger, ForeignKey('user.user_id'), index=True)
     timestamp_taken = Column(DateTime)
     due_back = Column(DateTime)
     date_returned = Column(DateTime, nullable=True)
@@ -852,6 +984,10 @@ class Notification(Base):
     # Relationships
     hub = relationship("SolarHub", foreign_keys=[hub_id])
 
+    __table_args__ = (
+        Index('ix_notifications_hub_type_link', 'hub_id', 'notification_type', 'link_id'),
+    )
+
 
 class CustomerFieldOption(Base):
     """Configurable options for customer data fields (GESI status, Business Category, Signup Reasons)"""
@@ -951,7 +1087,7 @@ class BatteryRental(Base):
     __tablename__ = 'battery_rentals'
 
     rental_id = Column(BigInteger, primary_key=True, autoincrement=True)
-    user_id = Column(BigInteger, ForeignKey('user.user_id', ondelete='CASCADE'), nullable=False)
+    user_id = Column(BigInteger, ForeignKey('user.user_id', ondelete='CASCADE'), nullable=False, index=True)
     hub_id = Column(BigInteger, ForeignKey('solarhub.hub_id', ondelete='CASCADE'), nullable=False)
 
     # Rental period
@@ -1012,8 +1148,8 @@ class BatteryRentalItem(Base):
     __tablename__ = 'battery_rental_items'
 
     item_id = Column(BigInteger, primary_key=True, autoincrement=True)
-    rental_id = Column(BigInteger, ForeignKey('battery_rentals.rental_id', ondelete='CASCADE'), nullable=False)
-    battery_id = Column(String(50), ForeignKey('bepppbattery.battery_id', ondelete='CASCADE'), nullable=False)
+    rental_id = Column(BigInteger, ForeignKey('battery_rentals.rental_id', ondelete='CASCADE'), nullable=False, index=True)
+    battery_id = Column(String(50), ForeignKey('bepppbattery.battery_id', ondelete='CASCADE'), nullable=False, index=True)
 
     # Item-specific tracking
     condition_at_checkout = Column(String(50), nullable=True)  # good, fair, damaged
@@ -1034,6 +1170,31 @@ class BatteryRentalItem(Base):
     battery = relationship("BEPPPBattery")
 
 
+class RentalUsageFact(Base):
+    """
+    Battery usage summary of one battery rental, maintained by
+    api/app/services/rental_usage.py. Power stats are discharge magnitudes (W).
+    """
+    __tablename__ = 'rental_usage_facts'
+
+    rental_id = Column(BigInteger, ForeignKey('battery_rentals.rental_id', ondelete='CASCADE'), primary_key=True)
+    point_count = Column(Integer, nullable=False, default=0)  # LiveData points during the rental
+    discharge_point_count = Column(Integer, nullable=False, default=0)  # Points with power_watts < 0
+    discharge_sum_w = Column(Float, nullable=True)
+    discharge_sumsq_w = Column(Float, nullable=True)
+    power_mean_w = Column(Float, nullable=True)
+    power_median_w = Column(Float, nullable=True)
+    power_max_w = Column(Float, nullable=True)
+    power_min_w = Column(Float, nullable=True)
+    power_sd_w = Column(Float, nullable=True)
+    wh_discharged = Column(Float, nullable=True)  # NULL with fewer than 2 points
+    active_hours = Column(Float, nullable=False, default=0)  # Hours spent discharging
+    first_point_at = Column(DateTime, nullable=True)
+    last_point_at = Column(DateTime, nullable=True)
+    is_final = Column(Boolean, nullable=False, default=False)  # Rental returned / cancelled when computed
+    computed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
 class PUEPayToOwnLedger(Base):
     """Separate tracking for pay-to-own progress"""
     __tablename__ = 'pue_pay_to_own_ledger'
@@ -13,10 +13,21 @@ import param
 from datetime import datetime, timedelta
 import hvplot.pandas
 import holoviews as hv
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 import jwt
 from functools import wraps
 import os
+import sys
+
+# Panel runs this script per session; dashboard_data is imported once per process
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from dashboard_data import (
+    LIVE_TAIL_OVERLAP, PANEL_CACHE_TTL_SECONDS, PANEL_LIVE_POLL_SECONDS, PANEL_TARGET_POINTS, TIME_SCALES,
+    SeriesFilters, battery_options, database_now, downsample, empty_series, get_engine, hub_options,
+    load_bucketed_series, load_series_tail, pue_item_options, pue_type_options,
+)
+from bokeh.models import ColumnDataSource
+from bokeh.plotting import figure
 
 
 # Enable Panel extensions with Material Design theme
@@ -50,9 +61,6 @@ pn.config.raw_css.append("""
 SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
 ALGORITHM = os.getenv('ALGORITHM', 'HS256')
 
-# Database connection
-DATABASE_URL = os.getenv('DATABASE_URL', 'postgresql://beppp:changeme@db:5432/beppp')
-
 def verify_token(token: str) -> dict:
     """Verify JWT token and return payload"""
     try:
@@ -100,22 +108,36 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
     # Single battery selection for detailed view
     selected_single_battery = param.Selector(default=None, label="Select Battery for Detailed View")
 
+    # Live mode: append newly ingested readings without re-reading the window
+    live_mode = param.Boolean(default=False, label="Live updates")
+
+    # Columns kept in the live plot's ColumnDataSource
+    live_columns = ['power_watts', 'state_of_charge']
+
     # Mapping from display labels to pandas time codes
     aggregation_mapping = {
-        '30 Minutes': '30T',
-        '1 Hour': '1H',
-        '2 Hours': '2H',
-        '3 Hours': '3H',
-        '6 Hours': '6H',
-        '12 Hours': '12H',
+        '30 Minutes': '30min',
+        '1 Hour': '1h',
+        '2 Hours': '2h',
+        '3 Hours': '3h',
+        '6 Hours': '6h',
+        '12 Hours': '12h',
         '1 Day': '1D'
     }
 
     def __init__(self, **params):
         super().__init__(**params)
-        self.engine = create_engine(DATABASE_URL)
+        self.engine = get_engine()
         self.data = None
 
+        # Live mode state (see live_view / poll_live)
+        self._live_source = None
+        self._live_callback = None
+        self._live_watermark = None
+        self._live_filters = None
+        self._live_interval = None
+        self._live_rollover = None
+
         # Load all available options for multi-select
         self.hub_options = self.load_hub_options()
         self.battery_options = self.load_all_battery_options()
@@ -155,18 +177,9 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
         print(f"DEBUG: Update complete! New update_trigger: {self.update_trigger}", flush=True)
 
     def load_hub_options(self):
-        """Load available hubs"""
+        """Load available hubs (shared by every session, see dashboard_data.py)"""
         try:
-            query = text("""
-                SELECT hub_id, what_three_word_location as hub_name
-                FROM solarhub
-                ORDER BY hub_id
-            """)
-
-            with self.engine.connect() as conn:
-                result = conn.execute(query)
-                return [{'hub_id': row.hub_id, 'hub_name': row.hub_name}
-                        for row in result]
+            return hub_options()
         except Exception as e:
             print(f"Error loading hubs: {e}")
             return []
@@ -174,23 +187,7 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
     def load_all_battery_options(self):
         """Load all batteries with capacity information"""
         try:
-            query = text("""
-                SELECT
-                    battery_id,
-                    hub_id,
-                    battery_capacity_wh,
-                    status
-                FROM bepppbattery
-                ORDER BY battery_id
-            """)
-
-            with self.engine.connect() as conn:
-                result = conn.execute(query)
-                return [{'battery_id': row.battery_id,
-                        'hub_id': row.hub_id,
-                        'capacity_wh': row.battery_capacity_wh or 0,
-                        'status': row.status}
-                        for row in result]
+            return battery_options()
         except Exception as e:
             print(f"Error loading batteries: {e}")
             import traceback
@@ -200,16 +197,8 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
     def load_pue_type_options(self):
         """Load distinct PUE types from rental_pue_item"""
         try:
-            query = text("""
-                SELECT DISTINCT pue.pue_type
-                FROM pue_item pue
-                WHERE pue.pue_type IS NOT NULL
-                ORDER BY pue.pue_type
-            """)
-
-            with self.engine.connect() as conn:
-                result = conn.execute(query)
-                return [row.pue_type for row in result if row.pue_type]
+            # Copied: widgets get this list and it is shared with other sessions
+            return list(pue_type_options())
         except Exception as e:
             print(f"Error loading PUE types: {e}")
             return []
@@ -217,25 +206,7 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
     def load_pue_item_options(self):
         """Load all PUE items"""
         try:
-            query = text("""
-                SELECT
-                    pue_item_id,
-                    pue_type,
-                    brand,
-                    model,
-                    wattage
-                FROM pue_item
-                ORDER BY pue_type, brand, model
-            """)
-
-            with self.engine.connect() as conn:
-                result = conn.execute(query)
-                return [{'pue_item_id': row.pue_item_id,
-                        'pue_type': row.pue_type,
-                        'brand': row.brand or '',
-                        'model': row.model or '',
-                        'wattage': row.wattage or 0}
-                        for row in result]
+            return pue_item_options()
         except Exception as e:
             print(f"Error loading PUE items: {e}")
             return []
@@ -329,131 +300,33 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
         delta = time_deltas.get(self.time_scale)
         return now - delta if delta else None
 
+    def current_filters(self, battery_ids):
+        """Filter state for the data layer (also its cache key)"""
+        use_capacity = self.min_capacity > 0 or self.max_capacity < 10000
+        return SeriesFilters(
+            battery_ids=tuple(sorted(battery_ids)),
+            time_scale=self.time_scale,
+            hub_ids=tuple(sorted(self.selected_hubs or ())),
+            min_capacity=self.min_capacity if use_capacity else None,
+            max_capacity=self.max_capacity if use_capacity else None,
+            pue_types=tuple(sorted(self.selected_pue_types or ())),
+            only_with_pue=self.filter_batteries_with_pue,
+        )
+
     def load_data(self):
-        """Load and aggregate data based on multi-select filters"""
+        """Load data aggregated into the selected interval for the multi-select filters"""
         try:
-            time_filter = self.get_time_filter()
-            where_clauses = []
-            params = {}
-
-            # Build WHERE clauses based on filters
-
-            # Hub filter
-            if self.selected_hubs and len(self.selected_hubs) > 0:
-                where_clauses.append("b.hub_id = ANY(:hub_ids)")
-                params['hub_ids'] = self.selected_hubs
-
-            # Battery filter - if no batteries selected, return empty data
-            print(f"DEBUG load_data: selected_batteries = {self.selected_batteries}", flush=True)
-            print(f"DEBUG load_data: selected_batteries type = {type(self.selected_batteries)}", flush=True)
             print(f"DEBUG load_data: selected_batteries length = {len(self.selected_batteries) if self.selected_batteries else 0}", flush=True)
 
             if not self.selected_batteries or len(self.selected_batteries) == 0:
-                # Set empty DataFrame when no batteries are selected
-                # Must match the structure of a query result to properly trigger empty state
+                # Empty frame with the usual columns triggers the empty state
                 print("DEBUG load_data: Setting empty DataFrame - no batteries selected", flush=True)
-                self.data = pd.DataFrame(columns=[
-                    'timestamp', 'state_of_charge', 'voltage', 'current_amps',
-                    'power_watts', 'temp_battery', 'charging_current', 'charger_power',
-                    'charger_voltage', 'usb_power', 'usb_voltage', 'amp_hours_consumed',
-                    'total_charge_consumed'
-                ])
-                print(f"DEBUG load_data: self.data is now empty: {self.data.empty}", flush=True)
-                print(f"DEBUG load_data: self.data shape: {self.data.shape}", flush=True)
-                print(f"DEBUG load_data: self.data columns: {list(self.data.columns)}", flush=True)
+                self.data = empty_series()
                 return
-            else:
-                where_clauses.append("ld.battery_id = ANY(:battery_ids)")
-                params['battery_ids'] = self.selected_batteries
-                print(f"DEBUG load_data: Filtering for battery IDs: {self.selected_batteries}", flush=True)
-
-            # Capacity range filter
-            if self.min_capacity > 0 or self.max_capacity < 10000:
-                where_clauses.append("b.battery_capacity_wh BETWEEN :min_cap AND :max_cap")
-                params['min_cap'] = self.min_capacity
-                params['max_cap'] = self.max_capacity
-
-            # PUE type filter - batteries that have rentals with specific PUE types
-            if self.selected_pue_types and len(self.selected_pue_types) > 0:
-                where_clauses.append("""
-                    EXISTS (
-                        SELECT 1 FROM rental r
-                        JOIN rental_pue_item rpi ON r.rentral_id = rpi.rental_id
-                        JOIN pue_item pue ON rpi.pue_item_id = pue.pue_item_id
-                        WHERE r.battery_id = ld.battery_id
-                        AND pue.pue_type = ANY(:pue_types)
-                    )
-                """)
-                params['pue_types'] = self.selected_pue_types
-
-            # Filter to only batteries with ANY PUE rentals
-            if self.filter_batteries_with_pue:
-                where_clauses.append("""
-                    EXISTS (
-                        SELECT 1 FROM rental r
-                        JOIN rental_pue_item rpi ON r.rentral_id = rpi.rental_id
-                        WHERE r.battery_id = ld.battery_id
-                    )
-                """)
-
-            # Time filter
-            if time_filter:
-                where_clauses.append("ld.timestamp >= :time_filter")
-                params['time_filter'] = time_filter
-
-            # Combine all WHERE clauses
-            where_clause = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
-
-            # Enhanced query with all data fields
-            query = text(f"""
-                SELECT
-                    ld.timestamp,
-                    AVG(ld.state_of_charge) as state_of_charge,
-                    AVG(ld.voltage) as voltage,
-                    SUM(ld.current_amps) as current_amps,
-                    SUM(ld.power_watts) as power_watts,
-                    AVG(ld.temp_battery) as temp_battery,
-                    SUM(ld.charging_current) as charging_current,
-                    SUM(ld.charger_power) as charger_power,
-                    AVG(ld.charger_voltage) as charger_voltage,
-                    SUM(ld.usb_power) as usb_power,
-                    AVG(ld.usb_voltage) as usb_voltage,
-                    SUM(ld.amp_hours_consumed) as amp_hours_consumed,
-                    SUM(ld.total_charge_consumed) as total_charge_consumed
-                FROM livedata ld
-                JOIN bepppbattery b ON ld.battery_id = b.battery_id
-                {where_clause}
-                GROUP BY ld.timestamp
-                ORDER BY ld.timestamp ASC
-            """)
-
-            # Load data
-            self.data = pd.read_sql(query, self.engine, params=params)
-
-            if not self.data.empty:
-                self.data['timestamp'] = pd.to_datetime(self.data['timestamp'])
-                self.data = self.data.set_index('timestamp')
-
-                # Apply aggregation interval (convert label to pandas time code)
-                interval_code = self.aggregation_mapping.get(self.aggregation_interval, '30T')
-                self.data = self.data.resample(interval_code).agg({
-                    'state_of_charge': 'mean',
-                    'voltage': 'mean',
-                    'current_amps': 'sum',
-                    'power_watts': 'sum',
-                    'temp_battery': 'mean',
-                    'charging_current': 'sum',
-                    'charger_power': 'sum',
-                    'charger_voltage': 'mean',
-                    'usb_power': 'sum',
-                    'usb_voltage': 'mean',
-                    'amp_hours_consumed': 'sum',
-                    'total_charge_consumed': 'sum'
-                })
-
-                # Fill missing values with forward fill then back fill
-                self.data = self.data.ffill().bfill()
 
+            # Bucketed in the database and cached per process (see dashboard_data.py)
+            interval_code = self.aggregation_mapping.get(self.aggregation_interval, '30min')
+            self.data = load_bucketed_series(self.current_filters(self.selected_batteries), interval_code)
             return self.data
 
         except Exception as e:
@@ -513,7 +386,7 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
         title_prefix = self.get_title_prefix()
         interval_label = self.aggregation_interval  # Already a display label
 
-        plot = self.data.hvplot.line(
+        plot = downsample(self.data, 'power_watts', method='minmax').hvplot.line(
             y='power_watts',
             title=f'{title_prefix} - Power Consumption ({interval_label} intervals)',
             ylabel='Power (W)',
@@ -547,7 +420,7 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
         title_prefix = self.get_title_prefix()
         interval_label = self.aggregation_interval  # Already a display label
 
-        plot = self.data.hvplot.area(
+        plot = downsample(self.data, 'state_of_charge').hvplot.area(
             y='state_of_charge',
             title=f'{title_prefix} - State of Charge ({interval_label} intervals)',
             ylabel='SOC (%)',
@@ -578,7 +451,7 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
         title_prefix = self.get_title_prefix()
         interval_label = self.aggregation_interval  # Already a display label
 
-        plot = self.data.hvplot.line(
+        plot = downsample(self.data, 'voltage').hvplot.line(
             y='voltage',
             title=f'{title_prefix} - Average Voltage ({interval_label} intervals)',
             ylabel='Voltage (V)',
@@ -606,7 +479,7 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
         title_prefix = self.get_title_prefix()
         interval_label = self.aggregation_interval
 
-        plot = self.data.hvplot.line(
+        plot = downsample(self.data, 'temp_battery').hvplot.line(
             y='temp_battery',
             title=f'{title_prefix} - Battery Temperature ({interval_label} intervals)',
             ylabel='Temperature (°C)',
@@ -635,7 +508,7 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
         interval_label = self.aggregation_interval
 
         # Overlay battery current and charging current
-        battery_current = self.data.hvplot.line(
+        battery_current = downsample(self.data, 'current_amps', method='minmax').hvplot.line(
             y='current_amps',
             label='Battery Current',
             ylabel='Current (A)',
@@ -647,7 +520,7 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
             grid=True
         )
 
-        charging_current = self.data.hvplot.line(
+        charging_current = downsample(self.data, 'charging_current', method='minmax').hvplot.line(
             y='charging_current',
             label='Charging Current',
             ylabel='Current (A)',
@@ -680,7 +553,7 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
         title_prefix = self.get_title_prefix()
         interval_label = self.aggregation_interval
 
-        plot = self.data.hvplot.line(
+        plot = downsample(self.data, 'usb_power', method='minmax').hvplot.line(
             y='usb_power',
             title=f'{title_prefix} - USB Power Consumption ({interval_label} intervals)',
             ylabel='USB Power (W)',
@@ -708,7 +581,7 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
         title_prefix = self.get_title_prefix()
         interval_label = self.aggregation_interval
 
-        plot = self.data.hvplot.line(
+        plot = downsample(self.data, 'charger_power', method='minmax').hvplot.line(
             y='charger_power',
             title=f'{title_prefix} - Charger Power Input ({interval_label} intervals)',
             ylabel='Charger Power (W)',
@@ -736,7 +609,7 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
         title_prefix = self.get_title_prefix()
         interval_label = self.aggregation_interval
 
-        plot = self.data.hvplot.line(
+        plot = downsample(self.data, 'amp_hours_consumed').hvplot.line(
             y='amp_hours_consumed',
             title=f'{title_prefix} - Amp Hours Consumed ({interval_label} intervals)',
             ylabel='Ah Consumed',
@@ -755,68 +628,106 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
             styles={'border': '1px solid #e0e0e0'}
         )
 
-    def load_single_battery_data(self, battery_id):
-        """Load data for a single battery without aggregation"""
-        if not battery_id:
-            return pd.DataFrame()
+    def _live_data(self, df):
+        """ColumnDataSource columns for the given bucketed rows"""
+        return {
+            'timestamp': list(df.index),
+            **{column: df[column].tolist() for column in self.live_columns},
+        }
 
-        try:
-            time_filter = self.get_time_filter()
-            params = {'battery_id': battery_id}
-            where_clauses = ["ld.battery_id = :battery_id"]
+    @param.depends('update_trigger')
+    def live_view(self):
+        """Live fleet power and SOC, extended in place by poll_live()"""
+        if self.data is None or self.data.empty:
+            self._live_source = None
+            return pn.pane.Markdown("### No data available - click Update Dashboard first")
+
+        interval_code = self.aggregation_mapping.get(self.aggregation_interval, '30min')
+        window = TIME_SCALES.get(self.time_scale)
+        window_buckets = int(window / pd.Timedelta(interval_code)) if window else len(self.data)
+        self._live_rollover = max(1, min(window_buckets, PANEL_TARGET_POINTS))
+        self._live_filters = self.current_filters(self.selected_batteries)
+        self._live_interval = interval_code
+        # self.data may come from the shared cache; anything ingested since is
+        # re-read by the first poll
+        self._live_watermark = database_now() - timedelta(seconds=PANEL_CACHE_TTL_SECONDS) - LIVE_TAIL_OVERLAP
+        self._live_source = ColumnDataSource(data=self._live_data(self.data.tail(self._live_rollover)))
+
+        power = figure(
+            title=f'{self.get_title_prefix()} - Power ({self.aggregation_interval} intervals)',
+            x_axis_type='datetime', y_axis_label='Power (W)', height=300, sizing_mode='stretch_width'
+        )
+        power.line('timestamp', 'power_watts', source=self._live_source, color='#FF9800', line_width=2)
 
-            if time_filter:
-                where_clauses.append("ld.timestamp >= :time_filter")
-                params['time_filter'] = time_filter
+        soc = figure(
+            title='State of Charge', x_axis_type='datetime', x_range=power.x_range,
+            y_axis_label='SOC (%)', y_range=(0, 100), height=300, sizing_mode='stretch_width'
+        )
+        soc.line('timestamp', 'state_of_charge', source=self._live_source, color='#4CAF50', line_width=2)
 
-            where_clause = "WHERE " + " AND ".join(where_clauses)
+        return pn.Column(
+            pn.pane.Bokeh(power, sizing_mode='stretch_width'),
+            pn.pane.Bokeh(soc, sizing_mode='stretch_width'),
+            sizing_mode='stretch_width'
+        )
 
-            query = text(f"""
-                SELECT
-                    ld.timestamp,
-                    ld.state_of_charge,
-                    ld.voltage,
-                    ld.current_amps,
-                    ld.power_watts,
-                    ld.temp_battery,
-                    ld.charging_current,
-                    ld.charger_power,
-                    ld.charger_voltage,
-                    ld.usb_power,
-                    ld.usb_voltage,
-                    ld.amp_hours_consumed,
-                    ld.total_charge_consumed
-                FROM livedata ld
-                {where_clause}
-                ORDER BY ld.timestamp ASC
-            """)
+    @param.depends('live_mode', watch=True)
+    def _toggle_live(self):
+        """Start or stop the periodic tail query"""
+        if self.live_mode and self._live_callback is None:
+            self._live_callback = pn.state.add_periodic_callback(
+                self.poll_live, period=PANEL_LIVE_POLL_SECONDS * 1000
+            )
+        elif not self.live_mode and self._live_callback is not None:
+            self._live_callback.stop()
+            self._live_callback = None
 
-            df = pd.read_sql(query, self.engine, params=params)
+    def poll_live(self):
+        """
+        Fetch buckets touched by readings ingested since the last poll:
+        buckets already plotted are patched, newer ones streamed (oldest
+        points roll off), older missing ones wait for the next Update.
+        """
+        source = self._live_source
+        if source is None:
+            return
 
-            if not df.empty:
-                df['timestamp'] = pd.to_datetime(df['timestamp'])
-                df = df.set_index('timestamp')
-
-                # Apply aggregation interval
-                interval_code = self.aggregation_mapping.get(self.aggregation_interval, '30T')
-                df = df.resample(interval_code).agg({
-                    'state_of_charge': 'mean',
-                    'voltage': 'mean',
-                    'current_amps': 'sum',
-                    'power_watts': 'sum',
-                    'temp_battery': 'mean',
-                    'charging_current': 'sum',
-                    'charger_power': 'sum',
-                    'charger_voltage': 'mean',
-                    'usb_power': 'sum',
-                    'usb_voltage': 'mean',
-                    'amp_hours_consumed': 'sum',
-                    'total_charge_consumed': 'sum'
-                })
+        try:
+            tail, last_created_at = load_series_tail(
+                self._live_filters, self._live_interval, self._live_watermark - LIVE_TAIL_OVERLAP
+            )
+        except Exception as e:
+            print(f"Error polling live data: {e}", flush=True)
+            return
+        if tail.empty:
+            return
+        self._live_watermark = max(self._live_watermark, last_created_at)
+
+        positions = {pd.Timestamp(ts): i for i, ts in enumerate(source.data['timestamp'])}
+        last_plotted = max(positions) if positions else None
+        patches = {column: [] for column in self.live_columns}
+        new_rows = []
+        for ts, row in tail.iterrows():
+            if ts in positions:
+                for column in self.live_columns:
+                    patches[column].append((positions[ts], row[column]))
+            elif last_plotted is None or ts > last_plotted:
+                new_rows.append(ts)
+
+        if any(patches.values()):
+            source.patch({column: changes for column, changes in patches.items() if changes})
+        if new_rows:
+            source.stream(self._live_data(tail.loc[new_rows]), rollover=self._live_rollover)
 
-                df = df.ffill().bfill()
+    def load_single_battery_data(self, battery_id):
+        """Load data for a single battery, aggregated into the selected interval"""
+        if not battery_id:
+            return pd.DataFrame()
 
-            return df
+        try:
+            filters = SeriesFilters(battery_ids=(battery_id,), time_scale=self.time_scale)
+            interval_code = self.aggregation_mapping.get(self.aggregation_interval, '30min')
+            return load_bucketed_series(filters, interval_code)
 
         except Exception as e:
             print(f"Error loading single battery data: {e}", flush=True)
@@ -838,7 +749,7 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
         import holoviews as hv
 
         # SOC plot
-        soc_plot = battery_data.hvplot.line(
+        soc_plot = downsample(battery_data, 'state_of_charge').hvplot.line(
             y='state_of_charge',
             label='SOC (%)',
             color='#4CAF50',
@@ -850,7 +761,7 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
         )
 
         # Power plot (consumption and charging)
-        power_plot = battery_data.hvplot.line(
+        power_plot = downsample(battery_data, 'power_watts', method='minmax').hvplot.line(
             y='power_watts',
             label='Power (W)',
             color='#FF9800',
@@ -861,7 +772,7 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
             grid=True
         )
 
-        charger_plot = battery_data.hvplot.line(
+        charger_plot = downsample(battery_data, 'charger_power', method='minmax').hvplot.line(
             y='charger_power',
             label='Charger (W)',
             color='#2196F3',
@@ -873,7 +784,7 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
         )
 
         # Voltage plot
-        voltage_plot = battery_data.hvplot.line(
+        voltage_plot = downsample(battery_data, 'voltage').hvplot.line(
             y='voltage',
             label='Voltage (V)',
             color='#9C27B0',
@@ -885,7 +796,7 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
         )
 
         # Current plot
-        current_plot = battery_data.hvplot.line(
+        current_plot = downsample(battery_data, 'current_amps', method='minmax').hvplot.line(
             y='current_amps',
             label='Current (A)',
             color='#00BCD4',
@@ -897,7 +808,7 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
         )
 
         # Temperature plot
-        temp_plot = battery_data.hvplot.line(
+        temp_plot = downsample(battery_data, 'temp_battery').hvplot.line(
             y='temp_battery',
             label='Temperature (°C)',
             color='#F44336',
@@ -909,7 +820,7 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
         )
 
         # USB Power
-        usb_plot = battery_data.hvplot.line(
+        usb_plot = downsample(battery_data, 'usb_power', method='minmax').hvplot.line(
             y='usb_power',
             label='USB Power (W)',
             color='#795548',
@@ -1399,6 +1310,20 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
             sizing_mode='stretch_width'
         )
 
+        live_info = pn.Card(
+            pn.pane.Markdown(f"""
+            **What this shows:** Fleet power (SUM) and State of Charge (MEAN) for the current filters, kept up to date while **Live updates** is on.
+
+            **How it works:** Every {PANEL_LIVE_POLL_SECONDS} seconds only readings received since the last check are fetched; their intervals are updated in place and new intervals are appended, with the oldest dropping off so the chart keeps showing the selected time range. Click Update Dashboard after changing filters.
+
+            **Use case:** Leave a 24h wall display running at the hub.
+            """),
+            title='ℹ️ About this tab',
+            collapsed=True,
+            collapsible=True,
+            sizing_mode='stretch_width'
+        )
+
         # Tabs with info cards
         tabs = pn.Tabs(
             ('📊 Overview', pn.Column(
@@ -1450,6 +1375,13 @@ class EnhancedBatteryAnalyticsDashboard(param.Parameterized):
                 sizing_mode='stretch_both',
                 margin=(15, 15, 15, 15)
             )),
+            ('🔴 Live', pn.Column(
+                live_info,
+                pn.widgets.Toggle.from_param(self.param.live_mode, button_type='success', width=200),
+                self.live_view,
+                sizing_mode='stretch_both',
+                margin=(15, 15, 15, 15)
+            )),
             ('📍 Hub Location Tracking', pn.Column(
                 pn.Card(
                     pn.pane.Markdown("""
@@ -0,0 +1,488 @@
+"""
+Shared data access for the Panel dashboards.
+
+Panel re-runs the dashboard script for every browser session, but imported
+modules are loaded once per server process, so everything here is shared by
+all sessions: one pooled engine, and a cache of query results (filter option
+lists and bucketed telemetry). Sessions asking for the same result at the
+same time wait for a single query. Telemetry results are also dropped as
+soon as new readings arrive: the newest battery_latest_state.updated_at is
+the telemetry watermark, checked at most every few seconds.
+
+Telemetry is bucketed in PostgreSQL with date_bin() (one row per aggregation
+interval instead of every raw reading), and each plot is then downsampled to
+a target point count with LTTB (shape-preserving) or min-max (keeps spikes),
+so a year of fleet data renders as a few thousand points. Live mode polls
+load_series_tail() for just the buckets touched by newly ingested rows
+(livedata.created_at past the dashboard's watermark).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+DATABASE_URL = os.getenv('DATABASE_URL', 'postgresql://beppp:changeme@db:5432/beppp')
+
+PANEL_DB_POOL_SIZE = int(os.getenv('PANEL_DB_POOL_SIZE', '5'))  # Connections kept open per Panel process
+PANEL_CACHE_TTL_SECONDS = int(os.getenv('PANEL_CACHE_TTL_SECONDS', '120'))  # How long query results are reused
+PANEL_CACHE_MAX_ENTRIES = int(os.getenv('PANEL_CACHE_MAX_ENTRIES', '64'))  # Results kept per process
+PANEL_OPTIONS_TTL_SECONDS = int(os.getenv('PANEL_OPTIONS_TTL_SECONDS', '600'))  # Hub / battery / PUE option lists
+PANEL_WATERMARK_CHECK_SECONDS = int(os.getenv('PANEL_WATERMARK_CHECK_SECONDS', '15'))  # New-telemetry check interval
+PANEL_TARGET_POINTS = int(os.getenv('PANEL_TARGET_POINTS', '2000'))  # Max points drawn per plot line
+PANEL_LIVE_POLL_SECONDS = int(os.getenv('PANEL_LIVE_POLL_SECONDS', '60'))  # Live mode tail query interval
+
+# Live mode re-reads rows ingested this long before its watermark, for
+# transactions that committed after a later created_at was seen
+LIVE_TAIL_OVERLAP = timedelta(seconds=60)
+
+# Telemetry columns and how readings combine within a bucket: across
+# batteries at the same timestamp, then across timestamps in the bucket
+METRIC_AGGREGATES = {
+    'state_of_charge': 'AVG',
+    'voltage': 'AVG',
+    'current_amps': 'SUM',
+    'power_watts': 'SUM',
+    'temp_battery': 'AVG',
+    'charging_current': 'SUM',
+    'charger_power': 'SUM',
+    'charger_voltage': 'AVG',
+    'usb_power': 'SUM',
+    'usb_voltage': 'AVG',
+    'amp_hours_consumed': 'SUM',
+    'total_charge_consumed': 'SUM',
+}
+
+TIME_SCALES = {
+    '1h': timedelta(hours=1),
+    '6h': timedelta(hours=6),
+    '24h': timedelta(days=1),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+    'all': None,
+}
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """The process-wide pooled engine (created on first use)"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_engine(
+                DATABASE_URL,
+                pool_size=PANEL_DB_POOL_SIZE,
+                max_overflow=PANEL_DB_POOL_SIZE,
+                pool_pre_ping=True,
+                pool_recycle=1800,
+            )
+        return _engine
+
+
+class ResultCache:
+    """
+    Thread-safe LRU of query results. An entry expires after its TTL, or when
+    it was stored under a different watermark than the caller passes. Loads
+    of the same key are single-flight; failed loads are not cached.
+    """
+
+    def __init__(self, ttl_seconds: int = 120, max_entries: int = 64):
+        self.ttl = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        # key -> (expires_at, watermark, value)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._loading: Dict[tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0}
+
+    def _lookup(self, key: tuple, watermark):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] <= time.monotonic() or entry[1] != watermark:
+            self._entries.pop(key, None)
+            self._stats["stale"] += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, entry[2]
+
+    def get_or_load(self, key: tuple, loader: Callable, ttl: Optional[int] = None, watermark=None):
+        with self._lock:
+            found, value = self._lookup(key, watermark)
+            if found:
+                self._stats["hits"] += 1
+                return value
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            # Another session may have loaded it while we waited
+            with self._lock:
+                found, value = self._lookup(key, watermark)
+                if found:
+                    self._stats["hits"] += 1
+                    return value
+                self._stats["misses"] += 1
+            try:
+                value = loader()
+                with self._lock:
+                    self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), watermark, value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                return value
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "ttl_seconds": self.ttl}
+
+
+result_cache = ResultCache(PANEL_CACHE_TTL_SECONDS, PANEL_CACHE_MAX_ENTRIES)
+
+_watermark = {"value": None, "checked_at": None}
+_watermark_lock = threading.Lock()
+
+
+def telemetry_watermark():
+    """
+    When telemetry last arrived (newest battery_latest_state.updated_at),
+    re-read at most every PANEL_WATERMARK_CHECK_SECONDS. None if unavailable.
+    """
+    with _watermark_lock:
+        checked_at = _watermark["checked_at"]
+        if checked_at is not None and time.monotonic() - checked_at < PANEL_WATERMARK_CHECK_SECONDS:
+            return _watermark["value"]
+        try:
+            with get_engine().connect() as conn:
+                _watermark["value"] = conn.execute(text("SELECT max(updated_at) FROM battery_latest_state")).scalar()
+        except Exception as e:
+            print(f"Error reading telemetry watermark: {e}", flush=True)
+            _watermark["value"] = None
+        _watermark["checked_at"] = time.monotonic()
+        return _watermark["value"]
+
+
+def _query_rows(sql: str) -> list:
+    with get_engine().connect() as conn:
+        return list(conn.execute(text(sql)))
+
+
+def hub_options() -> List[dict]:
+    """Hubs for the filter widgets (cached per process)"""
+    def load():
+        rows = _query_rows("""
+            SELECT hub_id, what_three_word_location as hub_name
+            FROM solarhub
+            ORDER BY hub_id
+        """)
+        return [{'hub_id': row.hub_id, 'hub_name': row.hub_name} for row in rows]
+    return result_cache.get_or_load(('options', 'hubs'), load, ttl=PANEL_OPTIONS_TTL_SECONDS)
+
+
+def battery_options() -> List[dict]:
+    """Batteries with capacity and status (cached per process)"""
+    def load():
+        rows = _query_rows("""
+            SELECT
+                battery_id,
+                hub_id,
+                battery_capacity_wh,
+                status
+            FROM bepppbattery
+            ORDER BY battery_id
+        """)
+        return [{'battery_id': row.battery_id,
+                 'hub_id': row.hub_id,
+                 'capacity_wh': row.battery_capacity_wh or 0,
+                 'status': row.status}
+                for row in rows]
+    return result_cache.get_or_load(('options', 'batteries'), load, ttl=PANEL_OPTIONS_TTL_SECONDS)
+
+
+def pue_type_options() -> List[str]:
+    """Distinct PUE types (cached per process)"""
+    def load():
+        rows = _query_rows("""
+            SELECT DISTINCT pue.pue_type
+            FROM pue_item pue
+            WHERE pue.pue_type IS NOT NULL
+            ORDER BY pue.pue_type
+        """)
+        return [row.pue_type for row in rows if row.pue_type]
+    return result_cache.get_or_load(('options', 'pue_types'), load, ttl=PANEL_OPTIONS_TTL_SECONDS)
+
+
+def pue_item_options() -> List[dict]:
+    """PUE items (cached per process)"""
+    def load():
+        rows = _query_rows("""
+            SELECT
+                pue_item_id,
+                pue_type,
+                brand,
+                model,
+                wattage
+            FROM pue_item
+            ORDER BY pue_type, brand, model
+        """)
+        return [{'pue_item_id': row.pue_item_id,
+                 'pue_type': row.pue_type,
+                 'brand': row.brand or '',
+                 'model': row.model or '',
+                 'wattage': row.wattage or 0}
+                for row in rows]
+    return result_cache.get_or_load(('options', 'pue_items'), load, ttl=PANEL_OPTIONS_TTL_SECONDS)
+
+
+@dataclass(frozen=True)
+class SeriesFilters:
+    """Dashboard filter state; hashable so it can key the result cache"""
+    battery_ids: Tuple[str, ...]
+    time_scale: str = '24h'
+    hub_ids: Tuple[int, ...] = ()
+    min_capacity: Optional[float] = None
+    max_capacity: Optional[float] = None
+    pue_types: Tuple[str, ...] = ()
+    only_with_pue: bool = False
+
+    def since(self) -> Optional[datetime]:
+        delta = TIME_SCALES.get(self.time_scale)
+        return datetime.now() - delta if delta else None
+
+
+def empty_series() -> pd.DataFrame:
+    return pd.DataFrame(columns=list(METRIC_AGGREGATES), index=pd.DatetimeIndex([], name='timestamp'))
+
+
+def fill_missing_buckets(df: pd.DataFrame, interval: pd.Timedelta) -> pd.DataFrame:
+    """
+    Add the empty buckets the query doesn't return between the first and
+    last one, filled like a pandas resample: SUM metrics are 0 (nothing was
+    drawn or charged), AVG metrics carry the neighbouring value.
+    """
+    full_range = pd.date_range(df.index.min(), df.index.max(), freq=interval, name='timestamp')
+    df = df.reindex(full_range)
+    sums = [column for column, agg in METRIC_AGGREGATES.items() if agg == 'SUM' and column in df]
+    averages = [column for column, agg in METRIC_AGGREGATES.items() if agg == 'AVG' and column in df]
+    df[sums] = df[sums].fillna(0)
+    df[averages] = df[averages].ffill().bfill()
+    return df
+
+
+def _filter_clauses(filters: SeriesFilters):
+    where_clauses = ["ld.battery_id = ANY(:battery_ids)", "ld.timestamp IS NOT NULL"]
+    params = {'battery_ids': list(filters.battery_ids)}
+
+    if filters.hub_ids:
+        where_clauses.append("b.hub_id = ANY(:hub_ids)")
+        params['hub_ids'] = list(filters.hub_ids)
+
+    if filters.min_capacity is not None and filters.max_capacity is not None:
+        where_clauses.append("b.battery_capacity_wh BETWEEN :min_cap AND :max_cap")
+        params['min_cap'] = filters.min_capacity
+        params['max_cap'] = filters.max_capacity
+
+    if filters.pue_types:
+        where_clauses.append("""
+            EXISTS (
+                SELECT 1 FROM rental r
+                JOIN rental_pue_item rpi ON r.rentral_id = rpi.rental_id
+                JOIN pue_item pue ON rpi.pue_item_id = pue.pue_item_id
+                WHERE r.battery_id = ld.battery_id
+                AND pue.pue_type = ANY(:pue_types)
+            )
+        """)
+        params['pue_types'] = list(filters.pue_types)
+
+    if filters.only_with_pue:
+        where_clauses.append("""
+            EXISTS (
+                SELECT 1 FROM rental r
+                JOIN rental_pue_item rpi ON r.rentral_id = rpi.rental_id
+                WHERE r.battery_id = ld.battery_id
+            )
+        """)
+
+    since = filters.since()
+    if since:
+        where_clauses.append("ld.timestamp >= :since")
+        params['since'] = since
+
+    return where_clauses, params
+
+
+_BUCKET = "date_bin(:bucket, {column}, TIMESTAMP '2000-01-01')"
+
+
+def _bucket_query(where_clauses: List[str], ctes: str = "", extra_columns: str = ""):
+    per_timestamp = ",\n".join(f"{agg}(ld.{column}) AS {column}" for column, agg in METRIC_AGGREGATES.items())
+    per_bucket = ",\n".join(f"{agg}({column}) AS {column}" for column, agg in METRIC_AGGREGATES.items())
+    return text(f"""
+        WITH {ctes}
+        per_timestamp AS (
+            SELECT ld.timestamp, {per_timestamp}
+            FROM livedata ld
+            JOIN bepppbattery b ON ld.battery_id = b.battery_id
+            WHERE {" AND ".join(where_clauses)}
+            GROUP BY ld.timestamp
+        )
+        SELECT {_BUCKET.format(column="timestamp")} AS timestamp, {per_bucket}{extra_columns}
+        FROM per_timestamp
+        GROUP BY 1
+        ORDER BY 1
+    """)
+
+
+def _series_query(filters: SeriesFilters):
+    where_clauses, params = _filter_clauses(filters)
+    return _bucket_query(where_clauses), params
+
+
+def _tail_query(filters: SeriesFilters):
+    """
+    Buckets holding rows ingested after :created_after, fully re-aggregated,
+    plus the newest created_at among those rows
+    """
+    where_clauses, params = _filter_clauses(filters)
+    touched = f"""
+        touched AS (
+            SELECT {_BUCKET.format(column="ld.timestamp")} AS bucket, max(ld.created_at) AS last_created_at
+            FROM livedata ld
+            JOIN bepppbattery b ON ld.battery_id = b.battery_id
+            WHERE {" AND ".join(where_clauses)} AND ld.created_at > :created_after
+            GROUP BY 1
+        ),
+    """
+    where_clauses = where_clauses + [
+        "ld.timestamp >= (SELECT min(bucket) FROM touched)",
+        f"{_BUCKET.format(column='ld.timestamp')} IN (SELECT bucket FROM touched)",
+    ]
+    extra = ",\n(SELECT max(last_created_at) FROM touched) AS last_created_at"
+    return _bucket_query(where_clauses, touched, extra), params
+
+
+def _load_series(filters: SeriesFilters, interval: pd.Timedelta) -> pd.DataFrame:
+    query, params = _series_query(filters)
+    params['bucket'] = interval.to_pytimedelta()
+    with get_engine().connect() as conn:
+        df = pd.read_sql(query, conn, params=params)
+
+    if df.empty:
+        return empty_series()
+
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return fill_missing_buckets(df.set_index('timestamp'), interval)
+
+
+def load_bucketed_series(filters: SeriesFilters, interval: str) -> pd.DataFrame:
+    """
+    Telemetry for the filtered batteries aggregated into `interval` buckets
+    (a pandas offset such as '30min'). Results are cached per process by
+    (filters, interval) until new telemetry arrives or the TTL passes;
+    treat the returned frame as read-only.
+    """
+    if not filters.battery_ids:
+        return empty_series()
+    bucket = pd.Timedelta(interval)
+    return result_cache.get_or_load(
+        ('series', filters, bucket),
+        lambda: _load_series(filters, bucket),
+        watermark=telemetry_watermark(),
+    )
+
+
+def database_now() -> datetime:
+    """Current database time as naive UTC (the livedata.created_at convention)"""
+    with get_engine().connect() as conn:
+        return conn.execute(text("SELECT now() AT TIME ZONE 'UTC'")).scalar()
+
+
+def load_series_tail(filters: SeriesFilters, interval: str,
+                     created_after: datetime) -> Tuple[pd.DataFrame, Optional[datetime]]:
+    """
+    Buckets touched by readings ingested after `created_after` (naive UTC),
+    re-aggregated from all their rows, and the newest created_at seen (None
+    if nothing arrived). Not cached; callers poll it with their own
+    watermark and replace or append the returned buckets.
+    """
+    if not filters.battery_ids:
+        return empty_series(), None
+    query, params = _tail_query(filters)
+    params['bucket'] = pd.Timedelta(interval).to_pytimedelta()
+    params['created_after'] = created_after
+    with get_engine().connect() as conn:
+        df = pd.read_sql(query, conn, params=params)
+
+    if df.empty:
+        return empty_series(), None
+
+    last_created_at = df['last_created_at'].max()
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df = df.drop(columns=['last_created_at']).set_index('timestamp')
+    sums = [column for column, agg in METRIC_AGGREGATES.items() if agg == 'SUM']
+    df[sums] = df[sums].fillna(0)
+    return df, pd.Timestamp(last_created_at).to_pydatetime()
+
+
+def _lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of n_out points keeping the shape of y"""
+    n = len(x)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        # Average of the next bucket is the third triangle vertex
+        avg_x = x[end:next_end].mean() if next_end > end else x[-1]
+        avg_y = y[end:next_end].mean() if next_end > end else y[-1]
+        areas = np.abs(
+            (x[selected] - avg_x) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (avg_y - y[selected])
+        )
+        selected = start + int(areas.argmax())
+        indices[i + 1] = selected
+    return indices
+
+
+def _minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Index of the min and max of y in each of n_out/2 buckets, plus both ends"""
+    n = len(y)
+    edges = np.linspace(0, n, max(1, n_out // 2) + 1).astype(int)
+    indices = {0, n - 1}
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            indices.add(start + int(y[start:end].argmin()))
+            indices.add(start + int(y[start:end].argmax()))
+    return np.array(sorted(indices))
+
+
+def downsample(df: pd.DataFrame, column: str, target_points: int = PANEL_TARGET_POINTS,
+               method: str = 'lttb') -> pd.DataFrame:
+    """
+    Rows of df (time-indexed) chosen to draw `column` with at most about
+    target_points points. method: 'lttb' keeps the visual shape, 'minmax'
+    keeps every bucket's extremes (peaks in bursty power series).
+    """
+    series = df[column].dropna()
+    if len(series) <= target_points or target_points < 3:
+        return df.loc[series.index]
+
+    y = series.to_numpy(dtype=float)
+    if method == 'minmax':
+        indices = _minmax_indices(y, target_points)
+    else:
+        x = series.index.asi8.astype(float)
+        indices = _lttb_indices(x, y, target_points)
+    return df.loc[series.index[indices]]
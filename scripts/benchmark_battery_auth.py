@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Requests per reading: login-every-time vs cached battery token
+
+Replays a day of battery uploads against a live server the way the firmware
+does it, once per strategy:
+
+  login   - the old firmware: /auth/battery-login before every /webhook/live-data
+  cached  - hardware/cebattery_improved.py: reuse the token until it is within
+            --refresh-margin of expiry, then /auth/battery-refresh (falling
+            back to /auth/battery-login)
+
+The device clock is simulated (--interval-minutes between readings) so a
+day of uploads runs in seconds; token expiry is taken from the server's
+`expires_in`. Expect ~2.0 requests per reading for `login` and ~1.0 for
+`cached`.
+
+Usage:
+    python scripts/benchmark_battery_auth.py --battery-secret SECRET \\
+        [--url http://localhost:8000] [--battery-id 1] [--readings 288] \\
+        [--interval-minutes 5] [--refresh-margin 3600]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+
+class Device:
+    """Counts requests and time spent per endpoint for one simulated battery"""
+
+    def __init__(self, client, args):
+        self.client = client
+        self.args = args
+        self.requests = {}
+        self.latencies = {}
+
+    def post(self, endpoint, **kwargs):
+        started = time.perf_counter()
+        response = self.client.post(endpoint, **kwargs)
+        self.latencies.setdefault(endpoint, []).append((time.perf_counter() - started) * 1000)
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        return response
+
+    def login(self):
+        response = self.post("/auth/battery-login", json={
+            "battery_id": self.args.battery_id,
+            "battery_secret": self.args.battery_secret,
+        })
+        if response.status_code != 200:
+            print(f"Battery login failed: {response.status_code} {response.text}")
+            sys.exit(1)
+        return response.json()
+
+    def refresh(self, token):
+        response = self.post("/auth/battery-refresh", headers={"Authorization": f"Bearer {token}"})
+        return response.json() if response.status_code == 200 else None
+
+    def send(self, token, reading_time):
+        response = self.post("/webhook/live-data", json={
+            "id": self.args.battery_id,
+            "d": reading_time.strftime("%Y-%m-%d"),
+            "tm": reading_time.strftime("%H:%M:%S"),
+            "soc": 75.0, "v": 12.6, "i": 1.2, "p": 15.1, "t": 24.0,
+        }, headers={"Authorization": f"Bearer {token}"})
+        return response.status_code
+
+
+def run_login_every_time(device, readings):
+    for reading_time in readings:
+        token = device.login()["access_token"]
+        device.send(token, reading_time)
+
+
+def run_cached(device, readings, refresh_margin):
+    token, expires_at = None, None
+    for reading_time in readings:
+        if token is None or reading_time >= expires_at:
+            issued = device.login()
+        elif (expires_at - reading_time).total_seconds() <= refresh_margin:
+            issued = device.refresh(token) or device.login()
+        else:
+            issued = None
+
+        if issued:
+            token = issued["access_token"]
+            expires_at = reading_time + timedelta(seconds=issued["expires_in"])
+
+        if device.send(token, reading_time) == 401:
+            token = device.login()["access_token"]
+            device.send(token, reading_time)
+
+
+def report(label, device, reading_count):
+    total = sum(device.requests.values())
+    print(f"\n{label}: {total} requests for {reading_count} readings "
+          f"= {total / reading_count:.2f} per reading")
+    for endpoint, count in sorted(device.requests.items()):
+        latencies = device.latencies[endpoint]
+        print(f"  {endpoint:<22} {count:>5}  p50={statistics.median(latencies):6.1f} ms  "
+              f"mean={statistics.mean(latencies):6.1f} ms")
+    return total / reading_count
+
+
+def main(args):
+    start = datetime.utcnow() - timedelta(minutes=args.interval_minutes * args.readings)
+    readings = [start + timedelta(minutes=args.interval_minutes * i) for i in range(args.readings)]
+
+    with httpx.Client(base_url=args.url, timeout=60) as client:
+        print(f"Replaying {args.readings} readings, {args.interval_minutes} min apart, per strategy")
+
+        login_device = Device(client, args)
+        run_login_every_time(login_device, readings)
+        before = report("login every reading", login_device, args.readings)
+
+        cached_device = Device(client, args)
+        run_cached(cached_device, readings, args.refresh_margin)
+        after = report("cached token", cached_device, args.readings)
+
+    print(f"\nRequests per reading: {before:.2f} -> {after:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare requests per battery reading with and without token caching")
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--battery-id', default='1')
+    parser.add_argument('--battery-secret', required=True)
+    parser.add_argument('--readings', type=int, default=288, help="Readings per strategy (288 = one day at 5 min)")
+    parser.add_argument('--interval-minutes', type=int, default=5)
+    parser.add_argument('--refresh-margin', type=int, default=3600,
+                        help="Refresh when this many seconds of token life remain (firmware TOKEN_REFRESH_MARGIN_SECONDS)")
+    main(parser.parse_args())
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Global search (typeahead) latency
+
+Times GET /search the way the search box calls it: the query typed one
+character at a time (from 2 characters), for each of a few search terms.
+With the trigram indexes in place every keystroke should stay well under
+50 ms even with hundreds of thousands of users and rentals (run it close
+to the API so the figures are mostly server time).
+
+Usage:
+    python scripts/benchmark_search.py --admin-password PASSWORD \\
+        [--url http://localhost:8000] [--admin-user admin] [--hub-id N] \\
+        [--terms "john,BAT-0,0999,solar"] [--repeat 3] [--limit 5]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+
+import httpx
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main(args):
+    with httpx.Client(base_url=args.url, timeout=60) as client:
+        response = client.post("/auth/token", json={"username": args.admin_user, "password": args.admin_password})
+        if response.status_code != 200:
+            print(f"Admin login failed: {response.status_code} {response.text}")
+            sys.exit(1)
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        latencies = {}
+        for _ in range(args.repeat):
+            for term in args.terms.split(","):
+                for length in range(2, len(term) + 1):
+                    params = {"q": term[:length], "limit": args.limit}
+                    if args.hub_id:
+                        params["hub_id"] = args.hub_id
+                    started = time.perf_counter()
+                    response = client.get("/search", params=params, headers=headers)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    if response.status_code != 200:
+                        print(f"  q={params['q']!r}: {response.status_code} {response.text[:200]}")
+                        continue
+                    latencies.setdefault(term, []).append(elapsed)
+
+    print(f"{'term':<16} {'n':>4} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    everything = []
+    for term, values in latencies.items():
+        everything.extend(values)
+        print(f"{term:<16} {len(values):>4} {statistics.median(values):>8.1f} "
+              f"{percentile(values, 95):>8.1f} {max(values):>8.1f}")
+    if everything:
+        print(f"{'all':<16} {len(everything):>4} {statistics.median(everything):>8.1f} "
+              f"{percentile(everything, 95):>8.1f} {max(everything):>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure /search latency per keystroke")
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--admin-user', default='admin')
+    parser.add_argument('--admin-password', required=True)
+    parser.add_argument('--hub-id', type=int, default=None)
+    parser.add_argument('--terms', default="john,BAT-0,0999,solar")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--limit', type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Webhook latency under analytics load
+
+Measures /webhook/live-data latency twice: on an idle API, and again while
+several clients continuously run heavy /analytics/* reports. With the route
+handlers running in the threadpool (and analytics capped by
+ANALYTICS_MAX_CONCURRENCY) the two distributions should be close; if a
+handler blocks the event loop, the loaded p95 jumps to the report duration.
+
+Run against a live server with a test battery and an admin account.
+
+Usage:
+    python scripts/benchmark_webhook_latency.py --battery-secret SECRET --admin-password PASSWORD \\
+        [--url http://localhost:8000] [--battery-id 1] [--admin-user admin] \\
+        [--requests 200] [--concurrency 10] [--analytics-clients 4] [--period last_year]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime
+
+import httpx
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarise(label, latencies, errors):
+    if not latencies:
+        print(f"  {label:<22} no successful requests ({errors} errors)")
+        return
+    print(
+        f"  {label:<22} n={len(latencies):<5} "
+        f"p50={statistics.median(latencies):7.1f} ms  "
+        f"p95={percentile(latencies, 95):7.1f} ms  "
+        f"max={max(latencies):7.1f} ms  errors={errors}"
+    )
+
+
+async def login(client, args):
+    battery = await client.post("/auth/battery-login", json={
+        "battery_id": args.battery_id,
+        "battery_secret": args.battery_secret,
+    })
+    admin = await client.post("/auth/token", json={
+        "username": args.admin_user,
+        "password": args.admin_password,
+    })
+    if battery.status_code != 200 or admin.status_code != 200:
+        print(f"Login failed: battery {battery.status_code}, admin {admin.status_code}")
+        sys.exit(1)
+    return battery.json()["access_token"], admin.json()["access_token"]
+
+
+def reading(battery_id):
+    now = datetime.utcnow()
+    return {
+        "id": battery_id,
+        "d": now.strftime("%Y-%m-%d"),
+        "tm": now.strftime("%H:%M:%S"),
+        "soc": 75.0, "v": 12.6, "i": 1.2, "p": 15.1, "t": 24.0,
+    }
+
+
+async def run_webhooks(client, token, args):
+    """Send args.requests readings with args.concurrency in flight; return latencies in ms"""
+    headers = {"Authorization": f"Bearer {token}"}
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post("/webhook/live-data", json=reading(args.battery_id), headers=headers)
+                if response.status_code == 200:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                else:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    return latencies, errors
+
+
+async def run_analytics(client, token, args, stop: asyncio.Event):
+    """Keep one heavy analytics report in flight until stopped; return latencies in ms"""
+    headers = {"Authorization": f"Bearer {token}"}
+    payload = {
+        "battery_selection": {"all_batteries": True},
+        "time_period": args.period,
+        "aggregation_period": "hour",
+        "aggregation_function": "median",
+        "metric": "power_watts",
+    }
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            await client.post("/analytics/power-usage", json=payload, headers=headers)
+            latencies.append((time.perf_counter() - started) * 1000)
+        except httpx.HTTPError:
+            pass
+    return latencies
+
+
+async def main(args):
+    async with httpx.AsyncClient(base_url=args.url, timeout=300) as client:
+        battery_token, admin_token = await login(client, args)
+
+        print(f"Webhook latency: {args.requests} readings, {args.concurrency} concurrent")
+
+        idle, idle_errors = await run_webhooks(client, battery_token, args)
+        summarise("idle", idle, idle_errors)
+
+        stop = asyncio.Event()
+        analytics = [
+            asyncio.create_task(run_analytics(client, admin_token, args, stop))
+            for _ in range(args.analytics_clients)
+        ]
+        await asyncio.sleep(1)  # let the reports start
+        loaded, loaded_errors = await run_webhooks(client, battery_token, args)
+        stop.set()
+        report_latencies = [latency for task in await asyncio.gather(*analytics) for latency in task]
+
+        summarise(f"with {args.analytics_clients} analytics", loaded, loaded_errors)
+        summarise("analytics reports", report_latencies, 0)
+
+        if idle and loaded:
+            ratio = percentile(loaded, 95) / max(percentile(idle, 95), 0.001)
+            print(f"\n  p95 under load is {ratio:.1f}x idle")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark webhook latency while analytics queries run")
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--battery-id', default='1')
+    parser.add_argument('--battery-secret', required=True)
+    parser.add_argument('--admin-user', default='admin')
+    parser.add_argument('--admin-password', required=True)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--analytics-clients', type=int, default=4)
+    parser.add_argument('--period', default='last_year')
+    asyncio.run(main(parser.parse_args()))
@@ -39,6 +39,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
 from models import LiveData
+from api.app.services.livedata_rollups import reroll_buckets
 
 # Intervals between data points based on awake state
 AWAKE_INTERVAL = timedelta(minutes=5)
@@ -201,6 +202,7 @@ def reconstruct_battery(db, battery_id, dry_run=False):
         return 0
 
     print(f"  Battery {battery_id}: {len(entries)} entries, {null_count} with NULL timestamps")
+    null_ids = {e.id for e in entries if e.timestamp is None}
 
     sessions = group_into_sessions(entries)
     print(f"    Found {len(sessions)} upload session(s)")
@@ -223,8 +225,14 @@ def reconstruct_battery(db, battery_id, dry_run=False):
             total_reconstructed += count
 
     if not dry_run and total_reconstructed > 0:
+        # The rollup watermark only follows created_at, so re-roll the hours these rows moved into
+        db.flush()
+        hours, days = reroll_buckets(
+            db, [(e.battery_id, e.timestamp) for e in entries if e.id in null_ids and e.timestamp is not None]
+        )
         db.commit()
-        print(f"    Committed {total_reconstructed} reconstructed timestamps")
+        print(f"    Committed {total_reconstructed} reconstructed timestamps "
+              f"({hours} hourly / {days} daily rollup buckets rebuilt)")
 
     return total_reconstructed
 
@@ -17,6 +17,7 @@ Defaults to localhost:8000 with battery "1". Battery secret is required.
 """
 
 import requests
+import gzip
 import json
 import os
 import sys
@@ -26,6 +27,7 @@ from datetime import datetime, timedelta
 API_BASE_URL = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("API_URL", "http://localhost:8000")
 TEST_BATTERY_ID = sys.argv[2] if len(sys.argv) > 2 else os.environ.get("TEST_BATTERY_ID", "1")
 TEST_BATTERY_SECRET = sys.argv[3] if len(sys.argv) > 3 else os.environ.get("TEST_BATTERY_SECRET", "")
+MAX_BATCH_ENTRIES = int(os.environ.get("BATCH_LIVE_DATA_MAX_ENTRIES", "5000"))
 
 if not TEST_BATTERY_SECRET:
     print("ERROR: No battery secret provided.")
@@ -166,9 +168,9 @@ def test_wrong_battery_id(headers):
 
 
 def test_over_limit(headers):
-    """More than 100 entries should return 400."""
-    section("TEST 6: Over 100 entries limit")
-    entries = [make_entry(minutes_ago=i) for i in range(101)]
+    """More than BATCH_LIVE_DATA_MAX_ENTRIES entries should return 400."""
+    section(f"TEST 6: Over {MAX_BATCH_ENTRIES} entries limit")
+    entries = [make_entry(minutes_ago=i) for i in range(MAX_BATCH_ENTRIES + 1)]
     r = requests.post(f"{API_BASE_URL}/webhook/batch-live-data", json={
         "battery_id": TEST_BATTERY_ID,
         "entries": entries,
@@ -276,6 +278,29 @@ def test_large_batch(headers):
     check("stored=50", data.get("stored") == 50, f"stored={data.get('stored')}")
 
 
+def test_gzip_csv_backfill(headers):
+    """Send the SD-card CSV format (header + trailing commas), gzip-compressed."""
+    section("TEST 12: Gzip CSV backfill (1000 rows)")
+    entries = [make_entry(minutes_ago=i*5, soc=90-i*0.05) for i in range(1000)]
+    keys = list(entries[0].keys())
+    lines = ["".join(f"{k}," for k in keys)]
+    lines += ["".join(f"{e[k]}," for k in keys) for e in entries]
+    lines.append("1,garbage,")  # short row -> rejected
+    body = gzip.compress(("\n".join(lines) + "\n").encode())
+    r = requests.post(
+        f"{API_BASE_URL}/webhook/batch-live-data?battery_id={TEST_BATTERY_ID}&fb=0",
+        data=body,
+        headers={**headers, "Content-Type": "text/csv", "Content-Encoding": "gzip"},
+        timeout=60,
+    )
+    data = r.json()
+    check("Status 200", r.status_code == 200, f"got {r.status_code}")
+    check("format=csv", data.get("format") == "csv")
+    check("stored=1000", data.get("stored") == 1000, f"stored={data.get('stored')}")
+    rejected = data.get("rejected", [])
+    check("short row rejected by index", [x.get("index") for x in rejected] == [1000], json.dumps(rejected))
+
+
 def main():
     print(f"\nBatch Live Data Endpoint Test Suite")
     print(f"API: {API_BASE_URL}")
@@ -297,6 +322,7 @@ def main():
     test_corrupt_timestamps_with_final_batch(headers)
     test_final_batch_flag_default(headers)
     test_large_batch(headers)
+    test_gzip_csv_backfill(headers)
 
     section("RESULTS")
     total = passed + failed
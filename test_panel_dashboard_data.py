@@ -0,0 +1,47 @@
+"""
+Tests for the Panel dashboard data layer (panel_dashboard/dashboard_data.py)
+that don't need a database:
+
+    pytest test_panel_dashboard_data.py
+"""
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'panel_dashboard'))
+
+from dashboard_data import fill_missing_buckets  # noqa: E402
+
+
+def test_gap_buckets_are_zero_for_sums_and_carried_for_averages():
+    # 30-minute buckets at 00:00 and 02:00 with nothing in between
+    index = pd.DatetimeIndex(['2026-10-01 00:00', '2026-10-01 02:00'], name='timestamp')
+    df = pd.DataFrame({
+        'state_of_charge': [80.0, 70.0],
+        'voltage': [12.8, 12.6],
+        'power_watts': [-40.0, -20.0],
+        'amp_hours_consumed': [3.0, 1.5],
+    }, index=index)
+
+    filled = fill_missing_buckets(df, pd.Timedelta('30min'))
+
+    assert len(filled) == 5
+    gap = filled.loc['2026-10-01 00:30':'2026-10-01 01:30']
+    assert (gap['power_watts'] == 0).all()
+    assert (gap['amp_hours_consumed'] == 0).all()
+    assert (gap['state_of_charge'] == 80.0).all()
+    assert (gap['voltage'] == 12.8).all()
+    # Averages over the gap don't borrow energy from the neighbouring buckets
+    assert filled['power_watts'].mean() == -12.0
+    assert filled['amp_hours_consumed'].sum() == 4.5
+
+
+def test_sum_columns_without_readings_in_a_bucket_are_zero():
+    index = pd.DatetimeIndex(['2026-10-01 00:00', '2026-10-01 00:30'], name='timestamp')
+    df = pd.DataFrame({'voltage': [None, 12.5], 'usb_power': [None, 5.0]}, index=index)
+
+    filled = fill_missing_buckets(df, pd.Timedelta('30min'))
+
+    assert list(filled['usb_power']) == [0.0, 5.0]
+    assert list(filled['voltage']) == [12.5, 12.5]
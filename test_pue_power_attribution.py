@@ -0,0 +1,73 @@
+"""
+Tests for the interval joins behind /analytics/power-by-pue-type
+(api/app/services/pue_power_attribution.py). Pure pandas, no database:
+
+    pytest test_pue_power_attribution.py
+"""
+from datetime import datetime
+
+import pandas as pd
+
+from api.app.services.pue_power_attribution import (
+    NO_PUE,
+    attribute_pue_types,
+    build_pue_segments,
+    build_rental_segments,
+)
+
+
+def _points(battery_id, hours):
+    return pd.DataFrame({
+        "battery_id": [battery_id] * len(hours),
+        "timestamp": [datetime(2026, 10, 1, hour) for hour in hours],
+        "power_watts": [-10.0] * len(hours),
+    })
+
+
+def _rentals(rows):
+    return pd.DataFrame(rows, columns=["battery_id", "rental_start", "rental_end", "user_id"])
+
+
+def test_nested_rentals_keep_points_of_the_outer_rental():
+    # Rental of user 1 from 00:00 to 20:00, with a rental of user 2 from 05:00 to 08:00 inside it
+    rentals = _rentals([
+        ("DEV-002", datetime(2026, 10, 1, 0), datetime(2026, 10, 1, 20), 1),
+        ("DEV-002", datetime(2026, 10, 1, 5), datetime(2026, 10, 1, 8), 2),
+    ])
+    points = _points("DEV-002", [1, 6, 8, 10, 20, 21])
+    segments = build_pue_segments([
+        (1, datetime(2026, 10, 1, 0), datetime(2026, 10, 1, 23), "Fridge"),
+        (2, datetime(2026, 10, 1, 0), datetime(2026, 10, 1, 23), "Mill"),
+    ])
+
+    labelled = attribute_pue_types(points, rentals, segments).sort_values("timestamp")
+
+    # 21:00 is after both rentals; every other point is inside one
+    assert [ts.hour for ts in labelled["timestamp"]] == [1, 6, 8, 10, 20]
+    assert list(labelled["user_id"]) == [1, 2, 2, 1, 1]
+    assert list(labelled["pue_type_name"]) == ["Fridge", "Mill", "Mill", "Fridge", "Fridge"]
+
+
+def test_rental_segments_do_not_overlap():
+    rentals = _rentals([
+        ("DEV-001", datetime(2026, 10, 1, 0), datetime(2026, 10, 1, 10), 1),
+        ("DEV-001", datetime(2026, 10, 1, 4), datetime(2026, 10, 1, 6), 2),
+        ("DEV-003", datetime(2026, 10, 1, 0), datetime(2026, 10, 1, 2), 3),
+    ])
+
+    segments = build_rental_segments(rentals)
+
+    dev1 = segments[segments["battery_id"] == "DEV-001"].sort_values("seg_start")
+    assert list(dev1["user_id"]) == [1, 2, 1]
+    assert (dev1["seg_start"].iloc[1:].values == dev1["seg_end"].iloc[:-1].values).all()
+    assert list(segments[segments["battery_id"] == "DEV-003"]["user_id"]) == [3]
+
+
+def test_points_without_a_pue_are_labelled_no_pue():
+    rentals = _rentals([("DEV-001", datetime(2026, 10, 1, 0), datetime(2026, 10, 1, 10), 1)])
+    points = _points("DEV-001", [2, 5])
+    segments = build_pue_segments([(1, datetime(2026, 10, 1, 4), datetime(2026, 10, 1, 6), "Fridge")])
+
+    labelled = attribute_pue_types(points, rentals, segments).sort_values("timestamp")
+
+    assert list(labelled["pue_type_name"]) == [NO_PUE, "Fridge"]
@@ -0,0 +1,130 @@
+"""
+Query-count regression test for the rental list endpoints.
+
+Each endpoint must issue the same number of SQL statements whether a hub
+has 1 rental or 25 (no per-rental User/SolarHub/BatteryRentalItem/
+BEPPPBattery lookups). Runs against DATABASE_URL inside a transaction that
+is rolled back afterwards:
+
+    pytest test_rental_list_queries.py --integration
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+
+pytestmark = pytest.mark.integration
+
+
+@pytest.fixture
+def db_session():
+    from sqlalchemy.orm import Session
+    from database import engine
+
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+def seed_hub(db, rental_count):
+    """A fresh hub with `rental_count` active battery rentals and PUE rentals"""
+    from models import (
+        SolarHub, User, UserAccount, BEPPPBattery, BatteryRental, BatteryRentalItem,
+        ProductiveUseEquipment, PUERental,
+    )
+
+    base = random.randint(10**12, 10**13)
+    now = datetime.now(timezone.utc)
+    hub = SolarHub(hub_id=base, what_three_word_location="query.count.test")
+    db.add(hub)
+    db.flush()
+
+    for i in range(rental_count):
+        user = User(username=f"qc_{base}_{i}", Name=f"Query Count {i}", hub_id=hub.hub_id, user_access_level="user")
+        db.add(user)
+        db.flush()
+        db.add(UserAccount(user_id=user.user_id, balance=0))
+
+        battery = BEPPPBattery(battery_id=f"QC{base}-{i}", hub_id=hub.hub_id, battery_capacity_wh=1000)
+        pue = ProductiveUseEquipment(pue_id=f"QCP{base}-{i}", hub_id=hub.hub_id, name=f"PUE {i}")
+        db.add_all([battery, pue])
+        db.flush()
+
+        rental = BatteryRental(
+            user_id=user.user_id, hub_id=hub.hub_id, status="active",
+            start_date=now - timedelta(days=2), end_date=now + timedelta(days=1),
+        )
+        db.add(rental)
+        db.flush()
+        db.add(BatteryRentalItem(rental_id=rental.rental_id, battery_id=battery.battery_id))
+        db.add(PUERental(
+            pue_rental_id=base + i, pue_id=pue.pue_id, user_id=user.user_id, is_active=True,
+            timestamp_taken=(now - timedelta(days=2)).replace(tzinfo=None),
+            due_back=(now + timedelta(days=1)).replace(tzinfo=None),
+        ))
+    db.flush()
+    db.expire_all()
+    return hub.hub_id
+
+
+def count_statements(db, call):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    connection = db.connection()
+    event.listen(connection, "before_cursor_execute", before_cursor_execute)
+    try:
+        result = call()
+    finally:
+        event.remove(connection, "before_cursor_execute", before_cursor_execute)
+    return len(statements), result
+
+
+def list_endpoints():
+    from api.app.main import (
+        list_rentals, list_battery_rentals, list_pue_rentals, get_overdue_upcoming_rentals,
+    )
+
+    def admin(hub_id):
+        return {"sub": "query-count-test", "role": "admin", "hub_id": hub_id}
+
+    unpaged = {"cursor": None, "page_size": None, "fields": None}
+
+    return {
+        "/rentals/": lambda db, hub_id: list_rentals(status="all", user_id=None, **unpaged, db=db, current_user=admin(hub_id)),
+        "/rentals/overdue-upcoming": lambda db, hub_id: get_overdue_upcoming_rentals(db=db, current_user=admin(hub_id)),
+        "/battery-rentals": lambda db, hub_id: list_battery_rentals(
+            user_id=None, status=None, hub_id=hub_id, battery_id=None, modified_after=None, **unpaged,
+            db=db, current_user=admin(hub_id)),
+        "/pue-rentals": lambda db, hub_id: list_pue_rentals(
+            user_id=None, status=None, hub_id=hub_id, modified_after=None, **unpaged,
+            db=db, current_user=admin(hub_id)),
+    }
+
+
+@pytest.mark.parametrize("endpoint", [
+    "/rentals/", "/rentals/overdue-upcoming", "/battery-rentals", "/pue-rentals",
+])
+def test_rental_list_query_count_is_constant(db_session, endpoint):
+    call = list_endpoints()[endpoint]
+
+    small_hub = seed_hub(db_session, 1)
+    large_hub = seed_hub(db_session, 25)
+
+    small_count, small_result = count_statements(db_session, lambda: call(db_session, small_hub))
+    db_session.expire_all()
+    large_count, large_result = count_statements(db_session, lambda: call(db_session, large_hub))
+
+    assert small_result and large_result
+    assert large_count == small_count, (
+        f"{endpoint}: {small_count} statements for 1 rental but {large_count} for 25"
+    )